@@ -1,15 +1,51 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import (Flask, render_template, stream_template, request, redirect, url_for, session, flash,
+                   jsonify, get_flashed_messages, g, abort, send_file)
 from functools import wraps
 import models
+import assets
+import compress
+import profiling
+import backup
+import purge
+import dice
+import hashlib
 import json
+import click
+import csv
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-change-this-in-production'
+
+# Sheets come back from models as slot-based records; jsonify them as objects
+_flask_json_default = app.json.default
+
+def _json_default(value):
+    if isinstance(value, models.Record):
+        return dict(value)
+    return _flask_json_default(value)
+
+app.json.default = _json_default
 ALLOW_BLANK_PASSWORDS = True
+MIN_PASSWORD_LENGTH = 0 if ALLOW_BLANK_PASSWORDS else 6
 
 # Initialize database on first run
 models.init_db()
 
+# Fingerprinted, precompressed static bundles
+assets.init_app(app)
+
+# Negotiated gzip/brotli for HTML and JSON responses
+compress.init_app(app)
+
+# Opt-in cProfile captures for admins (?_profile or X-Profile header)
+profiling.init_app(app)
+
+# Scheduled online backups of the database into backups/
+backup.init_app(app)
+
+# Deletes are tombstones; a background thread purges them after the undo window
+purge.init_app(app)
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -29,9 +65,34 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-def _verify_character_ownership(character_id):
-    """Helper to verify the logged-in user owns this character. Returns character or None."""
-    return models.get_character(character_id, session['user_id'])
+def _load_character_context(character_id):
+    """Resolve the logged-in user's character once per request and keep it on flask.g."""
+    if 'character' not in g:
+        g.character = models.get_character_context(character_id, session['user_id'])
+    return g.character
+
+def character_required(f):
+    """Require the logged-in user to own the character in the URL. Pages redirect when they don't."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            return redirect(url_for('login'))
+        if not _load_character_context(kwargs['character_id']):
+            flash('Character not found')
+            return redirect(url_for('dashboard'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+def character_api_required(f):
+    """Like character_required, but answers JSON endpoints with a 404."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            return jsonify({'ok': False, 'error': 'Not logged in'}), 401
+        if not _load_character_context(kwargs['character_id']):
+            return jsonify({'ok': False, 'error': 'Not found'}), 404
+        return f(*args, **kwargs)
+    return decorated_function
 
 @app.route('/')
 def index():
@@ -87,7 +148,19 @@ def first_user():
 @app.route('/logout')
 def logout():
     session.clear()
-    return redirect(url_for('login'))
+    response = redirect(url_for('login'))
+    # Drop the offline sheet cache and write queue along with the session
+    response.headers['Clear-Site-Data'] = '"cache", "storage"'
+    return response
+
+@app.route('/sw.js')
+def service_worker():
+    """The offline service worker. Served from the root so its scope covers every page."""
+    body = render_template('sw.js', version=assets.manifest_version(), assets=assets.hashed_urls(app),
+                           asset_prefix=f'{app.static_url_path}/assets/')
+    response = app.response_class(body, mimetype='application/javascript')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/profile')
 @login_required
@@ -105,8 +178,71 @@ def toggle_dark_mode():
 @app.route('/admin')
 @admin_required
 def admin():
-    users = models.get_all_users()
-    return render_template('admin.html', users=users, dev_mode=ALLOW_BLANK_PASSWORDS)
+    sort = request.args.get('sort', 'username')
+    if sort not in models.USER_SORTS:
+        sort = 'username'
+    descending = request.args.get('dir') == 'desc'
+    overview = models.get_user_overview(request.args.get('page', 1, type=int), sort, descending)
+    deleted_users = models.get_deleted_users()
+    catalog = {kind: models.get_catalog(kind) for kind in models.CATALOG_KINDS}
+    return render_template('admin.html', users=overview['users'], overview=overview, sort=sort,
+                           descending=descending, database_size=models.database_size(),
+                           deleted_users=deleted_users, catalog=catalog, dev_mode=ALLOW_BLANK_PASSWORDS)
+
+@app.route('/admin/profiles')
+@admin_required
+def admin_profiles():
+    return render_template('admin_profiles.html', captures=profiling.list_captures())
+
+@app.route('/admin/profiles/<name>')
+@admin_required
+def admin_download_profile(name):
+    path = profiling.capture_path(name)
+    if path is None:
+        abort(404)
+    return send_file(path, as_attachment=True)
+
+@app.route('/admin/export')
+@admin_required
+def admin_export():
+    return _export_response(models.export_characters(), 'compendium.jsonl')
+
+@app.route('/admin/backups')
+@admin_required
+def admin_backups():
+    return render_template('admin_backups.html', backups=backup.list_backups(), status=backup.status(),
+                           interval=backup.BACKUP_INTERVAL_HOURS, keep=backup.BACKUP_KEEP)
+
+@app.route('/admin/backups/run', methods=['POST'])
+@admin_required
+def admin_run_backup():
+    if backup.start_backup():
+        flash('Backup started')
+    else:
+        flash('A backup is already running')
+    return redirect(url_for('admin_backups'))
+
+@app.route('/admin/backups/<name>')
+@admin_required
+def admin_download_backup(name):
+    path = backup.backup_path(name)
+    if path is None:
+        abort(404)
+    return send_file(path, as_attachment=True)
+
+@app.route('/admin/catalog/<any(inventory, feature, spell):kind>/<int:catalog_id>/delete', methods=['POST'])
+@admin_required
+def admin_delete_catalog_entry(kind, catalog_id):
+    models.delete_catalog_entry(kind, catalog_id)
+    flash('Catalog entry removed')
+    return redirect(url_for('admin'))
+
+@app.route('/admin/catalog/deduplicate', methods=['POST'])
+@admin_required
+def admin_deduplicate_catalog():
+    relinked = sum(models.deduplicate_into_catalog(kind) for kind in models.CATALOG_KINDS)
+    flash(f'{relinked} entries now reference the catalog')
+    return redirect(url_for('admin'))
 
 @app.route('/admin/user/create', methods=['POST'])
 @admin_required
@@ -124,6 +260,40 @@ def admin_create_user():
     
     return redirect(url_for('admin'))
 
+@app.route('/admin/users/import', methods=['POST'])
+@admin_required
+def admin_provision_users():
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        flash('Choose a CSV file of users')
+        return redirect(url_for('admin'))
+
+    try:
+        report = models.provision_users(upload.stream, request.form.get('create_characters') == 'on',
+                                        MIN_PASSWORD_LENGTH)
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        flash(f'Provisioning failed: {e}')
+    else:
+        for message in _provision_summary(report):
+            flash(message)
+    return redirect(url_for('admin'))
+
+def _provision_summary(report, limit=20):
+    """Lines describing a provisioning report, listing at most limit names or errors each."""
+    lines = [f"Created {report['created']} users"
+             + (f" with {report['characters']} starter characters" if report['characters'] else '')
+             + f" in {report['seconds']:.2f}s"]
+    duplicates = report['duplicates']
+    if duplicates:
+        more = f' and {len(duplicates) - limit} more' if len(duplicates) > limit else ''
+        lines.append(f"Skipped {len(duplicates)} duplicate usernames: {', '.join(duplicates[:limit])}{more}")
+    errors = report['errors']
+    if errors:
+        more = f' and {len(errors) - limit} more' if len(errors) > limit else ''
+        lines.append(f"Skipped {len(errors)} rows: "
+                     + '; '.join(f'line {line}: {message}' for line, message in errors[:limit]) + more)
+    return lines
+
 @app.route('/admin/user/<int:user_id>/toggle-admin', methods=['POST'])
 @admin_required
 def admin_toggle_admin(user_id):
@@ -149,15 +319,133 @@ def admin_delete_user(user_id):
     user = models.get_user_by_id(user_id)
     if user:
         models.delete_user(user_id)
-        flash(f"User {user['username']} deleted")
+        flash(f"User {user['username']} deleted. You can restore them below for {models.UNDO_WINDOW // 60} minutes.")
     
     return redirect(url_for('admin'))
 
+@app.route('/admin/user/<int:user_id>/restore', methods=['POST'])
+@admin_required
+def admin_restore_user(user_id):
+    if models.restore_user(user_id):
+        flash('User restored')
+    else:
+        flash('That user can no longer be restored')
+    return redirect(url_for('admin'))
+
 @app.route('/dashboard')
 @login_required
 def dashboard():
     characters = models.get_characters_by_user(session['user_id'])
-    return render_template('dashboard.html', characters=characters)
+    deleted = models.get_deleted_characters(session['user_id'])
+    return render_template('dashboard.html', characters=characters, deleted=deleted)
+
+@app.route('/export')
+@login_required
+def export_own_characters():
+    return _export_response(models.export_characters(user_id=session['user_id']), 'characters.jsonl')
+
+@app.route('/import', methods=['POST'])
+@login_required
+def import_characters():
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        flash('Choose an export file to import')
+        return redirect(request.referrer or url_for('dashboard'))
+
+    keep_owners = bool(session.get('is_admin')) and request.form.get('keep_owners') == 'on'
+    try:
+        report = models.import_characters(upload.stream, session['user_id'], keep_owners)
+    except (ValueError, UnicodeDecodeError) as e:
+        flash(f'Import failed: {e}')
+    else:
+        flash(f"Imported {report['characters']} characters ({report['records']} records) in "
+              f"{report['seconds']:.2f}s, {report['records_per_second']:.0f} records/s"
+              + (f", skipped {report['skipped']} unknown properties" if report['skipped'] else '')
+              + (f", skipped {report['orphans']} records whose parent is missing" if report['orphans'] else ''))
+    return redirect(request.referrer or url_for('dashboard'))
+
+def _export_response(lines, filename):
+    """Stream an export as a JSON Lines download."""
+    response = app.response_class(lines, mimetype='application/x-ndjson')
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+@app.route('/parties')
+@login_required
+def parties():
+    party_list = models.get_parties_for_user(session['user_id'], session.get('is_admin'))
+    return render_template('parties.html', parties=party_list)
+
+@app.route('/parties/new', methods=['POST'])
+@admin_required
+def new_party():
+    name = request.form.get('name', '').strip()
+    if not name:
+        flash('Party name is required')
+        return redirect(url_for('parties'))
+    party_id = models.create_party(name, session['user_id'])
+    return redirect(url_for('view_party', party_id=party_id))
+
+def _load_party(party_id):
+    return models.get_party(party_id, session['user_id'], session.get('is_admin'))
+
+def _member_version(sheet):
+    return hashlib.sha256(json.dumps(sheet, sort_keys=True).encode()).hexdigest()[:12]
+
+@app.route('/party/<int:party_id>')
+@login_required
+def view_party(party_id):
+    party = _load_party(party_id)
+    if not party:
+        flash('Party not found')
+        return redirect(url_for('parties'))
+    members = models.get_party_sheets(party_id)
+    for member in members:
+        member['version'] = _member_version(member)
+    candidates = models.get_all_characters() if session.get('is_admin') else []
+    return render_template('party.html', party=party, members=members, candidates=candidates)
+
+@app.route('/party/<int:party_id>/members')
+@login_required
+def party_members_json(party_id):
+    """Member summaries, omitting those whose version the client already has (?known=id:version,...)."""
+    if not _load_party(party_id):
+        return jsonify({'ok': False, 'error': 'Not found'}), 404
+
+    known = {}
+    for pair in request.args.get('known', '').split(','):
+        member_id, _, version = pair.partition(':')
+        if member_id.isdigit():
+            known[int(member_id)] = version
+
+    members = models.get_party_sheets(party_id)
+    changed = []
+    for member in members:
+        member['version'] = _member_version(member)
+        if known.get(member['id']) != member['version']:
+            changed.append(member)
+    return jsonify({'ok': True, 'ids': [m['id'] for m in members], 'changed': changed})
+
+@app.route('/party/<int:party_id>/add', methods=['POST'])
+@admin_required
+def add_party_member(party_id):
+    character_id = request.form.get('character_id', type=int)
+    if character_id:
+        models.add_party_member(party_id, character_id)
+    return redirect(url_for('view_party', party_id=party_id))
+
+@app.route('/party/<int:party_id>/remove/<int:character_id>', methods=['POST'])
+@admin_required
+def remove_party_member(party_id, character_id):
+    models.remove_party_member(party_id, character_id)
+    return redirect(url_for('view_party', party_id=party_id))
+
+@app.route('/party/<int:party_id>/delete', methods=['POST'])
+@admin_required
+def delete_party(party_id):
+    models.delete_party(party_id)
+    flash('Party deleted')
+    return redirect(url_for('parties'))
 
 @app.route('/character/new', methods=['POST'])
 @login_required
@@ -168,55 +456,30 @@ def new_character():
 @app.route('/character/<int:character_id>')
 @login_required
 def view_character(character_id):
-    character = _verify_character_ownership(character_id)
-    if not character:
+    sheet = models.get_sheet(character_id, session['user_id'])
+    if not sheet:
         flash('Character not found')
         return redirect(url_for('dashboard'))
     
-    inventory = models.get_inventory(character_id)
-    bonuses = models.get_equipped_bonuses(character_id)
-    feature_bonuses = models.get_feature_bonuses(character_id)
-    for stat, val in feature_bonuses.items():
-        bonuses[stat] = bonuses.get(stat, 0) + val
-    spell_bonuses = models.get_spell_bonuses(character_id)
-    for stat, val in spell_bonuses.items():
-        bonuses[stat] = bonuses.get(stat, 0) + val
+    character = sheet['character']
+    bonuses = sheet['bonuses']
+    derived = models.compute_derived_stats(character, bonuses)
+    proficiencies = models.unpack_proficiencies(character['proficiencies'])
     stat_options = models.STAT_OPTIONS
-    features = models.get_features(character_id)
-    spells = models.get_spells(character_id)
-    currencies = models.get_currencies(character_id)
 
-    return render_template('sheet.html', character=character, inventory=inventory,
-                           bonuses=bonuses, stat_options=stat_options, features=features,
-                           spells=spells, currencies=currencies)
+    # The session cookie is written before a streamed body starts, so consume
+    # flashed messages now; base.html reads them back from the request context.
+    get_flashed_messages()
+    return stream_template('sheet.html', character=character, inventory=sheet['inventory'],
+                           bonuses=bonuses, derived=derived, proficiencies=proficiencies,
+                           stat_options=stat_options, features=sheet['features'],
+                           spells=sheet['spells'], currencies=sheet['currencies'])
 
 @app.route('/character/<int:character_id>/update', methods=['POST'])
 @login_required
 def update_character(character_id):
+    # models coerces and bounds each field per models.CHARACTER_FIELDS
     data = request.form.to_dict()
-
-    # Convert numeric fields
-    numeric_fields = [
-        'level', 'hp_current', 'hp_max', 'ac', 'proficiency_bonus',
-        'str_score', 'str_save_prof', 'dex_score', 'dex_save_prof',
-        'con_score', 'con_save_prof', 'int_score', 'int_save_prof',
-        'wis_score', 'wis_save_prof', 'cha_score', 'cha_save_prof',
-        'athletics_prof', 'acrobatics_prof', 'sleight_of_hand_prof', 'stealth_prof',
-        'arcana_prof', 'history_prof', 'investigation_prof', 'nature_prof', 'religion_prof',
-        'animal_handling_prof', 'insight_prof', 'medicine_prof', 'perception_prof', 'survival_prof',
-        'deception_prof', 'intimidation_prof', 'performance_prof', 'persuasion_prof',
-        'mana_current', 'mana_max',
-        'spellcasting', 'death_save_success', 'death_save_fail',
-        'initiative', 'speed', 'temp_hp'
-    ]
-
-    for field in numeric_fields:
-        if field in data:
-            try:
-                data[field] = int(data[field]) if data[field] else 0
-            except ValueError:
-                data[field] = 0
-
     models.update_character(character_id, session['user_id'], data)
     flash('Character updated!')
     return redirect(url_for('view_character', character_id=character_id))
@@ -228,52 +491,66 @@ def update_field(character_id):
     if not data or 'field' not in data or 'value' not in data:
         return jsonify({'ok': False, 'error': 'Missing field or value'}), 400
 
-    numeric_fields = [
-        'level', 'hp_current', 'hp_max', 'ac', 'proficiency_bonus',
-        'str_score', 'str_save_prof', 'dex_score', 'dex_save_prof',
-        'con_score', 'con_save_prof', 'int_score', 'int_save_prof',
-        'wis_score', 'wis_save_prof', 'cha_score', 'cha_save_prof',
-        'athletics_prof', 'acrobatics_prof', 'sleight_of_hand_prof', 'stealth_prof',
-        'arcana_prof', 'history_prof', 'investigation_prof', 'nature_prof', 'religion_prof',
-        'animal_handling_prof', 'insight_prof', 'medicine_prof', 'perception_prof', 'survival_prof',
-        'deception_prof', 'intimidation_prof', 'performance_prof', 'persuasion_prof',
-        'mana_current', 'mana_max',
-        'spellcasting', 'death_save_success', 'death_save_fail',
-        'initiative', 'speed', 'temp_hp'
-    ]
-
     field = data['field']
-    value = data['value']
+    if field not in models.CHARACTER_FIELD_NAMES:
+        return jsonify({'ok': False, 'error': 'Unknown field'}), 400
 
-    if field in numeric_fields:
-        try:
-            value = int(value) if value != '' else 0
-        except ValueError:
-            value = 0
-
-    result = models.update_character(character_id, session['user_id'], {field: value})
+    result = models.update_character(character_id, session['user_id'], {field: data['value']})
     if result:
         return jsonify({'ok': True})
     return jsonify({'ok': False, 'error': 'Update failed'}), 400
 
+@app.route('/character/<int:character_id>/batch', methods=['POST'])
+@character_api_required
+def apply_batch(character_id):
+    """Apply edits queued by the sheet while offline. Safe to retry: ops are deduplicated by op_id."""
+    data = request.get_json(silent=True)
+    ops = data.get('ops') if isinstance(data, dict) else None
+    # Malformed ops are answered one by one with status 'invalid', so the rest still apply
+    if not isinstance(ops, list):
+        return jsonify({'ok': False, 'error': 'Missing ops'}), 400
+    if len(ops) > models.MAX_BATCH_OPS:
+        return jsonify({'ok': False, 'error': 'Too many ops'}), 413
+
+    revision, results = models.apply_ops(character_id, session['user_id'], ops)
+    if revision is None:
+        return jsonify({'ok': False, 'error': 'Not found'}), 404
+    return jsonify({'ok': True, 'revision': revision, 'results': results})
+
+@app.route('/character/<int:character_id>/clone', methods=['POST'])
+@character_required
+def clone_character(character_id):
+    new_id = models.clone_character(character_id, session['user_id'])
+    flash(f"Copied {g.character['name']}")
+    return redirect(url_for('view_character', character_id=new_id))
+
 @app.route('/character/<int:character_id>/delete', methods=['POST'])
 @login_required
 def delete_character(character_id):
     models.delete_character(character_id, session['user_id'])
-    flash('Character deleted')
+    flash(f'Character deleted. You can restore it from your dashboard for {models.UNDO_WINDOW // 60} minutes.')
     return redirect(url_for('dashboard'))
 
+@app.route('/character/<int:character_id>/restore', methods=['POST'])
+@login_required
+def restore_character(character_id):
+    if models.restore_character(character_id, session['user_id']):
+        flash('Character restored')
+    else:
+        flash('That character can no longer be restored')
+    return redirect(url_for('dashboard'))
+
+@app.route('/character/<int:character_id>/export')
+@character_required
+def export_character(character_id):
+    return _export_response(models.export_characters(character_id=character_id), f'character-{character_id}.jsonl')
+
 
 # --- Inventory Routes ---
 
 @app.route('/character/<int:character_id>/inventory/add', methods=['POST'])
-@login_required
+@character_required
 def add_inventory_item(character_id):
-    character = _verify_character_ownership(character_id)
-    if not character:
-        flash('Character not found')
-        return redirect(url_for('dashboard'))
-    
     name = request.form.get('item_name', '').strip()
     if not name:
         flash('Item name is required')
@@ -293,13 +570,8 @@ def add_inventory_item(character_id):
     return redirect(url_for('view_character', character_id=character_id))
 
 @app.route('/character/<int:character_id>/inventory/<int:item_id>/update', methods=['POST'])
-@login_required
+@character_required
 def update_inventory_item(character_id, item_id):
-    character = _verify_character_ownership(character_id)
-    if not character:
-        flash('Character not found')
-        return redirect(url_for('dashboard'))
-    
     name = request.form.get('item_name', '').strip()
     if not name:
         flash('Item name is required')
@@ -317,25 +589,15 @@ def update_inventory_item(character_id, item_id):
     return redirect(url_for('view_character', character_id=character_id))
 
 @app.route('/character/<int:character_id>/inventory/<int:item_id>/delete', methods=['POST'])
-@login_required
+@character_required
 def delete_inventory_item(character_id, item_id):
-    character = _verify_character_ownership(character_id)
-    if not character:
-        flash('Character not found')
-        return redirect(url_for('dashboard'))
-    
     models.delete_inventory_item(item_id, character_id)
     flash('Item removed from inventory')
     return redirect(url_for('view_character', character_id=character_id))
 
 @app.route('/character/<int:character_id>/inventory/<int:item_id>/toggle-equip', methods=['POST'])
-@login_required
+@character_required
 def toggle_equip_item(character_id, item_id):
-    character = _verify_character_ownership(character_id)
-    if not character:
-        flash('Character not found')
-        return redirect(url_for('dashboard'))
-    
     new_status = models.toggle_equip_item(item_id, character_id)
     if new_status is not None:
         item = models.get_inventory_item(item_id, character_id)
@@ -345,13 +607,9 @@ def toggle_equip_item(character_id, item_id):
     return redirect(url_for('view_character', character_id=character_id))
 
 @app.route('/character/<int:character_id>/inventory/<int:item_id>/json')
-@login_required
+@character_api_required
 def get_inventory_item_json(character_id, item_id):
     """Return item data as JSON for the edit modal."""
-    character = _verify_character_ownership(character_id)
-    if not character:
-        return jsonify({'error': 'Not found'}), 404
-    
     item = models.get_inventory_item(item_id, character_id)
     if not item:
         return jsonify({'error': 'Item not found'}), 404
@@ -362,13 +620,8 @@ def get_inventory_item_json(character_id, item_id):
 # --- Feature Routes ---
 
 @app.route('/character/<int:character_id>/feature/add', methods=['POST'])
-@login_required
+@character_required
 def add_feature(character_id):
-    character = _verify_character_ownership(character_id)
-    if not character:
-        flash('Character not found')
-        return redirect(url_for('dashboard'))
-
     name = request.form.get('feature_name', '').strip()
     if not name:
         flash('Feature name is required')
@@ -385,13 +638,8 @@ def add_feature(character_id):
     return redirect(url_for('view_character', character_id=character_id))
 
 @app.route('/character/<int:character_id>/feature/<int:feature_id>/update', methods=['POST'])
-@login_required
+@character_required
 def update_feature(character_id, feature_id):
-    character = _verify_character_ownership(character_id)
-    if not character:
-        flash('Character not found')
-        return redirect(url_for('dashboard'))
-
     name = request.form.get('feature_name', '').strip()
     if not name:
         flash('Feature name is required')
@@ -407,24 +655,42 @@ def update_feature(character_id, feature_id):
     return redirect(url_for('view_character', character_id=character_id))
 
 @app.route('/character/<int:character_id>/feature/<int:feature_id>/delete', methods=['POST'])
-@login_required
+@character_required
 def delete_feature(character_id, feature_id):
-    character = _verify_character_ownership(character_id)
-    if not character:
-        flash('Character not found')
-        return redirect(url_for('dashboard'))
-
     models.delete_feature(feature_id, character_id)
     flash('Feature removed')
     return redirect(url_for('view_character', character_id=character_id))
 
+@app.route('/character/<int:character_id>/<any(inventory, feature, spell):kind>/<int:entry_id>/description')
+@character_api_required
+def entry_description(character_id, kind, entry_id):
+    """Full description for an entry the sheet only has a preview of.
+
+    The sheet links it with the description's own version (?v=), which only changes
+    when the text does, so the response for the current one can be cached for good.
+    """
+    found = models.get_description(kind, entry_id, character_id)
+    if found is None:
+        return jsonify({'ok': False, 'error': 'Not found'}), 404
+    description, version = found
+
+    etag = hashlib.sha256(description.encode()).hexdigest()[:16]
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify({'ok': True, 'description': description})
+    response.set_etag(etag)
+    response.cache_control.private = True
+    if request.args.get('v') == version:
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
 @app.route('/character/<int:character_id>/feature/<int:feature_id>/json')
-@login_required
+@character_api_required
 def get_feature_json(character_id, feature_id):
-    character = _verify_character_ownership(character_id)
-    if not character:
-        return jsonify({'error': 'Not found'}), 404
-
     feature = models.get_feature(feature_id, character_id)
     if not feature:
         return jsonify({'error': 'Feature not found'}), 404
@@ -435,13 +701,8 @@ def get_feature_json(character_id, feature_id):
 # --- Spell Routes ---
 
 @app.route('/character/<int:character_id>/spell/add', methods=['POST'])
-@login_required
+@character_required
 def add_spell(character_id):
-    character = _verify_character_ownership(character_id)
-    if not character:
-        flash('Character not found')
-        return redirect(url_for('dashboard'))
-
     name = request.form.get('spell_name', '').strip()
     if not name:
         flash('Spell name is required')
@@ -460,13 +721,8 @@ def add_spell(character_id):
     return redirect(url_for('view_character', character_id=character_id))
 
 @app.route('/character/<int:character_id>/spell/<int:spell_id>/update', methods=['POST'])
-@login_required
+@character_required
 def update_spell(character_id, spell_id):
-    character = _verify_character_ownership(character_id)
-    if not character:
-        flash('Character not found')
-        return redirect(url_for('dashboard'))
-
     name = request.form.get('spell_name', '').strip()
     if not name:
         flash('Spell name is required')
@@ -484,24 +740,15 @@ def update_spell(character_id, spell_id):
     return redirect(url_for('view_character', character_id=character_id))
 
 @app.route('/character/<int:character_id>/spell/<int:spell_id>/delete', methods=['POST'])
-@login_required
+@character_required
 def delete_spell(character_id, spell_id):
-    character = _verify_character_ownership(character_id)
-    if not character:
-        flash('Character not found')
-        return redirect(url_for('dashboard'))
-
     models.delete_spell(spell_id, character_id)
     flash('Spell removed')
     return redirect(url_for('view_character', character_id=character_id))
 
 @app.route('/character/<int:character_id>/spell/<int:spell_id>/json')
-@login_required
+@character_api_required
 def get_spell_json(character_id, spell_id):
-    character = _verify_character_ownership(character_id)
-    if not character:
-        return jsonify({'error': 'Not found'}), 404
-
     spell = models.get_spell(spell_id, character_id)
     if not spell:
         return jsonify({'error': 'Spell not found'}), 404
@@ -512,13 +759,8 @@ def get_spell_json(character_id, spell_id):
 # --- Currency Routes ---
 
 @app.route('/character/<int:character_id>/currency/add', methods=['POST'])
-@login_required
+@character_required
 def add_currency(character_id):
-    character = _verify_character_ownership(character_id)
-    if not character:
-        flash('Character not found')
-        return redirect(url_for('dashboard'))
-
     name = request.form.get('currency_name', '').strip()
     abbreviation = request.form.get('currency_abbreviation', '').strip()
     if not name:
@@ -530,24 +772,15 @@ def add_currency(character_id):
     return redirect(url_for('view_character', character_id=character_id))
 
 @app.route('/character/<int:character_id>/currency/<int:currency_id>/delete', methods=['POST'])
-@login_required
+@character_required
 def delete_currency(character_id, currency_id):
-    character = _verify_character_ownership(character_id)
-    if not character:
-        flash('Character not found')
-        return redirect(url_for('dashboard'))
-
     models.delete_currency(currency_id, character_id)
     flash('Currency removed')
     return redirect(url_for('view_character', character_id=character_id))
 
 @app.route('/character/<int:character_id>/currency/<int:currency_id>/adjust', methods=['POST'])
-@login_required
+@character_api_required
 def adjust_currency(character_id, currency_id):
-    character = _verify_character_ownership(character_id)
-    if not character:
-        return jsonify({'ok': False, 'error': 'Not found'}), 404
-
     data = request.get_json()
     if not data or 'delta' not in data:
         return jsonify({'ok': False, 'error': 'Missing delta'}), 400
@@ -565,12 +798,8 @@ def adjust_currency(character_id, currency_id):
 
 
 @app.route('/character/<int:character_id>/property/toggle', methods=['POST'])
-@login_required
+@character_api_required
 def toggle_property(character_id):
-    character = _verify_character_ownership(character_id)
-    if not character:
-        return jsonify({'ok': False, 'error': 'Not found'}), 404
-
     data = request.get_json()
     if not data or 'table' not in data or 'prop_id' not in data:
         return jsonify({'ok': False, 'error': 'Missing table or prop_id'}), 400
@@ -588,6 +817,150 @@ def toggle_property(character_id):
     return jsonify({'ok': True, 'enabled': new_state})
 
 
+# --- Catalog Routes ---
+
+@app.route('/catalog/<any(inventory, feature, spell):kind>')
+@login_required
+def get_catalog_json(kind):
+    return jsonify(models.get_catalog(kind))
+
+@app.route('/character/<int:character_id>/<any(inventory, feature, spell):kind>/add-from-catalog', methods=['POST'])
+@character_required
+def add_from_catalog(character_id, kind):
+    try:
+        catalog_id = int(request.form.get('catalog_id', ''))
+    except ValueError:
+        flash('Choose an entry from the compendium')
+        return redirect(url_for('view_character', character_id=character_id))
+
+    props_enabled = 0 if request.form.get('props_disabled') else 1
+    if models.add_from_catalog(kind, character_id, catalog_id, props_enabled) is None:
+        flash('Compendium entry not found')
+    else:
+        flash('Added from the compendium')
+    return redirect(url_for('view_character', character_id=character_id))
+
+@app.route('/character/<int:character_id>/<any(inventory, feature, spell):kind>/<int:entry_id>/publish', methods=['POST'])
+@admin_required
+@character_required
+def publish_to_catalog(character_id, kind, entry_id):
+    if models.publish_to_catalog(kind, entry_id, character_id) is None:
+        flash('Entry not found')
+    else:
+        flash('Published to the compendium')
+    return redirect(url_for('view_character', character_id=character_id))
+
+
+@app.route('/character/<int:character_id>/<any(inventory, feature, spell, currency):kind>/reorder', methods=['POST'])
+@character_api_required
+def reorder_entries(character_id, kind):
+    data = request.get_json()
+    if not data or not isinstance(data.get('ids'), list):
+        return jsonify({'ok': False, 'error': 'Missing ids'}), 400
+
+    try:
+        ordered_ids = [int(entry_id) for entry_id in data['ids']]
+    except (ValueError, TypeError):
+        return jsonify({'ok': False, 'error': 'Invalid ids'}), 400
+
+    if not models.reorder_entries(kind, character_id, ordered_ids):
+        return jsonify({'ok': False, 'error': 'Ids do not match entries'}), 409
+
+    return jsonify({'ok': True})
+
+
+@app.route('/character/<int:character_id>/stats')
+@character_api_required
+def derived_stats(character_id):
+    character = models.get_character(character_id, session['user_id'])
+    stats = models.compute_derived_stats(character, models.get_all_bonuses(character_id))
+    return jsonify({'ok': True, 'stats': stats})
+
+
+# Sheet collections sent by /changes: (response key, change log kind, loader)
+SYNC_COLLECTIONS = [
+    ('inventory', 'item', models.get_inventory),
+    ('features', 'feature', models.get_features),
+    ('spells', 'spell', models.get_spells),
+    ('currencies', 'currency', models.get_currencies),
+]
+
+@app.route('/character/<int:character_id>/changes')
+@character_api_required
+def character_changes(character_id):
+    """Everything that changed after revision ?since=, or the whole sheet when the log can't tell."""
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify({'ok': False, 'error': 'Missing since'}), 400
+
+    # Read the revision first: anything written meanwhile is sent again next time, never missed
+    revision, changed = models.get_changes(character_id, since)
+    response = {'ok': True, 'revision': revision, 'full': changed is None}
+
+    if changed is None:
+        # One snapshot read when COMPENDIUM_SHEET_SNAPSHOTS is on
+        sheet = models.get_sheet(character_id, session['user_id'])
+        # Deleted since the ownership check
+        if sheet is None:
+            return jsonify({'ok': False, 'error': 'Not found'}), 404
+        character = sheet['character']
+        response['character'] = _sync_character(character)
+        for key, _, _ in SYNC_COLLECTIONS:
+            response[key] = sheet[key]
+        response['stats'] = models.compute_derived_stats(character, sheet['bonuses'])
+        return jsonify(response)
+
+    character = models.get_character(character_id, session['user_id'])
+    if character is None:
+        return jsonify({'ok': False, 'error': 'Not found'}), 404
+    if 'character' in changed:
+        response['character'] = _sync_character(character)
+    for key, kind, load in SYNC_COLLECTIONS:
+        ids = changed.get(kind)
+        if ids:
+            updated = [entry for entry in load(character_id) if entry['id'] in ids]
+            response[key] = {'updated': updated, 'deleted': sorted(ids - {entry['id'] for entry in updated})}
+
+    if changed:
+        response['stats'] = models.compute_derived_stats(character, models.get_all_bonuses(character_id))
+    return jsonify(response)
+
+def _sync_character(character):
+    """The character row plus its proficiency levels under the sheet's field names."""
+    return {**character, **models.unpack_proficiencies(character['proficiencies'])}
+
+
+@app.route('/character/<int:character_id>/checks')
+@character_api_required
+def check_probabilities(character_id):
+    dc = request.args.get('dc', type=int)
+    mode = request.args.get('mode', 'normal')
+    if dc is None:
+        return jsonify({'ok': False, 'error': 'Missing dc'}), 400
+    if mode not in dice.CHECK_MODES:
+        return jsonify({'ok': False, 'error': 'Invalid mode'}), 400
+
+    character = models.get_character(character_id, session['user_id'])
+    modifiers = models.get_check_modifiers(character, models.get_all_bonuses(character_id))
+
+    # The answer depends only on these inputs, so they make a stable validator
+    etag = hashlib.sha256(json.dumps([modifiers, dc, mode], sort_keys=True).encode()).hexdigest()[:16]
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify({
+            'ok': True,
+            'dc': dc,
+            'mode': mode,
+            'modifiers': modifiers,
+            'probabilities': dice.check_probabilities(modifiers, dc, mode),
+        })
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
 def _parse_properties_from_form(form):
     """Parse dynamic property fields from the form submission."""
     properties = []
@@ -599,7 +972,8 @@ def _parse_properties_from_form(form):
             break
         stat = form.get(stat_key, '').strip()
         value_str = form.get(value_key, '').strip()
-        if stat and value_str:
+        # Only stats the form offers; anything else would be rejected by models
+        if stat in models.STAT_KEYS and value_str:
             try:
                 value = int(value_str)
                 properties.append({'stat_modified': stat, 'value': value})
@@ -609,5 +983,18 @@ def _parse_properties_from_form(form):
     return properties
 
 
+@app.cli.command('provision-users')
+@click.argument('csv_file', type=click.File('rb'))
+@click.option('--characters', is_flag=True, help='Give every new user a starter character.')
+def provision_users_command(csv_file, characters):
+    """Create users from CSV_FILE (columns: username, password, is_admin)."""
+    try:
+        report = models.provision_users(csv_file, characters, MIN_PASSWORD_LENGTH)
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        raise click.ClickException(str(e))
+    for line in _provision_summary(report, limit=len(report['duplicates']) + len(report['errors'])):
+        click.echo(line)
+
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,117 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+
+from flask import Response, abort, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Hashed assets never change, so browsers may keep them for a year without revalidating
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+ASSET_EXTENSIONS = ('.js', '.css')
+
+_manifest = {}   # source filename -> asset dict
+_by_hashed = {}  # hashed filename -> asset dict
+
+
+def _hashed_name(filename, digest):
+    base, ext = os.path.splitext(filename)
+    return f'{base}.{digest}{ext}'
+
+
+def _load_asset(static_folder, filename):
+    """Read a static file and build its fingerprinted, precompressed variants."""
+    path = os.path.join(static_folder, filename)
+    with open(path, 'rb') as f:
+        body = f.read()
+    digest = hashlib.sha256(body).hexdigest()[:12]
+    variants = {'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, quality=11)
+
+    asset = {
+        'filename': filename,
+        'hashed': _hashed_name(filename, digest),
+        'digest': digest,
+        'mtime': os.path.getmtime(path),
+        'mimetype': mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+        'body': body,
+        'variants': variants,
+    }
+
+    old = _manifest.get(filename)
+    if old:
+        _by_hashed.pop(old['hashed'], None)
+    _manifest[filename] = asset
+    _by_hashed[asset['hashed']] = asset
+    return asset
+
+
+def build_manifest(static_folder):
+    """Fingerprint every JS/CSS file in the static folder."""
+    _manifest.clear()
+    _by_hashed.clear()
+    for filename in sorted(os.listdir(static_folder)):
+        if filename.endswith(ASSET_EXTENSIONS):
+            _load_asset(static_folder, filename)
+
+
+def manifest_version():
+    """Digest of every asset's content; changes whenever any asset does."""
+    return hashlib.sha256(''.join(a['digest'] for a in _manifest.values()).encode()).hexdigest()[:12]
+
+
+def hashed_urls(app):
+    """URLs of every fingerprinted asset, e.g. for a service worker to precache."""
+    return [f"{app.static_url_path}/assets/{a['hashed']}" for a in _manifest.values()]
+
+
+def _pick_encoding(asset):
+    """Choose the best precompressed variant the client accepts, or None for identity."""
+    accepted = request.accept_encodings
+    for encoding in ('br', 'gzip'):
+        if encoding in asset['variants'] and accepted[encoding]:
+            return encoding
+    return None
+
+
+def init_app(app):
+    """Register the fingerprinted asset route and the asset_url() template helper."""
+    build_manifest(app.static_folder)
+
+    def asset_url(filename):
+        asset = _manifest.get(filename)
+        if asset is None:
+            abort(500, f'Unknown static asset: {filename}')
+        # Pick up edits while developing without restarting the server
+        if app.debug and os.path.getmtime(os.path.join(app.static_folder, filename)) != asset['mtime']:
+            asset = _load_asset(app.static_folder, filename)
+        return f"{app.static_url_path}/assets/{asset['hashed']}"
+
+    @app.context_processor
+    def inject_asset_url():
+        return {'asset_url': asset_url}
+
+    @app.route(f'{app.static_url_path}/assets/<path:hashed>')
+    def hashed_asset(hashed):
+        asset = _by_hashed.get(hashed)
+        if asset is None:
+            abort(404)
+
+        if request.if_none_match.contains(asset['digest']):
+            response = Response(status=304)
+        else:
+            encoding = _pick_encoding(asset)
+            body = asset['variants'][encoding] if encoding else asset['body']
+            response = Response(body, mimetype=asset['mimetype'])
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+
+        response.set_etag(asset['digest'])
+        response.headers['Cache-Control'] = CACHE_CONTROL
+        response.vary.add('Accept-Encoding')
+        return response
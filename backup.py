@@ -0,0 +1,248 @@
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, so every process schedules
+    fcntl = None
+
+import models
+
+BACKUP_DIR = 'backups'
+# Hours between scheduled backups; 0 turns the scheduler off (on-demand backups still work)
+BACKUP_INTERVAL_HOURS = float(os.environ.get('COMPENDIUM_BACKUP_INTERVAL_HOURS', '24'))
+# Oldest backups are deleted once there are more than this many
+BACKUP_KEEP = 14
+# Pages copied per step; the source is only locked while a step runs
+PAGES_PER_STEP = 256
+# Pause between steps so writers waiting on the lock get in
+STEP_SLEEP = 0.01
+# A write from another connection restarts an online backup; after this many restarts
+# the rest is copied in a single step instead of chasing a busy database forever
+MAX_RESTARTS = 5
+# Lock file in BACKUP_DIR; only the process holding it runs scheduled backups, so
+# several workers (e.g. gunicorn -w 4) don't each start one
+SCHEDULER_LOCK_NAME = '.scheduler.lock'
+# How often a process without the lock checks whether the holder has exited
+LOCK_RETRY_SECONDS = 300
+
+_backup_lock = threading.Lock()
+_status = {'running': False, 'last_name': None, 'last_error': None, 'last_finished': None}
+_scheduler = None
+_scheduler_lock = threading.Lock()
+_scheduler_lock_file = None
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def _backup_name():
+    return f'compendium-{time.strftime("%Y%m%d-%H%M%S")}-{int(time.time() * 1000) % 1000:03d}.db'
+
+
+def _copy(source, target, pages, sleep):
+    """Run one online backup, aborting if it keeps being restarted by concurrent writes."""
+    state = {'remaining': None, 'restarts': 0}
+
+    def progress(status, remaining, total):
+        if state['remaining'] is not None and remaining > state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] > MAX_RESTARTS:
+                raise _TooManyRestarts()
+        state['remaining'] = remaining
+        time.sleep(sleep)
+
+    source.backup(target, pages=pages, progress=progress)
+
+
+def _shard_name(name, shard):
+    """File holding one shard of a backup; shard 0 is compendium.db itself and uses the backup's name."""
+    if not shard:
+        return name
+    root, ext = os.path.splitext(name)
+    return f'{root}-shard{shard}{ext}'
+
+
+def _is_backup(name):
+    return name.startswith('compendium-') and name.endswith('.db') and '-shard' not in name
+
+
+def _verify(path):
+    """PRAGMA integrity_check on a backup file. Returns None when it's sound, else the problems."""
+    conn = sqlite3.connect(path)
+    try:
+        rows = [row[0] for row in conn.execute('PRAGMA integrity_check')]
+    finally:
+        conn.close()
+    return None if rows == ['ok'] else '; '.join(rows)
+
+
+def _rotate():
+    for old in list_backups()[BACKUP_KEEP:]:
+        for shard in range(models.SHARDS):
+            try:
+                os.remove(os.path.join(BACKUP_DIR, _shard_name(old['name'], shard)))
+            except OSError:
+                pass
+
+
+def run_backup():
+    """Back up the live database to a new verified file in BACKUP_DIR. Returns its name.
+
+    Copies a few pages at a time so writers are only held off for one step, checks the
+    copy with PRAGMA integrity_check, and only then gives it its final name. Raises
+    RuntimeError if another backup is running or the copy fails verification.
+
+    With shards, each shard file is copied next to the backup as <name>-shard<n>.db;
+    the shard files are renamed before the backup itself, so a listed backup is complete.
+    """
+    if not _backup_lock.acquire(blocking=False):
+        raise RuntimeError('A backup is already running')
+    _status['running'] = True
+    name = _backup_name()
+    partials = [os.path.join(BACKUP_DIR, _shard_name(name, shard) + '.partial') for shard in range(models.SHARDS)]
+    try:
+        os.makedirs(BACKUP_DIR, exist_ok=True)
+        for shard, partial in enumerate(partials):
+            source = sqlite3.connect(models.shard_path(shard))
+            target = sqlite3.connect(partial)
+            try:
+                try:
+                    _copy(source, target, PAGES_PER_STEP, STEP_SLEEP)
+                except _TooManyRestarts:
+                    _copy(source, target, -1, 0)
+                # The copy inherits WAL mode; a backup should be one self-contained file
+                target.execute('PRAGMA journal_mode = DELETE')
+            finally:
+                target.close()
+                source.close()
+
+            problems = _verify(partial)
+            if problems:
+                raise RuntimeError(f'Backup failed integrity check: {problems}')
+        for partial in reversed(partials):
+            os.replace(partial, partial[:-len('.partial')])
+        _rotate()
+        _status.update(last_name=name, last_error=None)
+        return name
+    except (OSError, sqlite3.Error, RuntimeError) as e:
+        _status['last_error'] = str(e)
+        for partial in partials:
+            if os.path.exists(partial):
+                os.remove(partial)
+        raise
+    finally:
+        _status.update(running=False, last_finished=time.time())
+        _backup_lock.release()
+
+
+def start_backup():
+    """Run a backup on a background thread. Returns False if one is already running."""
+    if _status['running']:
+        return False
+    threading.Thread(target=_run_quietly, name='compendium-backup', daemon=True).start()
+    return True
+
+
+def _run_quietly():
+    try:
+        run_backup()
+    except (OSError, sqlite3.Error, RuntimeError):
+        pass  # kept in _status for the admin page
+
+
+def _seconds_until_due():
+    """Time left before the next scheduled backup, counted from the newest finished backup."""
+    newest = 0
+    if os.path.isdir(BACKUP_DIR):
+        for name in os.listdir(BACKUP_DIR):
+            # A .partial file may be a backup that is about to fail verification
+            if _is_backup(name):
+                try:
+                    newest = max(newest, os.path.getmtime(os.path.join(BACKUP_DIR, name)))
+                except OSError:
+                    pass
+    return newest + BACKUP_INTERVAL_HOURS * 3600 - time.time()
+
+
+def _hold_scheduler_lock():
+    """Take the scheduler lock for the life of this process. Returns False if another process holds it."""
+    global _scheduler_lock_file
+    if fcntl is None:
+        return True
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    lock_file = open(os.path.join(BACKUP_DIR, SCHEDULER_LOCK_NAME), 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    # Kept open: the lock is released when the file is closed or the process exits
+    _scheduler_lock_file = lock_file
+    return True
+
+
+def _schedule_loop():
+    while not _hold_scheduler_lock():
+        time.sleep(LOCK_RETRY_SECONDS)
+    while True:
+        wait = _seconds_until_due()
+        if wait > 0:
+            time.sleep(min(wait, 3600))
+            continue
+        _run_quietly()
+        # Don't spin if the backup keeps failing
+        time.sleep(60)
+
+
+def _start_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = threading.Thread(target=_schedule_loop, name='compendium-backup-scheduler', daemon=True)
+            _scheduler.start()
+
+
+def init_app(app):
+    """Back up the database every BACKUP_INTERVAL_HOURS from a background thread in one process."""
+    if BACKUP_INTERVAL_HOURS <= 0:
+        return
+
+    # Started by the first request rather than at import, so the reloader's
+    # watcher process and one-off scripts importing the app don't run backups
+    @app.before_request
+    def ensure_scheduler():
+        if _scheduler is None:
+            _start_scheduler()
+
+
+def status():
+    return dict(_status)
+
+
+def list_backups():
+    """Newest-first backups with their sizes."""
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+    backups = []
+    for name in sorted(os.listdir(BACKUP_DIR), reverse=True):
+        if not _is_backup(name):
+            continue
+        path = os.path.join(BACKUP_DIR, name)
+        try:
+            created = time.strftime('%Y-%m-%d %H:%M', time.localtime(os.path.getmtime(path)))
+            backups.append({'name': name, 'size': os.path.getsize(path), 'created': created})
+        except OSError:
+            continue
+    return backups
+
+
+def backup_path(name):
+    """Absolute path of a backup, or None if the name isn't a backup file."""
+    if os.path.basename(name) != name or not _is_backup(name):
+        return None
+    path = os.path.abspath(os.path.join(BACKUP_DIR, name))
+    return path if os.path.isfile(path) else None
@@ -0,0 +1,90 @@
+import gzip
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this aren't worth the CPU or the extra header bytes
+MIN_SIZE = 1024
+COMPRESSIBLE_MIMETYPES = {'text/html', 'application/json', 'application/x-ndjson'}
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Streamed responses are flushed to the client every time this much output accumulates
+STREAM_FLUSH_SIZE = 8192
+
+
+def _pick_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def _compress_stream(chunks, encoding):
+    """Incrementally compress a streamed body, flushing periodically so the browser can start rendering."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        compress, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+        compress = compressor.compress
+        flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+        finish = compressor.flush
+
+    pending = 0
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        out = compress(chunk)
+        pending += len(chunk)
+        if pending >= STREAM_FLUSH_SIZE:
+            out += flush()
+            pending = 0
+        if out:
+            yield out
+    yield finish()
+
+
+def init_app(app):
+    """Compress HTML, JSON and JSON Lines responses for clients that accept gzip or brotli."""
+
+    @app.after_request
+    def compress_response(response):
+        if (response.status_code < 200 or response.status_code in (204, 304)
+                or response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = _pick_encoding()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = _compress_stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < MIN_SIZE:
+                return response
+            response.set_data(_compress(data, encoding))
+
+        response.headers['Content-Encoding'] = encoding
+        # A strong validator describes the uncompressed bytes, so downgrade it
+        etag, _ = response.get_etag()
+        if etag:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,143 @@
+"""Dice expressions with exact outcome distributions.
+
+Expressions are sums of terms such as ``1d20+3``, ``2d20kh1`` (keep highest 1)
+or ``2d20kl1`` (keep lowest 1), limited to the dice an ability check rolls. A distribution is an ``(offset, counts)`` pair:
+``counts[i]`` is the number of equally likely rolls that total ``offset + i``.
+Counts are integers, so every probability derived from them is exact.
+"""
+import math
+import re
+from functools import lru_cache
+from itertools import combinations_with_replacement
+
+# d20 rolls for each check mode
+CHECK_MODES = {
+    'normal': '1d20',
+    'advantage': '2d20kh1',
+    'disadvantage': '2d20kl1',
+}
+
+# A check rolls at most two d20s (advantage or disadvantage)
+MAX_DICE = 2
+MAX_SIDES = 20
+
+_TERM = re.compile(r'\s*([+-])?\s*(?:(\d*)d(\d+)(?:(kh|kl)(\d+))?|(\d+))\s*', re.IGNORECASE)
+
+
+def parse(expr):
+    """Parse an expression into (sign, count, sides, keep, kept) dice terms and a constant."""
+    text = expr.strip()
+    if not text:
+        raise ValueError('Empty dice expression')
+
+    terms = []
+    constant = 0
+    pos = 0
+    while pos < len(text):
+        match = _TERM.match(text, pos)
+        if not match or match.end() == pos or (pos > 0 and not match.group(1)):
+            raise ValueError(f'Invalid dice expression: {expr}')
+        sign = -1 if match.group(1) == '-' else 1
+        if match.group(6) is not None:
+            constant += sign * int(match.group(6))
+        else:
+            count = int(match.group(2) or 1)
+            sides = int(match.group(3))
+            keep = (match.group(4) or '').lower() or None
+            kept = int(match.group(5)) if keep else count
+            if not 1 <= count <= MAX_DICE or not 1 <= sides <= MAX_SIDES or not 1 <= kept <= count:
+                raise ValueError(f'Dice out of range: {match.group(0)}')
+            terms.append((sign, count, sides, keep, kept))
+        pos = match.end()
+    return terms, constant
+
+
+def convolve(a, b):
+    """Distribution of the sum of two independent distributions."""
+    offset_a, counts_a = a
+    offset_b, counts_b = b
+    out = [0] * (len(counts_a) + len(counts_b) - 1)
+    for i, x in enumerate(counts_a):
+        if x:
+            for j, y in enumerate(counts_b):
+                out[i + j] += x * y
+    return offset_a + offset_b, out
+
+
+def _negate(dist):
+    offset, counts = dist
+    return -(offset + len(counts) - 1), counts[::-1]
+
+
+@lru_cache(maxsize=256)
+def _dice_distribution(count, sides):
+    """Sum of ``count`` dice, built by repeated squaring of the single-die distribution."""
+    result = (0, [1])
+    base = (1, [1] * sides)
+    while count:
+        if count & 1:
+            result = convolve(result, base)
+        count >>= 1
+        if count:
+            base = convolve(base, base)
+    return result
+
+
+@lru_cache(maxsize=256)
+def _keep_distribution(count, sides, keep, kept):
+    """Sum of the highest/lowest ``kept`` of ``count`` dice."""
+    if kept == 1 and keep == 'kh':
+        # P(max <= x) = (x / sides) ** count
+        counts = [x ** count - (x - 1) ** count for x in range(1, sides + 1)]
+        return 1, counts
+    if kept == 1 and keep == 'kl':
+        counts = [(sides - x + 1) ** count - (sides - x) ** count for x in range(1, sides + 1)]
+        return 1, counts
+
+    lowest = kept
+    counts = [0] * (kept * sides - kept + 1)
+    for roll in combinations_with_replacement(range(1, sides + 1), count):
+        # Number of orderings of this multiset of faces
+        weight = math.factorial(count)
+        for face in set(roll):
+            weight //= math.factorial(roll.count(face))
+        total = sum(roll[-kept:]) if keep == 'kh' else sum(roll[:kept])
+        counts[total - lowest] += weight
+    return lowest, counts
+
+
+@lru_cache(maxsize=1024)
+def distribution(expr):
+    """Exact distribution of an expression as an (offset, counts) pair."""
+    terms, constant = parse(expr)
+    result = (constant, [1])
+    for sign, count, sides, keep, kept in terms:
+        dist = _keep_distribution(count, sides, keep, kept) if keep else _dice_distribution(count, sides)
+        result = convolve(result, dist if sign > 0 else _negate(dist))
+    return result
+
+
+@lru_cache(maxsize=16)
+def _tail_counts(expr):
+    """tail[i] = number of rolls totalling at least offset + i, plus the total roll count."""
+    offset, counts = distribution(expr)
+    tail = counts[:]
+    for i in range(len(tail) - 2, -1, -1):
+        tail[i] += tail[i + 1]
+    return offset, tail, tail[0]
+
+
+def success_probability(modifier, dc, mode='normal'):
+    """Chance that a d20 check with ``modifier`` meets or beats ``dc``."""
+    offset, tail, total = _tail_counts(CHECK_MODES[mode])
+    index = dc - modifier - offset
+    if index <= 0:
+        return 1.0
+    if index >= len(tail):
+        return 0.0
+    return tail[index] / total
+
+
+def check_probabilities(modifiers, dc, mode='normal'):
+    """Success chance for every check in a {check: modifier} mapping."""
+    return {check: success_probability(mod, dc, mode) for check, mod in modifiers.items()}
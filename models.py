@@ -1,16 +1,231 @@
+import csv
+import os
+import re
 import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from werkzeug.security import generate_password_hash, check_password_hash
 import json
 
 DATABASE = 'compendium.db'
-
-def get_db():
-    conn = sqlite3.connect(DATABASE)
+# Seconds a connection waits for another connection's write lock before failing
+BUSY_TIMEOUT = 10
+
+# Optional sharding: with COMPENDIUM_SHARDS above 1, each user's characters (and everything
+# under them) live in one of that many files, so users on different shards never wait for
+# each other's write lock. compendium.db keeps the shared tables and is also shard 0.
+SHARDS = int(os.environ.get('COMPENDIUM_SHARDS', '1'))
+# Ids in shard n start at n << SHARD_ID_BITS, so a character id alone names its shard
+SHARD_ID_BITS = 40
+# Cross-shard reads attach every shard to one connection; SQLite allows 10 attachments
+MAX_SHARDS = 11
+# Tables that only live in compendium.db; shard connections see them through the attachment
+GLOBAL_TABLES = ['users', 'stats', 'catalog_items', 'catalog_features', 'catalog_spells',
+                 'catalog_item_properties', 'catalog_feature_properties', 'catalog_spell_properties',
+                 'parties', 'party_members']
+# Tables split across shards, each row in its character's (or for user_stats its user's) shard
+SHARDED_TABLES = ['characters', 'inventory_items', 'item_properties', 'features', 'feature_properties',
+                  'spells', 'spell_properties', 'currencies', 'applied_ops', 'character_changes',
+                  'character_snapshots', 'user_stats']
+
+def shard_path(shard):
+    if not shard:
+        return DATABASE
+    root, ext = os.path.splitext(DATABASE)
+    return f'{root}-shard{shard}{ext}'
+
+def get_db(shard=0):
+    """Connection to compendium.db, or to one shard with compendium.db attached as "compendium".
+
+    Shared tables don't exist in shard files, so queries on a shard connection reach them
+    by their plain names.
+    """
+    conn = sqlite3.connect(shard_path(shard), timeout=BUSY_TIMEOUT)
     conn.row_factory = sqlite3.Row
+    # With WAL this only risks the last few commits on power loss, never corruption
+    conn.execute('PRAGMA synchronous = NORMAL')
+    if shard:
+        conn.execute('ATTACH DATABASE ? AS compendium', (DATABASE,))
+        conn.execute('PRAGMA compendium.synchronous = NORMAL')
     return conn
 
+def character_shard(character_id):
+    """Shard holding a character; ids outside every shard's range fall to shard 0 and simply miss."""
+    shard = (character_id or 0) >> SHARD_ID_BITS
+    return shard if 0 < shard < SHARDS else 0
+
+_user_shards = {}
+
+def user_shard(user_id):
+    """Shard holding a user's characters. Users never move, so lookups are cached."""
+    if SHARDS == 1:
+        return 0
+    shard = _user_shards.get(user_id)
+    if shard is None:
+        conn = get_db()
+        row = conn.execute('SELECT shard FROM users WHERE id = ?', (user_id,)).fetchone()
+        conn.close()
+        if not row:
+            return 0
+        shard = _user_shards[user_id] = row['shard']
+    return shard
+
+def _assign_shard(username):
+    return zlib.crc32(username.encode()) % SHARDS
+
+def _character_db(character_id):
+    return get_db(character_shard(character_id))
+
+def _user_db(user_id):
+    return get_db(user_shard(user_id))
+
+def _scatter_db():
+    """Connection for reads across every shard: each sharded table is shadowed by a TEMP view
+    over all shards, so the same SQL works sharded or not. The views can't be written to."""
+    conn = get_db()
+    if SHARDS == 1:
+        return conn
+    for shard in range(1, SHARDS):
+        conn.execute(f'ATTACH DATABASE ? AS shard{shard}', (shard_path(shard),))
+    for table in SHARDED_TABLES:
+        # By name: a shard created later may have its columns in a different order
+        columns = ', '.join(_table_columns(conn, table))
+        union = ' UNION ALL '.join([f'SELECT {columns} FROM main.{table}']
+                                   + [f'SELECT {columns} FROM shard{shard}.{table}' for shard in range(1, SHARDS)])
+        if table == 'user_stats':
+            # compendium.db has a row for every user; the counts are in the user's shard
+            union = (f'SELECT user_id, SUM(characters) AS characters, SUM(items) AS items, SUM(features) AS features, '
+                     f'SUM(spells) AS spells, MAX(last_active) AS last_active FROM ({union}) GROUP BY user_id')
+        conn.execute(f'CREATE TEMP VIEW {table} AS {union}')
+    return conn
+
+def _shards():
+    return range(SHARDS)
+
+def _attach_shard(conn, shard, own_shard):
+    """Schema name under which a connection to own_shard reaches another shard's tables."""
+    if shard == own_shard:
+        return 'main'
+    if shard == 0:
+        return 'compendium'
+    conn.execute('ATTACH DATABASE ? AS source', (shard_path(shard),))
+    return 'source'
+
+def _begin_write(conn):
+    """Start a transaction holding the write lock of this connection's own file.
+
+    BEGIN IMMEDIATE would also lock every attached file, putting every shard behind
+    compendium.db's lock; a write that matches nothing locks just the main file.
+    """
+    if SHARDS == 1:
+        conn.execute('BEGIN IMMEDIATE')
+    else:
+        conn.execute('BEGIN')
+        conn.execute('DELETE FROM main.applied_ops WHERE 0')
+
+
+# --- Records ---
+
+class Record(Mapping):
+    """A row stored in slots rather than a dict: a fraction of the memory for wide rows.
+
+    Fields read as attributes (item.name) or keys (item['name']), so templates and
+    code written against dict rows keep working. Only the record's own fields can be
+    set. Classes are generated per column list by _record_class.
+    """
+    __slots__ = ()
+    _fields = ()
+    _field_set = frozenset()
+    _setters = ()
+    _extra_values = ()
+
+    def __init__(self, values):
+        for setter, value in zip(self._setters, values + self._extra_values):
+            setter(self, value)
+
+    def __getitem__(self, key):
+        if key not in self._field_set:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self._field_set:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self._field_set
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __repr__(self):
+        return f'Record({dict(self)!r})'
+
+@lru_cache(maxsize=None)
+def _record_class(columns, extras=()):
+    """Record subclass with a slot per column, plus extra fields that start out as None."""
+    fields = columns + extras
+    cls = type('Record', (Record,), {'__slots__': fields, '_fields': fields, '_field_set': frozenset(fields)})
+    cls._setters = tuple(getattr(cls, field).__set__ for field in fields)
+    cls._extra_values = (None,) * len(extras)
+    return cls
+
+def _fetch_records(cursor, extras=()):
+    """Every remaining row of an executed query as records, skipping the sqlite3.Row step."""
+    cls = _record_class(tuple(column[0] for column in cursor.description), extras)
+    cursor.row_factory = None
+    return [cls(row) for row in cursor]
+
+def _fetch_record(cursor, extras=()):
+    records = _fetch_records(cursor, extras)
+    return records[0] if records else None
+
 def init_db():
+    if not 1 <= SHARDS <= MAX_SHARDS:
+        raise RuntimeError(f'COMPENDIUM_SHARDS must be between 1 and {MAX_SHARDS}')
+    for shard in _shards():
+        conn = sqlite3.connect(shard_path(shard), timeout=BUSY_TIMEOUT)
+        conn.row_factory = sqlite3.Row
+        _init_schema(conn)
+        if shard:
+            _init_shard(conn, shard)
+        conn.commit()
+        conn.close()
+    _stat_ids.clear()
+    _stat_keys_by_id.clear()
+    _user_shards.clear()
+
     conn = get_db()
+    highest = conn.execute('SELECT MAX(shard) AS shard FROM users').fetchone()['shard'] or 0
+    conn.close()
+    if highest >= SHARDS:
+        raise RuntimeError(f'Users are stored in shard {highest}; set COMPENDIUM_SHARDS to at least {highest + 1}')
+
+def _init_shard(conn, shard):
+    """Turn a full schema into a shard: drop the shared tables and start ids at the shard's range."""
+    for table in GLOBAL_TABLES:
+        conn.execute(f'DROP TABLE IF EXISTS {table}')
+    first_id = shard << SHARD_ID_BITS
+    for table in SHARDED_TABLES:
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = ? AND sql LIKE '%AUTOINCREMENT%'", (table,)).fetchone():
+            continue
+        conn.execute('INSERT INTO sqlite_sequence (name, seq) SELECT ?, 0 WHERE NOT EXISTS '
+                     '(SELECT 1 FROM sqlite_sequence WHERE name = ?)', (table, table))
+        conn.execute('UPDATE sqlite_sequence SET seq = ? WHERE name = ? AND seq < ?', (first_id, table, first_id))
+
+def _init_schema(conn):
+    # Write-ahead log: readers no longer block the writer (or each other), and a commit
+    # is one append instead of rewriting pages through a rollback journal. Persistent.
+    conn.execute('PRAGMA journal_mode = WAL')
     conn.execute('''
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -33,15 +248,8 @@ def init_db():
             ac INTEGER DEFAULT 10,
             proficiency_bonus INTEGER DEFAULT 2,
             str_score INTEGER DEFAULT 10,
-            str_save_prof INTEGER DEFAULT 0,
             int_score INTEGER DEFAULT 10,
-            int_save_prof INTEGER DEFAULT 0,
-            athletics_prof INTEGER DEFAULT 0,
-            arcana_prof INTEGER DEFAULT 0,
-            history_prof INTEGER DEFAULT 0,
-            investigation_prof INTEGER DEFAULT 0,
-            nature_prof INTEGER DEFAULT 0,
-            religion_prof INTEGER DEFAULT 0,
+            proficiencies INTEGER NOT NULL DEFAULT 0,
             mana_current INTEGER DEFAULT 0,
             mana_max INTEGER DEFAULT 0,
             equipment TEXT,
@@ -51,6 +259,17 @@ def init_db():
         )
     ''')
 
+    # Lookup table for the stats properties modify, filled from STAT_OPTIONS
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stats (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            key TEXT UNIQUE NOT NULL,
+            label TEXT NOT NULL
+        )
+    ''')
+    conn.executemany('INSERT OR IGNORE INTO stats (key, label) VALUES (?, ?)', STAT_OPTIONS)
+    conn.executemany('UPDATE stats SET label = ? WHERE key = ?', [(label, key) for key, label in STAT_OPTIONS])
+
     conn.execute('''
         CREATE TABLE IF NOT EXISTS inventory_items (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -69,7 +288,7 @@ def init_db():
         CREATE TABLE IF NOT EXISTS item_properties (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             item_id INTEGER NOT NULL,
-            stat_modified TEXT NOT NULL,
+            stat_id INTEGER NOT NULL REFERENCES stats (id),
             value INTEGER NOT NULL DEFAULT 0,
             FOREIGN KEY (item_id) REFERENCES inventory_items (id) ON DELETE CASCADE
         )
@@ -91,7 +310,7 @@ def init_db():
         CREATE TABLE IF NOT EXISTS feature_properties (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             feature_id INTEGER NOT NULL,
-            stat_modified TEXT NOT NULL,
+            stat_id INTEGER NOT NULL REFERENCES stats (id),
             value INTEGER NOT NULL DEFAULT 0,
             FOREIGN KEY (feature_id) REFERENCES features (id) ON DELETE CASCADE
         )
@@ -113,7 +332,7 @@ def init_db():
         CREATE TABLE IF NOT EXISTS spell_properties (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             spell_id INTEGER NOT NULL,
-            stat_modified TEXT NOT NULL,
+            stat_id INTEGER NOT NULL REFERENCES stats (id),
             value INTEGER NOT NULL DEFAULT 0,
             enabled INTEGER NOT NULL DEFAULT 1,
             FOREIGN KEY (spell_id) REFERENCES spells (id) ON DELETE CASCADE
@@ -132,6 +351,107 @@ def init_db():
         )
     ''')
 
+    # Shared compendium catalog that character entries can reference
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT DEFAULT ''
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_features (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT DEFAULT '',
+            source TEXT DEFAULT ''
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_spells (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            level INTEGER NOT NULL DEFAULT 0,
+            description TEXT DEFAULT ''
+        )
+    ''')
+
+    for catalog_table, props_table in [('catalog_items', 'catalog_item_properties'),
+                                       ('catalog_features', 'catalog_feature_properties'),
+                                       ('catalog_spells', 'catalog_spell_properties')]:
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {props_table} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                catalog_id INTEGER NOT NULL,
+                stat_id INTEGER NOT NULL REFERENCES stats (id),
+                value INTEGER NOT NULL DEFAULT 0,
+                FOREIGN KEY (catalog_id) REFERENCES {catalog_table} (id) ON DELETE CASCADE
+            )
+        ''')
+
+    # Parties group characters from any number of users for a GM's overview
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS parties (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            created_by INTEGER REFERENCES users (id) ON DELETE SET NULL
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS party_members (
+            party_id INTEGER NOT NULL,
+            character_id INTEGER NOT NULL,
+            PRIMARY KEY (party_id, character_id),
+            FOREIGN KEY (party_id) REFERENCES parties (id) ON DELETE CASCADE,
+            FOREIGN KEY (character_id) REFERENCES characters (id) ON DELETE CASCADE
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_party_members_character ON party_members (character_id)')
+
+    # Offline edits already applied, keyed by the client's op id so replays are no-ops
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS applied_ops (
+            character_id INTEGER NOT NULL,
+            op_id TEXT NOT NULL,
+            applied_at REAL NOT NULL,
+            result TEXT NOT NULL,
+            PRIMARY KEY (character_id, op_id),
+            FOREIGN KEY (character_id) REFERENCES characters (id) ON DELETE CASCADE
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_applied_ops_applied ON applied_ops (applied_at)')
+
+    # Which entities each character revision touched, for /character/<id>/changes
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS character_changes (
+            character_id INTEGER NOT NULL,
+            revision INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            entity_id INTEGER NOT NULL,
+            PRIMARY KEY (character_id, revision, kind, entity_id),
+            FOREIGN KEY (character_id) REFERENCES characters (id) ON DELETE CASCADE
+        )
+    ''')
+
+    # Whole sheets stored as JSON for get_sheet; current while revision matches the character's
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS character_snapshots (
+            character_id INTEGER PRIMARY KEY,
+            revision INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            FOREIGN KEY (character_id) REFERENCES characters (id) ON DELETE CASCADE
+        )
+    ''')
+
+    # Indexes matching the per-character ORDER BY clauses
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_inventory_items_order ON inventory_items (character_id, equipped DESC, sort_order)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_features_order ON features (character_id, sort_order)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_spells_order ON spells (character_id, level, sort_order)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_currencies_order ON currencies (character_id, sort_order)')
+
     # Migrations for existing databases
     try:
         conn.execute('ALTER TABLE characters ADD COLUMN spellcasting INTEGER DEFAULT 0')
@@ -183,22 +503,17 @@ def init_db():
         except sqlite3.OperationalError:
             pass
 
-    # Add remaining save proficiencies
-    for col in ['dex_save_prof', 'con_save_prof', 'wis_save_prof', 'cha_save_prof']:
-        try:
-            conn.execute(f'ALTER TABLE characters ADD COLUMN {col} INTEGER DEFAULT 0')
-        except sqlite3.OperationalError:
-            pass
-
-    # Add remaining skill proficiencies
-    for col in ['acrobatics_prof', 'sleight_of_hand_prof', 'stealth_prof',
-                'animal_handling_prof', 'insight_prof', 'medicine_prof',
-                'perception_prof', 'survival_prof',
-                'deception_prof', 'intimidation_prof', 'performance_prof', 'persuasion_prof']:
-        try:
-            conn.execute(f'ALTER TABLE characters ADD COLUMN {col} INTEGER DEFAULT 0')
-        except sqlite3.OperationalError:
-            pass
+    # Save and skill proficiencies used to be one column each; pack them into the bitmask
+    try:
+        conn.execute('ALTER TABLE characters ADD COLUMN proficiencies INTEGER NOT NULL DEFAULT 0')
+    except sqlite3.OperationalError:
+        pass
+    legacy = [field for field in PROFICIENCY_FIELDS if field in _table_columns(conn, 'characters')]
+    if legacy:
+        packed = ' | '.join(f'((COALESCE({field}, 0) & 3) << {_PROFICIENCY_SHIFTS[field]})' for field in legacy)
+        conn.execute(f'UPDATE characters SET proficiencies = {packed}')
+        for field in legacy:
+            conn.execute(f'ALTER TABLE characters DROP COLUMN {field}')
 
     # Add initiative, speed, temp HP columns
     try:
@@ -214,15 +529,243 @@ def init_db():
     except sqlite3.OperationalError:
         pass
 
+    try:
+        conn.execute("ALTER TABLE characters ADD COLUMN conditions TEXT DEFAULT ''")
+    except sqlite3.OperationalError:
+        pass
+
+    # Bumped by every write to a character or its entries; see the read cache
+    try:
+        conn.execute('ALTER TABLE characters ADD COLUMN revision INTEGER NOT NULL DEFAULT 0')
+    except sqlite3.OperationalError:
+        pass
+
+    # Tombstones: deleted rows stay, hidden, until purge_deleted removes them
+    for table in ['characters', 'users']:
+        try:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN deleted_at REAL')
+        except sqlite3.OperationalError:
+            pass
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_deleted ON {table} (deleted_at) WHERE deleted_at IS NOT NULL')
+
+    # Catalog references; a NULL description means "use the catalog text"
+    for table, catalog_table in [('inventory_items', 'catalog_items'),
+                                 ('features', 'catalog_features'),
+                                 ('spells', 'catalog_spells')]:
+        try:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN catalog_id INTEGER REFERENCES {catalog_table} (id)')
+        except sqlite3.OperationalError:
+            pass
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_catalog ON {table} (catalog_id)')
+
+    # Counts changes to each description, so full-text URLs stay cacheable until the text
+    # itself changes rather than until anything on the character does
+    for table in ['inventory_items', 'features', 'spells', 'catalog_items', 'catalog_features', 'catalog_spells']:
+        try:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN description_version INTEGER NOT NULL DEFAULT 0')
+        except sqlite3.OperationalError:
+            pass
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_description_version
+            AFTER UPDATE OF description ON {table} WHEN OLD.description IS NOT NEW.description
+            BEGIN UPDATE {table} SET description_version = description_version + 1 WHERE id = NEW.id; END
+        ''')
+
+    # Property tables used to store the stat name as text on every row
+    for table in PROPERTY_TABLES:
+        if 'stat_modified' in _table_columns(conn, table):
+            _migrate_stat_codes(conn, table)
+    for table, parent_key in [('item_properties', 'item_id'),
+                              ('feature_properties', 'feature_id'),
+                              ('spell_properties', 'spell_id')]:
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_parent ON {table} ({parent_key}, stat_id)')
+
+    # Shard each user's characters are stored in; see SHARDS
+    try:
+        conn.execute('ALTER TABLE users ADD COLUMN shard INTEGER NOT NULL DEFAULT 0')
+    except sqlite3.OperationalError:
+        pass
+
+    _create_user_stats(conn)
+
+# Every table holding stat modifiers
+PROPERTY_TABLES = ['item_properties', 'feature_properties', 'spell_properties',
+                   'catalog_item_properties', 'catalog_feature_properties', 'catalog_spell_properties']
+
+def _migrate_stat_codes(conn, table):
+    """Rebuild a property table with an integer stat_id in place of the stat_modified text."""
+    # Keep rows for stats that have since left STAT_OPTIONS rather than dropping them
+    conn.execute(f'INSERT OR IGNORE INTO stats (key, label) SELECT DISTINCT stat_modified, stat_modified FROM {table}')
+
+    create_sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()['sql']
+    create_sql = re.sub(r'stat_modified\s+TEXT\s+NOT\s+NULL', 'stat_id INTEGER NOT NULL REFERENCES stats (id)', create_sql)
+    create_sql = create_sql.replace(table, f'{table}_new', 1)
+    conn.execute(create_sql)
+
+    columns = _table_columns(conn, table)
+    target = ', '.join('stat_id' if col == 'stat_modified' else col for col in columns)
+    source = ', '.join('s.id' if col == 'stat_modified' else f't.{col}' for col in columns)
+    conn.execute(f'INSERT INTO {table}_new ({target}) SELECT {source} FROM {table} t JOIN stats s ON s.key = t.stat_modified')
+    conn.execute(f'DROP TABLE {table}')
+    conn.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+
+
+# --- Change Log ---
+
+# Revisions of change log kept per character; older clients get a full snapshot
+CHANGE_LOG_KEEP = 200
+# Entity kinds in character_changes, by catalog/ordering kind. 'character' covers the
+# character's own columns, and '*' means the write could have touched anything.
+CHANGE_KINDS = {'inventory': 'item', 'feature': 'feature', 'spell': 'spell', 'currency': 'currency'}
+
+def _log_changes(conn, character_ids, changes):
+    """Record changes at each character's (already bumped) revision and drop entries past retention."""
+    conn.executemany('''
+        INSERT OR IGNORE INTO character_changes (character_id, revision, kind, entity_id)
+        SELECT id, revision, ?, ? FROM characters WHERE id = ?
+    ''', [(kind, entity_id, character_id) for character_id in character_ids for kind, entity_id in changes])
+    conn.executemany('''
+        DELETE FROM character_changes
+        WHERE character_id = ? AND revision <= (SELECT revision FROM characters WHERE id = ?) - ?
+    ''', [(character_id, character_id, CHANGE_LOG_KEEP) for character_id in character_ids])
+
+def get_changes(character_id, since):
+    """Entities changed after revision since, as (revision, {kind: set of ids}).
+
+    The set for a kind is None when the log can't answer: it was compacted past
+    since, predates the log, a write recorded '*', or since is ahead of the
+    character (a client from before a backup was restored). Callers then send everything.
+    """
+    conn = _character_db(character_id)
+    revision = _read_revision(conn, character_id)
+    rows = conn.execute(
+        'SELECT revision, kind, entity_id FROM character_changes WHERE character_id = ? AND revision > ?',
+        (character_id, since)
+    ).fetchall()
+    oldest = conn.execute('SELECT MIN(revision) AS revision FROM character_changes WHERE character_id = ?',
+                          (character_id,)).fetchone()['revision']
+    conn.close()
+
+    if revision is None:
+        return None, None
+    if since == revision:
+        return revision, {}
+    if since > revision:
+        return revision, None
+    # Every revision after since must still be logged
+    if oldest is None or oldest > since + 1 or any(row['kind'] == '*' for row in rows):
+        return revision, None
+
+    changed = {}
+    for row in rows:
+        changed.setdefault(row['kind'], set()).add(row['entity_id'])
+    return revision, changed
+
+
+# --- Read Cache ---
+
+# Bounded LRU of character rows and child collections, keyed (kind, character_id)
+CACHE_MAX_ENTRIES = 2048
+CACHE_MAX_BYTES = 32 * 1024 * 1024
+# Each worker process has its own cache. With several workers, set this so a
+# hit is only served if the character's revision still matches the database.
+CACHE_CHECK_REVISION = os.environ.get('COMPENDIUM_CACHE_CHECK_REVISION') == '1'
+
+_cache = OrderedDict()  # key -> (value, revision, size)
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+# Per-character invalidation counters, so a read that raced a write isn't stored
+_cache_generations = {}
+
+def _estimate_size(value):
+    return len(json.dumps(value, default=lambda v: dict(v) if isinstance(v, Record) else str(v)))
+
+def _read_revision(conn, character_id):
+    # A tombstoned character reads as gone, so other workers drop what they cached for it
+    row = conn.execute('SELECT revision FROM characters WHERE id = ? AND deleted_at IS NULL', (character_id,)).fetchone()
+    return row['revision'] if row else None
+
+def _cached(kind, character_id, load):
+    """Return load(conn) for a character, serving it from the cache while still valid.
+
+    Cached values are shared between callers and must not be modified.
+    """
+    global _cache_bytes
+    key = (kind, character_id)
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None:
+            _cache.move_to_end(key)
+        generation = _cache_generations.get(character_id, 0)
+
+    conn = None
+    if entry is not None:
+        if not CACHE_CHECK_REVISION:
+            return entry[0]
+        conn = _character_db(character_id)
+        if _read_revision(conn, character_id) == entry[1]:
+            conn.close()
+            return entry[0]
+
+    conn = conn or _character_db(character_id)
+    revision = _read_revision(conn, character_id) if CACHE_CHECK_REVISION else None
+    value = load(conn)
+    conn.close()
+    if value is None:
+        return None
+
+    size = _estimate_size(value)
+    with _cache_lock:
+        if _cache_generations.get(character_id, 0) != generation or size > CACHE_MAX_BYTES:
+            return value
+        old = _cache.pop(key, None)
+        if old is not None:
+            _cache_bytes -= old[2]
+        _cache[key] = (value, revision, size)
+        _cache_bytes += size
+        while len(_cache) > CACHE_MAX_ENTRIES or _cache_bytes > CACHE_MAX_BYTES:
+            _, (_, _, evicted) = _cache.popitem(last=False)
+            _cache_bytes -= evicted
+    return value
+
+def cache_invalidate(character_ids):
+    """Drop this process's cached reads for the given characters."""
+    global _cache_bytes
+    with _cache_lock:
+        for character_id in character_ids:
+            _cache_generations[character_id] = _cache_generations.get(character_id, 0) + 1
+            for kind in CACHED_KINDS:
+                entry = _cache.pop((kind, character_id), None)
+                if entry is not None:
+                    _cache_bytes -= entry[2]
+
+def cache_clear():
+    global _cache_bytes
+    with _cache_lock:
+        _cache.clear()
+        _cache_bytes = 0
+        _cache_generations.clear()
+
+def _commit_characters(conn, character_ids, changes=(('*', 0),)):
+    """Commit a write to these characters: bump their revisions, log the changed
+    (kind, entity id) pairs, commit, close and invalidate."""
+    character_ids = list(character_ids)
+    conn.executemany('UPDATE characters SET revision = revision + 1 WHERE id = ?',
+                     [(character_id,) for character_id in character_ids])
+    _log_changes(conn, character_ids, changes)
     conn.commit()
     conn.close()
+    cache_invalidate(character_ids)
+
+CACHED_KINDS = ('character', 'inventory', 'features', 'spells', 'currencies')
+
 
 def create_user(username, password, is_admin=False):
     conn = get_db()
     password_hash = generate_password_hash(password)
     try:
-        conn.execute('INSERT INTO users (username, password_hash, is_admin) VALUES (?, ?, ?)',
-                     (username, password_hash, 1 if is_admin else 0))
+        conn.execute('INSERT INTO users (username, password_hash, is_admin, shard) VALUES (?, ?, ?, ?)',
+                     (username, password_hash, 1 if is_admin else 0, _assign_shard(username)))
         conn.commit()
         return True
     except sqlite3.IntegrityError:
@@ -232,7 +775,7 @@ def create_user(username, password, is_admin=False):
 
 def verify_user(username, password):
     conn = get_db()
-    user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
+    user = conn.execute('SELECT * FROM users WHERE username = ? AND deleted_at IS NULL', (username,)).fetchone()
     conn.close()
     
     if user and check_password_hash(user['password_hash'], password):
@@ -241,106 +784,152 @@ def verify_user(username, password):
 
 def get_user_by_id(user_id):
     conn = get_db()
-    user = conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
+    user = conn.execute('SELECT * FROM users WHERE id = ? AND deleted_at IS NULL', (user_id,)).fetchone()
     conn.close()
     return dict(user) if user else None
 
 def create_character(user_id):
-    conn = get_db()
+    conn = _user_db(user_id)
+    character_id = _insert_character(conn, user_id)
+    conn.commit()
+    conn.close()
+    return character_id
+
+def _insert_character(conn, user_id):
+    """Insert a blank character with the default currencies, without committing."""
     cursor = conn.execute(
         'INSERT INTO characters (user_id, name) VALUES (?, ?)',
         (user_id, 'New Character')
     )
     character_id = cursor.lastrowid
     # Insert default D&D currencies
-    for i, (name, abbr) in enumerate([('Gold', 'GP'), ('Silver', 'SP'), ('Copper', 'CP')]):
+    conn.executemany(
+        'INSERT INTO currencies (character_id, name, abbreviation, amount, sort_order) VALUES (?, ?, ?, 0, ?)',
+        [(character_id, name, abbr, i) for i, (name, abbr) in enumerate([('Gold', 'GP'), ('Silver', 'SP'), ('Copper', 'CP')])]
+    )
+    return character_id
+
+def _table_columns(conn, table, exclude=()):
+    """Column names of a table, so copies pick up columns added by later migrations."""
+    return [row['name'] for row in conn.execute(f'PRAGMA table_info({table})') if row['name'] not in exclude]
+
+# Child tables copied by clone_character: (table, property table, property key)
+CLONE_TABLES = [
+    ('inventory_items', 'item_properties', 'item_id'),
+    ('features', 'feature_properties', 'feature_id'),
+    ('spells', 'spell_properties', 'spell_id'),
+    ('currencies', None, None),
+]
+
+def clone_character(character_id, target_user_id):
+    """Copy a character and all of its entries to a user in one transaction. Returns the new id or None."""
+    conn = _user_db(target_user_id)
+    # The copy goes to the target user's shard; the source is read from its own
+    source = _attach_shard(conn, character_shard(character_id), user_shard(target_user_id))
+    columns = ', '.join(_table_columns(conn, 'characters', ('id', 'user_id', 'name', 'deleted_at')))
+    cursor = conn.execute(
+        f"INSERT INTO main.characters (user_id, name, {columns}) "
+        f"SELECT ?, name || ' (Copy)', {columns} FROM {source}.characters WHERE id = ? AND deleted_at IS NULL",
+        (target_user_id, character_id)
+    )
+    if not cursor.rowcount:
+        conn.close()
+        return None
+    new_id = cursor.lastrowid
+
+    for table, props_table, prop_key in CLONE_TABLES:
+        columns = ', '.join(_table_columns(conn, table, ('id', 'character_id')))
         conn.execute(
-            'INSERT INTO currencies (character_id, name, abbreviation, amount, sort_order) VALUES (?, ?, ?, 0, ?)',
-            (character_id, name, abbr, i)
+            f'INSERT INTO main.{table} (character_id, {columns}) '
+            f'SELECT ?, {columns} FROM {source}.{table} WHERE character_id = ? ORDER BY id',
+            (new_id, character_id)
         )
+        if not props_table:
+            continue
+
+        # Copies were inserted in id order, so the nth source row maps to the nth copy
+        prop_columns = _table_columns(conn, props_table, ('id', prop_key))
+        conn.execute(f'''
+            INSERT INTO main.{props_table} ({prop_key}, {', '.join(prop_columns)})
+            SELECT dst.id, {', '.join('p.' + col for col in prop_columns)}
+            FROM {source}.{props_table} p
+            JOIN (SELECT id, ROW_NUMBER() OVER (ORDER BY id) AS rn FROM {source}.{table} WHERE character_id = ?) src
+                ON p.{prop_key} = src.id
+            JOIN (SELECT id, ROW_NUMBER() OVER (ORDER BY id) AS rn FROM main.{table} WHERE character_id = ?) dst
+                ON dst.rn = src.rn
+            ORDER BY p.id
+        ''', (character_id, new_id))
+
     conn.commit()
     conn.close()
-    return character_id
+    return new_id
 
 def get_characters_by_user(user_id):
-    conn = get_db()
-    characters = conn.execute(
-        'SELECT * FROM characters WHERE user_id = ? ORDER BY name',
+    conn = _user_db(user_id)
+    characters = _fetch_records(conn.execute(
+        'SELECT * FROM characters WHERE user_id = ? AND deleted_at IS NULL ORDER BY name',
         (user_id,)
-    ).fetchall()
+    ))
     conn.close()
-    return [dict(char) for char in characters]
+    return characters
+
+def _load_character(conn, character_id):
+    return _fetch_record(conn.execute('SELECT * FROM characters WHERE id = ? AND deleted_at IS NULL', (character_id,)))
 
 def get_character(character_id, user_id):
-    conn = get_db()
-    character = conn.execute(
-        'SELECT * FROM characters WHERE id = ? AND user_id = ?',
+    character = _cached('character', character_id, lambda conn: _load_character(conn, character_id))
+    if character is None or character['user_id'] != user_id:
+        return None
+    return character
+
+def get_character_context(character_id, user_id):
+    """Narrow ownership lookup used once per request. Returns {'id', 'name'} or None."""
+    conn = _character_db(character_id)
+    row = conn.execute(
+        'SELECT id, name FROM characters WHERE id = ? AND user_id = ? AND deleted_at IS NULL',
         (character_id, user_id)
     ).fetchone()
     conn.close()
-    return dict(character) if character else None
+    return dict(row) if row else None
 
 def update_character(character_id, user_id, data):
-    conn = get_db()
-    
-    # Build update query dynamically based on provided data
-    fields = []
-    values = []
-    
-    allowed_fields = [
-        'name', 'level', 'class', 'race', 'hp_current', 'hp_max', 'ac',
-        'proficiency_bonus',
-        'str_score', 'str_save_prof',
-        'dex_score', 'dex_save_prof',
-        'con_score', 'con_save_prof',
-        'int_score', 'int_save_prof',
-        'wis_score', 'wis_save_prof',
-        'cha_score', 'cha_save_prof',
-        'athletics_prof', 'acrobatics_prof', 'sleight_of_hand_prof', 'stealth_prof',
-        'arcana_prof', 'history_prof', 'investigation_prof', 'nature_prof', 'religion_prof',
-        'animal_handling_prof', 'insight_prof', 'medicine_prof', 'perception_prof', 'survival_prof',
-        'deception_prof', 'intimidation_prof', 'performance_prof', 'persuasion_prof',
-        'mana_current', 'mana_max', 'equipment', 'features', 'custom_abilities',
-        'spellcasting', 'background', 'alignment',
-        'death_save_success', 'death_save_fail',
-        'initiative', 'speed', 'temp_hp'
-    ]
-    
-    for field in allowed_fields:
-        if field in data:
-            fields.append(f'{field} = ?')
-            values.append(data[field])
-    
-    if not fields:
+    """Write the editable fields present in data, coerced per CHARACTER_FIELDS. Returns False if no row changed."""
+    values = coerce_character_fields(data)
+    columns = tuple(sorted((f for f in values if f not in _PROFICIENCY_SHIFTS), key=_FIELD_ORDER.__getitem__))
+    levels = {f: values[f] for f in values if f in _PROFICIENCY_SHIFTS}
+    if not columns and not levels:
         return False
-    
-    values.extend([character_id, user_id])
-    query = f"UPDATE characters SET {', '.join(fields)} WHERE id = ? AND user_id = ?"
-    
-    conn.execute(query, values)
-    conn.commit()
-    conn.close()
+
+    params = [values[column] for column in columns]
+    if levels:
+        params.extend(_proficiency_bits(levels))
+    params.extend([character_id, user_id])
+
+    conn = _character_db(character_id)
+    cursor = conn.execute(_update_character_sql(columns, bool(levels)), params)
+    if not cursor.rowcount:
+        conn.close()
+        return False
+    _commit_characters(conn, [character_id], [('character', character_id)])
     return True
 
 def delete_character(character_id, user_id):
-    conn = get_db()
-    conn.execute('DELETE FROM characters WHERE id = ? AND user_id = ?',
-                 (character_id, user_id))
+    """Tombstone a character; it can be restored for UNDO_WINDOW seconds before it is purged."""
+    conn = _character_db(character_id)
+    conn.execute(
+        'UPDATE characters SET deleted_at = ?, revision = revision + 1 WHERE id = ? AND user_id = ? AND deleted_at IS NULL',
+        (time.time(), character_id, user_id)
+    )
     conn.commit()
     conn.close()
+    cache_invalidate([character_id])
 
 def users_exist():
     conn = get_db()
-    result = conn.execute('SELECT COUNT(*) as count FROM users').fetchone()
+    result = conn.execute('SELECT COUNT(*) as count FROM users WHERE deleted_at IS NULL').fetchone()
     conn.close()
     return result['count'] > 0
 
-def get_all_users():
-    conn = get_db()
-    users = conn.execute('SELECT id, username, is_admin FROM users ORDER BY username').fetchall()
-    conn.close()
-    return [dict(user) for user in users]
-
 def update_user_admin_status(user_id, is_admin):
     conn = get_db()
     conn.execute('UPDATE users SET is_admin = ? WHERE id = ?', (1 if is_admin else 0, user_id))
@@ -348,13 +937,17 @@ def update_user_admin_status(user_id, is_admin):
     conn.close()
 
 def delete_user(user_id):
-    conn = get_db()
-    # Delete user's characters first
-    conn.execute('DELETE FROM characters WHERE user_id = ?', (user_id,))
-    # Delete user
-    conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
+    """Tombstone a user and their characters with one timestamp, so restore_user can bring back exactly those."""
+    now = time.time()
+    conn = _user_db(user_id)
+    character_ids = [row['id'] for row in conn.execute(
+        'SELECT id FROM characters WHERE user_id = ? AND deleted_at IS NULL', (user_id,))]
+    conn.execute('UPDATE characters SET deleted_at = ?, revision = revision + 1 WHERE user_id = ? AND deleted_at IS NULL',
+                 (now, user_id))
+    conn.execute('UPDATE users SET deleted_at = ? WHERE id = ? AND deleted_at IS NULL', (now, user_id))
     conn.commit()
     conn.close()
+    cache_invalidate(character_ids)
 
 def update_user_dark_mode(user_id, dark_mode):
     conn = get_db()
@@ -363,6 +956,264 @@ def update_user_dark_mode(user_id, dark_mode):
     conn.close()
 
 
+# --- User Statistics ---
+
+# Users listed per page of the admin overview
+ADMIN_USERS_PER_PAGE = 50
+# Sort keys the admin overview accepts -> ORDER BY expression
+USER_SORTS = {
+    'username': 'u.username',
+    'characters': 's.characters',
+    'items': 's.items',
+    'features': 's.features',
+    'spells': 's.spells',
+    'last_active': 's.last_active',
+}
+# Entry tables counted per user: (table, user_stats column)
+USER_STAT_COUNTS = [('inventory_items', 'items'), ('features', 'features'), ('spells', 'spells')]
+
+# time.time() inside a trigger
+_SQL_NOW = "(julianday('now') - 2440587.5) * 86400.0"
+
+def _entry_counts(sign, character):
+    """SET clauses adding or removing every entry of one character from its owner's totals."""
+    return ', '.join(f'{column} = {column} {sign} (SELECT COUNT(*) FROM {table} WHERE character_id = {character}.id)'
+                     for table, column in USER_STAT_COUNTS)
+
+def _create_user_stats(conn):
+    """Per-user totals for the admin overview, kept current by triggers on every write.
+
+    Only live characters and their entries count: deleting a character takes its entries
+    off the totals and restoring it puts them back, so purging never has to. Filled in
+    from the existing rows the first time it is created.
+    """
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_stats'").fetchone()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER PRIMARY KEY,
+            characters INTEGER NOT NULL DEFAULT 0,
+            items INTEGER NOT NULL DEFAULT 0,
+            features INTEGER NOT NULL DEFAULT 0,
+            spells INTEGER NOT NULL DEFAULT 0,
+            last_active REAL,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
+
+    triggers = {
+        'user_stats_user_insert': 'AFTER INSERT ON users BEGIN '
+            'INSERT OR IGNORE INTO user_stats (user_id) VALUES (NEW.id); END',
+        'user_stats_user_delete': 'AFTER DELETE ON users BEGIN '
+            'DELETE FROM user_stats WHERE user_id = OLD.id; END',
+        # A shard has no users table to create the row, so the first character does
+        'user_stats_character_insert': 'AFTER INSERT ON characters WHEN NEW.deleted_at IS NULL BEGIN '
+            'INSERT OR IGNORE INTO user_stats (user_id) VALUES (NEW.user_id); '
+            f'UPDATE user_stats SET characters = characters + 1, last_active = {_SQL_NOW} WHERE user_id = NEW.user_id; END',
+        # Every write to a character or its entries bumps the revision
+        'user_stats_character_write': 'AFTER UPDATE OF revision ON characters WHEN NEW.deleted_at IS NULL BEGIN '
+            f'UPDATE user_stats SET last_active = {_SQL_NOW} WHERE user_id = NEW.user_id; END',
+        'user_stats_character_tombstone': 'AFTER UPDATE OF deleted_at ON characters '
+            'WHEN OLD.deleted_at IS NULL AND NEW.deleted_at IS NOT NULL BEGIN '
+            f'UPDATE user_stats SET characters = characters - 1, {_entry_counts("-", "NEW")} WHERE user_id = NEW.user_id; END',
+        'user_stats_character_restore': 'AFTER UPDATE OF deleted_at ON characters '
+            'WHEN OLD.deleted_at IS NOT NULL AND NEW.deleted_at IS NULL BEGIN '
+            f'UPDATE user_stats SET characters = characters + 1, {_entry_counts("+", "NEW")} WHERE user_id = NEW.user_id; END',
+        'user_stats_character_delete': 'AFTER DELETE ON characters WHEN OLD.deleted_at IS NULL BEGIN '
+            f'UPDATE user_stats SET characters = characters - 1, {_entry_counts("-", "OLD")} WHERE user_id = OLD.user_id; END',
+    }
+    for table, column in USER_STAT_COUNTS:
+        for event, row, sign in [('insert', 'NEW', '+'), ('delete', 'OLD', '-')]:
+            triggers[f'user_stats_{table}_{event}'] = (
+                f'AFTER {event.upper()} ON {table} BEGIN '
+                f'UPDATE user_stats SET {column} = {column} {sign} 1 WHERE user_id = '
+                f'(SELECT user_id FROM characters WHERE id = {row}.character_id AND deleted_at IS NULL); END'
+            )
+    for name, body in triggers.items():
+        # Recreated every start so databases from older versions pick up changed bodies
+        conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+        conn.execute(f'CREATE TRIGGER {name} {body}')
+
+    if not exists:
+        live = 'c.user_id = u.id AND c.deleted_at IS NULL'
+        counts = ', '.join(f'(SELECT COUNT(*) FROM {table} x JOIN characters c ON c.id = x.character_id WHERE {live})'
+                           for table, _ in USER_STAT_COUNTS)
+        conn.execute(f'''
+            INSERT INTO user_stats (user_id, characters, {', '.join(column for _, column in USER_STAT_COUNTS)})
+            SELECT u.id, (SELECT COUNT(*) FROM characters c WHERE {live}), {counts} FROM users u
+        ''')
+
+def get_user_overview(page=1, sort='username', descending=False):
+    """One page of active users with their stored totals, sorted by a USER_SORTS key.
+
+    Reads only users and user_stats, so the cost depends on the number of users, not on
+    how much is stored for them. Returns the page's users, the page number actually
+    shown, the page count and instance-wide totals.
+    """
+    order = USER_SORTS.get(sort, USER_SORTS['username'])
+    direction = 'DESC' if descending else 'ASC'
+    conn = _scatter_db()
+    totals = dict(conn.execute('''
+        SELECT COUNT(*) AS users, COALESCE(SUM(s.characters), 0) AS characters, COALESCE(SUM(s.items), 0) AS items,
+               COALESCE(SUM(s.features), 0) AS features, COALESCE(SUM(s.spells), 0) AS spells
+        FROM users u LEFT JOIN user_stats s ON s.user_id = u.id WHERE u.deleted_at IS NULL
+    ''').fetchone())
+    pages = max(1, -(-totals['users'] // ADMIN_USERS_PER_PAGE))
+    page = min(max(page, 1), pages)
+    rows = conn.execute(f'''
+        SELECT u.id, u.username, u.is_admin, COALESCE(s.characters, 0) AS characters, COALESCE(s.items, 0) AS items,
+               COALESCE(s.features, 0) AS features, COALESCE(s.spells, 0) AS spells, s.last_active
+        FROM users u LEFT JOIN user_stats s ON s.user_id = u.id
+        WHERE u.deleted_at IS NULL
+        ORDER BY {order} {direction}, u.id LIMIT ? OFFSET ?
+    ''', (ADMIN_USERS_PER_PAGE, (page - 1) * ADMIN_USERS_PER_PAGE)).fetchall()
+    conn.close()
+
+    users = []
+    for row in rows:
+        user = dict(row)
+        if user['last_active'] is not None:
+            user['last_active'] = time.strftime('%Y-%m-%d %H:%M', time.localtime(user['last_active']))
+        users.append(user)
+    return {'users': users, 'page': page, 'pages': pages, 'totals': totals}
+
+def database_size():
+    """Bytes used by the database files and their write-ahead logs, read from the headers rather than the rows."""
+    total = 0
+    for shard in _shards():
+        conn = sqlite3.connect(shard_path(shard))
+        pages = conn.execute('PRAGMA page_count').fetchone()[0]
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        conn.close()
+        try:
+            wal = os.path.getsize(shard_path(shard) + '-wal')
+        except OSError:
+            wal = 0
+        total += pages * page_size + wal
+    return total
+
+
+# --- Soft Delete ---
+
+# Deleted characters and users can be restored for this many seconds, then purge_deleted removes them
+UNDO_WINDOW = 10 * 60
+# Rows removed per purge transaction, so other writers are never held off for long
+PURGE_BATCH_SIZE = 500
+# Pause between purge transactions so writers waiting on the lock get in
+PURGE_PAUSE = 0.01
+
+def get_deleted_characters(user_id):
+    """The user's characters that can still be restored, newest deletion first."""
+    conn = _user_db(user_id)
+    rows = conn.execute(
+        'SELECT id, name, deleted_at FROM characters WHERE user_id = ? AND deleted_at > ? ORDER BY deleted_at DESC',
+        (user_id, time.time() - UNDO_WINDOW)
+    ).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+def restore_character(character_id, user_id):
+    """Undo delete_character within UNDO_WINDOW. Returns True if the character is back."""
+    conn = _character_db(character_id)
+    cursor = conn.execute(
+        'UPDATE characters SET deleted_at = NULL, revision = revision + 1 WHERE id = ? AND user_id = ? AND deleted_at > ?',
+        (character_id, user_id, time.time() - UNDO_WINDOW)
+    )
+    restored = cursor.rowcount > 0
+    conn.commit()
+    conn.close()
+    cache_invalidate([character_id])
+    return restored
+
+def get_deleted_users():
+    """Users that can still be restored, newest deletion first."""
+    conn = get_db()
+    rows = conn.execute(
+        'SELECT id, username, deleted_at FROM users WHERE deleted_at > ? ORDER BY deleted_at DESC',
+        (time.time() - UNDO_WINDOW,)
+    ).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+def restore_user(user_id):
+    """Undo delete_user within UNDO_WINDOW, bringing back the characters deleted with the account."""
+    conn = _user_db(user_id)
+    user = conn.execute('SELECT deleted_at FROM users WHERE id = ? AND deleted_at > ?',
+                        (user_id, time.time() - UNDO_WINDOW)).fetchone()
+    if not user:
+        conn.close()
+        return False
+    character_ids = [row['id'] for row in conn.execute(
+        'SELECT id FROM characters WHERE user_id = ? AND deleted_at = ?', (user_id, user['deleted_at']))]
+    conn.execute('UPDATE characters SET deleted_at = NULL, revision = revision + 1 WHERE user_id = ? AND deleted_at = ?',
+                 (user_id, user['deleted_at']))
+    conn.execute('UPDATE users SET deleted_at = NULL WHERE id = ?', (user_id,))
+    conn.commit()
+    conn.close()
+    cache_invalidate(character_ids)
+    return True
+
+def _purge_steps():
+    steps = []
+    for table, props_table, prop_key in CLONE_TABLES:
+        if props_table:
+            steps.append((props_table, f'{prop_key} IN (SELECT id FROM {table} WHERE character_id = ?)'))
+        steps.append((table, 'character_id = ?'))
+    steps += [('party_members', 'character_id = ?'),
+              ('character_changes', 'character_id = ?'),
+              ('applied_ops', 'character_id = ?'),
+              ('character_snapshots', 'character_id = ?')]
+    return steps
+
+# What purging a character deletes, children before parents: (table, condition on the character id)
+_PURGE_STEPS = _purge_steps()
+
+def _purge_batches(conn, table, condition, params):
+    """Delete matching rows PURGE_BATCH_SIZE at a time, committing after each batch."""
+    removed = 0
+    while True:
+        cursor = conn.execute(
+            f'DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE {condition} LIMIT ?)',
+            params + (PURGE_BATCH_SIZE,)
+        )
+        conn.commit()
+        removed += cursor.rowcount
+        if cursor.rowcount < PURGE_BATCH_SIZE:
+            return removed
+        time.sleep(PURGE_PAUSE)
+
+def purge_deleted():
+    """Permanently remove characters and users whose undo window has passed. Returns rows removed.
+
+    Children go first, in small transactions, and the character row last, so an
+    interrupted purge simply resumes on the next run.
+    """
+    cutoff = time.time() - UNDO_WINDOW
+    removed = 0
+    for shard in _shards():
+        conn = get_db(shard)
+        try:
+            expired = [row['id'] for row in conn.execute('SELECT id FROM characters WHERE deleted_at < ?', (cutoff,))]
+            for character_id in expired:
+                for table, condition in _PURGE_STEPS:
+                    removed += _purge_batches(conn, table, condition, (character_id,))
+                removed += conn.execute('DELETE FROM characters WHERE id = ?', (character_id,)).rowcount
+                conn.commit()
+                time.sleep(PURGE_PAUSE)
+        finally:
+            conn.close()
+
+    conn = _scatter_db()
+    try:
+        # An account goes once none of its characters are left
+        removed += conn.execute('''
+            DELETE FROM users WHERE deleted_at < ?
+            AND NOT EXISTS (SELECT 1 FROM characters c WHERE c.user_id = users.id)
+        ''', (cutoff,)).rowcount
+        conn.commit()
+    finally:
+        conn.close()
+    return removed
+
 # --- Inventory Functions ---
 
 # The stat options available for item properties
@@ -406,396 +1257,535 @@ STAT_OPTIONS = [
     ('persuasion', 'Persuasion'),
 ]
 
-def get_inventory(character_id):
-    """Get all inventory items with their properties for a character."""
-    conn = get_db()
-    items = conn.execute(
-        'SELECT * FROM inventory_items WHERE character_id = ? ORDER BY equipped DESC, sort_order, name',
+STAT_KEYS = {key for key, _ in STAT_OPTIONS}
+
+# stats table codes, loaded on first use: key -> id and id -> key
+_stat_ids = {}
+_stat_keys_by_id = {}
+
+def _load_stat_codes(conn):
+    if not _stat_ids:
+        rows = conn.execute('SELECT id, key FROM stats').fetchall()
+        _stat_keys_by_id.update((row['id'], row['key']) for row in rows)
+        _stat_ids.update((row['key'], row['id']) for row in rows)
+
+def _stat_id(conn, key):
+    """Integer code for a stat key. Raises ValueError for stats not in STAT_OPTIONS."""
+    if key not in STAT_KEYS:
+        raise ValueError(f'Unknown stat: {key}')
+    _load_stat_codes(conn)
+    return _stat_ids[key]
+
+def _stat_keys(conn):
+    _load_stat_codes(conn)
+    return _stat_keys_by_id
+
+# Entry lists carry only this much of each description, plus its full length and
+# version; the sheet fetches the rest from get_description when an entry is expanded
+DESCRIPTION_PREVIEW_CHARS = 300
+_PREVIEW_COLUMNS = (f'substr(description, 1, {DESCRIPTION_PREVIEW_CHARS}) AS description, '
+                    'length(description) AS description_length, description_version')
+
+def _description_version(entry_version, catalog_id=None, catalog_version=None):
+    """Version of the text an entry shows: its own counter, plus the catalog row's when it inherits."""
+    if catalog_id is None:
+        return str(entry_version)
+    return f'{entry_version}.{catalog_id}.{catalog_version}'
+
+def _fill_catalog_descriptions(conn, entries, catalog_table, preview=False):
+    """Fill in inherited descriptions, fetching each distinct catalog entry once.
+
+    With preview, entries come from a _PREVIEW_COLUMNS query and get the same truncated form.
+    """
+    catalog_ids = {e['catalog_id'] for e in entries if e['description'] is None and e['catalog_id']}
+    if not catalog_ids:
+        return
+    placeholders = ','.join('?' * len(catalog_ids))
+    if preview:
+        texts = {row['id']: (row['description'], row['description_length'], row['description_version'])
+                 for row in conn.execute(
+                     f'SELECT id, {_PREVIEW_COLUMNS} FROM {catalog_table} WHERE id IN ({placeholders})',
+                     list(catalog_ids)
+                 )}
+        for e in entries:
+            if e['description'] is None:
+                e['description'], e['description_length'], catalog_version = texts.get(e['catalog_id'], ('', 0, 0))
+                e['description_version'] = _description_version(e['description_version'], e['catalog_id'], catalog_version)
+        return
+    texts = dict(conn.execute(
+        f'SELECT id, description FROM {catalog_table} WHERE id IN ({placeholders})',
+        list(catalog_ids)
+    ).fetchall())
+    for e in entries:
+        if e['description'] is None:
+            e['description'] = texts.get(e['catalog_id'], '')
+
+def get_description(kind, entry_id, character_id):
+    """Full description of one inventory item, feature or spell, inherited from the
+    catalog when it has none of its own, as (description, version). None if the entry
+    isn't the character's."""
+    catalog_table, _, table, _, _, _ = CATALOG_KINDS[kind]
+    conn = _character_db(character_id)
+    row = conn.execute(f'''
+        SELECT COALESCE(e.description, c.description, '') AS description, e.description_version,
+               e.description IS NULL AND c.id IS NOT NULL AS inherited, c.id AS catalog_id,
+               c.description_version AS catalog_version
+        FROM {table} e LEFT JOIN {catalog_table} c ON c.id = e.catalog_id
+        WHERE e.id = ? AND e.character_id = ?
+    ''', (entry_id, character_id)).fetchone()
+    conn.close()
+    if not row:
+        return None
+    if row['inherited']:
+        return row['description'], _description_version(row['description_version'], row['catalog_id'], row['catalog_version'])
+    return row['description'], _description_version(row['description_version'])
+
+def _load_inventory(conn, character_id):
+    items = _fetch_records(conn.execute(
+        'SELECT id, character_id, name, location, quantity, equipped, sort_order, catalog_id, '
+        f'{_PREVIEW_COLUMNS} FROM inventory_items WHERE character_id = ? ORDER BY equipped DESC, sort_order, name',
         (character_id,)
-    ).fetchall()
+    ), ('properties',))
     
-    result = []
     for item in items:
-        item_dict = dict(item)
-        props = conn.execute(
-            'SELECT * FROM item_properties WHERE item_id = ? ORDER BY id',
-            (item_dict['id'],)
-        ).fetchall()
-        item_dict['properties'] = [dict(p) for p in props]
-        result.append(item_dict)
+        item['properties'] = _fetch_records(conn.execute(
+            'SELECT p.*, s.key AS stat_modified FROM item_properties p JOIN stats s ON s.id = p.stat_id '
+            'WHERE p.item_id = ? ORDER BY p.id',
+            (item['id'],)
+        ))
     
-    conn.close()
-    return result
+    _fill_catalog_descriptions(conn, items, 'catalog_items', preview=True)
+    return items
+
+def get_inventory(character_id):
+    """Get all inventory items with their properties and description previews for a character."""
+    return _cached('inventory', character_id, lambda conn: _load_inventory(conn, character_id))
 
 def get_inventory_item(item_id, character_id):
     """Get a single inventory item with properties."""
-    conn = get_db()
-    item = conn.execute(
+    conn = _character_db(character_id)
+    item = _fetch_record(conn.execute(
         'SELECT * FROM inventory_items WHERE id = ? AND character_id = ?',
         (item_id, character_id)
-    ).fetchone()
+    ), ('properties',))
     
     if not item:
         conn.close()
         return None
     
-    item_dict = dict(item)
-    props = conn.execute(
-        'SELECT * FROM item_properties WHERE item_id = ? ORDER BY id',
-        (item_dict['id'],)
-    ).fetchall()
-    item_dict['properties'] = [dict(p) for p in props]
+    item['properties'] = _fetch_records(conn.execute(
+        'SELECT p.*, s.key AS stat_modified FROM item_properties p JOIN stats s ON s.id = p.stat_id '
+            'WHERE p.item_id = ? ORDER BY p.id',
+        (item['id'],)
+    ))
     
+    _fill_catalog_descriptions(conn, [item], 'catalog_items')
     conn.close()
-    return item_dict
+    return item
 
 def add_inventory_item(character_id, name, description, location, quantity, properties, props_enabled=1):
     """Add a new inventory item with properties. Returns the new item id."""
-    conn = get_db()
+    conn = _character_db(character_id)
     cursor = conn.execute(
-        'INSERT INTO inventory_items (character_id, name, description, location, quantity) VALUES (?, ?, ?, ?, ?)',
-        (character_id, name, description, location, quantity)
+        'INSERT INTO inventory_items (character_id, name, description, location, quantity, sort_order) '
+        'VALUES (?, ?, ?, ?, ?, (SELECT COALESCE(MAX(sort_order), -1) + 1 FROM inventory_items WHERE character_id = ?))',
+        (character_id, name, description, location, quantity, character_id)
     )
     item_id = cursor.lastrowid
 
     for prop in properties:
         if prop.get('stat_modified') and prop.get('value') is not None:
             conn.execute(
-                'INSERT INTO item_properties (item_id, stat_modified, value, enabled) VALUES (?, ?, ?, ?)',
-                (item_id, prop['stat_modified'], prop['value'], props_enabled)
+                'INSERT INTO item_properties (item_id, stat_id, value, enabled) VALUES (?, ?, ?, ?)',
+                (item_id, _stat_id(conn, prop['stat_modified']), prop['value'], props_enabled)
             )
     
-    conn.commit()
-    conn.close()
+    _commit_characters(conn, [character_id], [('item', item_id)])
     return item_id
 
 def update_inventory_item(item_id, character_id, name, description, location, quantity, properties):
     """Update an existing inventory item and its properties."""
-    conn = get_db()
-    
-    # Verify item belongs to this character
-    item = conn.execute(
-        'SELECT id FROM inventory_items WHERE id = ? AND character_id = ?',
-        (item_id, character_id)
-    ).fetchone()
-    
-    if not item:
+    conn = _character_db(character_id)
+
+    # The character_id condition doubles as the ownership check
+    cursor = conn.execute(
+        'UPDATE inventory_items SET name = ?, '
+        'description = NULLIF(?, (SELECT c.description FROM catalog_items c WHERE c.id = inventory_items.catalog_id)), '
+        'location = ?, quantity = ? WHERE id = ? AND character_id = ?',
+        (name, description, location, quantity, item_id, character_id)
+    )
+    if not cursor.rowcount:
         conn.close()
         return False
     
-    conn.execute(
-        'UPDATE inventory_items SET name = ?, description = ?, location = ?, quantity = ? WHERE id = ?',
-        (name, description, location, quantity, item_id)
-    )
-    
     # Replace all properties
     conn.execute('DELETE FROM item_properties WHERE item_id = ?', (item_id,))
     for prop in properties:
         if prop.get('stat_modified') and prop.get('value') is not None:
             conn.execute(
-                'INSERT INTO item_properties (item_id, stat_modified, value) VALUES (?, ?, ?)',
-                (item_id, prop['stat_modified'], prop['value'])
+                'INSERT INTO item_properties (item_id, stat_id, value) VALUES (?, ?, ?)',
+                (item_id, _stat_id(conn, prop['stat_modified']), prop['value'])
             )
     
-    conn.commit()
-    conn.close()
+    _commit_characters(conn, [character_id], [('item', item_id)])
     return True
 
 def delete_inventory_item(item_id, character_id):
     """Delete an inventory item and its properties."""
-    conn = get_db()
+    conn = _character_db(character_id)
     conn.execute(
         'DELETE FROM inventory_items WHERE id = ? AND character_id = ?',
         (item_id, character_id)
     )
-    conn.commit()
-    conn.close()
+    _commit_characters(conn, [character_id], [('item', item_id)])
 
 def toggle_equip_item(item_id, character_id):
     """Toggle the equipped status of an item. Returns new status."""
-    conn = get_db()
-    item = conn.execute(
-        'SELECT equipped FROM inventory_items WHERE id = ? AND character_id = ?',
+    conn = _character_db(character_id)
+    cursor = conn.execute(
+        'UPDATE inventory_items SET equipped = 1 - equipped WHERE id = ? AND character_id = ?',
         (item_id, character_id)
-    ).fetchone()
-    
-    if not item:
+    )
+    if not cursor.rowcount:
         conn.close()
         return None
-    
-    new_status = 0 if item['equipped'] else 1
-    conn.execute(
-        'UPDATE inventory_items SET equipped = ? WHERE id = ?',
-        (new_status, item_id)
-    )
-    conn.commit()
-    conn.close()
+
+    new_status = conn.execute('SELECT equipped FROM inventory_items WHERE id = ?', (item_id,)).fetchone()['equipped']
+    _commit_characters(conn, [character_id], [('item', item_id)])
     return new_status
 
 def get_equipped_bonuses(character_id):
     """Calculate total stat bonuses from all equipped items (enabled properties only)."""
-    conn = get_db()
+    conn = _character_db(character_id)
     rows = conn.execute('''
-        SELECT ip.stat_modified, SUM(ip.value) as total
+        SELECT ip.stat_id, SUM(ip.value) as total
         FROM item_properties ip
         JOIN inventory_items ii ON ip.item_id = ii.id
         WHERE ii.character_id = ? AND ii.equipped = 1 AND ip.enabled = 1
-        GROUP BY ip.stat_modified
+        GROUP BY ip.stat_id
     ''', (character_id,)).fetchall()
+    keys = _stat_keys(conn)
     conn.close()
 
     bonuses = {}
     for row in rows:
-        bonuses[row['stat_modified']] = row['total']
+        bonuses[keys[row['stat_id']]] = row['total']
     return bonuses
 
 
 # --- Features Functions ---
 
-def get_features(character_id):
-    """Get all features with their properties for a character."""
-    conn = get_db()
-    features = conn.execute(
-        'SELECT * FROM features WHERE character_id = ? ORDER BY sort_order, name',
+def _load_features(conn, character_id):
+    features = _fetch_records(conn.execute(
+        f'SELECT id, character_id, name, source, sort_order, catalog_id, {_PREVIEW_COLUMNS} '
+        'FROM features WHERE character_id = ? ORDER BY sort_order, name',
         (character_id,)
-    ).fetchall()
+    ), ('properties',))
 
-    result = []
     for feature in features:
-        f_dict = dict(feature)
-        props = conn.execute(
-            'SELECT * FROM feature_properties WHERE feature_id = ? ORDER BY id',
-            (f_dict['id'],)
-        ).fetchall()
-        f_dict['properties'] = [dict(p) for p in props]
-        result.append(f_dict)
+        feature['properties'] = _fetch_records(conn.execute(
+            'SELECT p.*, s.key AS stat_modified FROM feature_properties p JOIN stats s ON s.id = p.stat_id '
+            'WHERE p.feature_id = ? ORDER BY p.id',
+            (feature['id'],)
+        ))
 
-    conn.close()
-    return result
+    _fill_catalog_descriptions(conn, features, 'catalog_features', preview=True)
+    return features
+
+def get_features(character_id):
+    """Get all features with their properties and description previews for a character."""
+    return _cached('features', character_id, lambda conn: _load_features(conn, character_id))
 
 def get_feature(feature_id, character_id):
     """Get a single feature with properties and ownership check."""
-    conn = get_db()
-    feature = conn.execute(
+    conn = _character_db(character_id)
+    feature = _fetch_record(conn.execute(
         'SELECT * FROM features WHERE id = ? AND character_id = ?',
         (feature_id, character_id)
-    ).fetchone()
+    ), ('properties',))
 
     if not feature:
         conn.close()
         return None
 
-    f_dict = dict(feature)
-    props = conn.execute(
-        'SELECT * FROM feature_properties WHERE feature_id = ? ORDER BY id',
-        (f_dict['id'],)
-    ).fetchall()
-    f_dict['properties'] = [dict(p) for p in props]
+    feature['properties'] = _fetch_records(conn.execute(
+        'SELECT p.*, s.key AS stat_modified FROM feature_properties p JOIN stats s ON s.id = p.stat_id '
+            'WHERE p.feature_id = ? ORDER BY p.id',
+        (feature['id'],)
+    ))
 
+    _fill_catalog_descriptions(conn, [feature], 'catalog_features')
     conn.close()
-    return f_dict
+    return feature
 
 def add_feature(character_id, name, description, source, properties, props_enabled=1):
     """Add a new feature with properties. Returns the new feature id."""
-    conn = get_db()
+    conn = _character_db(character_id)
     cursor = conn.execute(
-        'INSERT INTO features (character_id, name, description, source) VALUES (?, ?, ?, ?)',
-        (character_id, name, description, source)
+        'INSERT INTO features (character_id, name, description, source, sort_order) '
+        'VALUES (?, ?, ?, ?, (SELECT COALESCE(MAX(sort_order), -1) + 1 FROM features WHERE character_id = ?))',
+        (character_id, name, description, source, character_id)
     )
     feature_id = cursor.lastrowid
 
     for prop in properties:
         if prop.get('stat_modified') and prop.get('value') is not None:
             conn.execute(
-                'INSERT INTO feature_properties (feature_id, stat_modified, value, enabled) VALUES (?, ?, ?, ?)',
-                (feature_id, prop['stat_modified'], prop['value'], props_enabled)
+                'INSERT INTO feature_properties (feature_id, stat_id, value, enabled) VALUES (?, ?, ?, ?)',
+                (feature_id, _stat_id(conn, prop['stat_modified']), prop['value'], props_enabled)
             )
 
-    conn.commit()
-    conn.close()
+    _commit_characters(conn, [character_id], [('feature', feature_id)])
     return feature_id
 
 def update_feature(feature_id, character_id, name, description, source, properties):
     """Update an existing feature and its properties."""
-    conn = get_db()
-    item = conn.execute(
-        'SELECT id FROM features WHERE id = ? AND character_id = ?',
-        (feature_id, character_id)
-    ).fetchone()
-    if not item:
+    conn = _character_db(character_id)
+    cursor = conn.execute(
+        'UPDATE features SET name = ?, '
+        'description = NULLIF(?, (SELECT c.description FROM catalog_features c WHERE c.id = features.catalog_id)), '
+        'source = ? WHERE id = ? AND character_id = ?',
+        (name, description, source, feature_id, character_id)
+    )
+    if not cursor.rowcount:
         conn.close()
         return False
 
-    conn.execute(
-        'UPDATE features SET name = ?, description = ?, source = ? WHERE id = ?',
-        (name, description, source, feature_id)
-    )
-
     # Replace all properties
     conn.execute('DELETE FROM feature_properties WHERE feature_id = ?', (feature_id,))
     for prop in properties:
         if prop.get('stat_modified') and prop.get('value') is not None:
             conn.execute(
-                'INSERT INTO feature_properties (feature_id, stat_modified, value) VALUES (?, ?, ?)',
-                (feature_id, prop['stat_modified'], prop['value'])
+                'INSERT INTO feature_properties (feature_id, stat_id, value) VALUES (?, ?, ?)',
+                (feature_id, _stat_id(conn, prop['stat_modified']), prop['value'])
             )
 
-    conn.commit()
-    conn.close()
+    _commit_characters(conn, [character_id], [('feature', feature_id)])
     return True
 
 def delete_feature(feature_id, character_id):
     """Delete a feature and its properties."""
-    conn = get_db()
+    conn = _character_db(character_id)
     conn.execute(
         'DELETE FROM features WHERE id = ? AND character_id = ?',
         (feature_id, character_id)
     )
-    conn.commit()
-    conn.close()
+    _commit_characters(conn, [character_id], [('feature', feature_id)])
 
 def get_feature_bonuses(character_id):
     """Calculate total stat bonuses from all features (enabled properties only)."""
-    conn = get_db()
+    conn = _character_db(character_id)
     rows = conn.execute('''
-        SELECT fp.stat_modified, SUM(fp.value) as total
+        SELECT fp.stat_id, SUM(fp.value) as total
         FROM feature_properties fp
         JOIN features f ON fp.feature_id = f.id
         WHERE f.character_id = ? AND fp.enabled = 1
-        GROUP BY fp.stat_modified
+        GROUP BY fp.stat_id
     ''', (character_id,)).fetchall()
+    keys = _stat_keys(conn)
     conn.close()
 
     bonuses = {}
     for row in rows:
-        bonuses[row['stat_modified']] = row['total']
+        bonuses[keys[row['stat_id']]] = row['total']
     return bonuses
 
 
 # --- Spells Functions ---
 
-def get_spells(character_id):
-    """Get all spells with their properties for a character."""
-    conn = get_db()
-    spells = conn.execute(
-        'SELECT * FROM spells WHERE character_id = ? ORDER BY level, sort_order, name',
+def _load_spells(conn, character_id):
+    spells = _fetch_records(conn.execute(
+        f'SELECT id, character_id, name, level, sort_order, catalog_id, {_PREVIEW_COLUMNS} '
+        'FROM spells WHERE character_id = ? ORDER BY level, sort_order, name',
         (character_id,)
-    ).fetchall()
+    ), ('properties',))
 
-    result = []
     for spell in spells:
-        s_dict = dict(spell)
-        props = conn.execute(
-            'SELECT * FROM spell_properties WHERE spell_id = ? ORDER BY id',
-            (s_dict['id'],)
-        ).fetchall()
-        s_dict['properties'] = [dict(p) for p in props]
-        result.append(s_dict)
+        spell['properties'] = _fetch_records(conn.execute(
+            'SELECT p.*, s.key AS stat_modified FROM spell_properties p JOIN stats s ON s.id = p.stat_id '
+            'WHERE p.spell_id = ? ORDER BY p.id',
+            (spell['id'],)
+        ))
 
-    conn.close()
-    return result
+    _fill_catalog_descriptions(conn, spells, 'catalog_spells', preview=True)
+    return spells
+
+def get_spells(character_id):
+    """Get all spells with their properties and description previews for a character."""
+    return _cached('spells', character_id, lambda conn: _load_spells(conn, character_id))
 
 def get_spell(spell_id, character_id):
     """Get a single spell with properties and ownership check."""
-    conn = get_db()
-    spell = conn.execute(
+    conn = _character_db(character_id)
+    spell = _fetch_record(conn.execute(
         'SELECT * FROM spells WHERE id = ? AND character_id = ?',
         (spell_id, character_id)
-    ).fetchone()
+    ), ('properties',))
 
     if not spell:
         conn.close()
         return None
 
-    s_dict = dict(spell)
-    props = conn.execute(
-        'SELECT * FROM spell_properties WHERE spell_id = ? ORDER BY id',
-        (s_dict['id'],)
-    ).fetchall()
-    s_dict['properties'] = [dict(p) for p in props]
+    spell['properties'] = _fetch_records(conn.execute(
+        'SELECT p.*, s.key AS stat_modified FROM spell_properties p JOIN stats s ON s.id = p.stat_id '
+            'WHERE p.spell_id = ? ORDER BY p.id',
+        (spell['id'],)
+    ))
 
+    _fill_catalog_descriptions(conn, [spell], 'catalog_spells')
     conn.close()
-    return s_dict
+    return spell
 
 def add_spell(character_id, name, level, description, properties=None, props_enabled=1):
     """Add a new spell with properties. Returns the new spell id."""
     if properties is None:
         properties = []
-    conn = get_db()
+    conn = _character_db(character_id)
     cursor = conn.execute(
-        'INSERT INTO spells (character_id, name, level, description) VALUES (?, ?, ?, ?)',
-        (character_id, name, level, description)
+        'INSERT INTO spells (character_id, name, level, description, sort_order) '
+        'VALUES (?, ?, ?, ?, (SELECT COALESCE(MAX(sort_order), -1) + 1 FROM spells WHERE character_id = ?))',
+        (character_id, name, level, description, character_id)
     )
     spell_id = cursor.lastrowid
 
     for prop in properties:
         if prop.get('stat_modified') and prop.get('value') is not None:
             conn.execute(
-                'INSERT INTO spell_properties (spell_id, stat_modified, value, enabled) VALUES (?, ?, ?, ?)',
-                (spell_id, prop['stat_modified'], prop['value'], props_enabled)
+                'INSERT INTO spell_properties (spell_id, stat_id, value, enabled) VALUES (?, ?, ?, ?)',
+                (spell_id, _stat_id(conn, prop['stat_modified']), prop['value'], props_enabled)
             )
 
-    conn.commit()
-    conn.close()
+    _commit_characters(conn, [character_id], [('spell', spell_id)])
     return spell_id
 
 def update_spell(spell_id, character_id, name, level, description, properties=None):
     """Update an existing spell and its properties."""
     if properties is None:
         properties = []
-    conn = get_db()
-    spell = conn.execute(
-        'SELECT id FROM spells WHERE id = ? AND character_id = ?',
-        (spell_id, character_id)
-    ).fetchone()
-    if not spell:
+    conn = _character_db(character_id)
+    cursor = conn.execute(
+        'UPDATE spells SET name = ?, level = ?, '
+        'description = NULLIF(?, (SELECT c.description FROM catalog_spells c WHERE c.id = spells.catalog_id)) '
+        'WHERE id = ? AND character_id = ?',
+        (name, level, description, spell_id, character_id)
+    )
+    if not cursor.rowcount:
         conn.close()
         return False
-    conn.execute(
-        'UPDATE spells SET name = ?, level = ?, description = ? WHERE id = ?',
-        (name, level, description, spell_id)
-    )
 
     # Replace all properties
     conn.execute('DELETE FROM spell_properties WHERE spell_id = ?', (spell_id,))
     for prop in properties:
         if prop.get('stat_modified') and prop.get('value') is not None:
             conn.execute(
-                'INSERT INTO spell_properties (spell_id, stat_modified, value) VALUES (?, ?, ?)',
-                (spell_id, prop['stat_modified'], prop['value'])
+                'INSERT INTO spell_properties (spell_id, stat_id, value) VALUES (?, ?, ?)',
+                (spell_id, _stat_id(conn, prop['stat_modified']), prop['value'])
             )
 
-    conn.commit()
-    conn.close()
+    _commit_characters(conn, [character_id], [('spell', spell_id)])
     return True
 
 def delete_spell(spell_id, character_id):
     """Delete a spell and its properties."""
-    conn = get_db()
+    conn = _character_db(character_id)
     conn.execute(
         'DELETE FROM spells WHERE id = ? AND character_id = ?',
         (spell_id, character_id)
     )
-    conn.commit()
-    conn.close()
+    _commit_characters(conn, [character_id], [('spell', spell_id)])
 
 def get_spell_bonuses(character_id):
     """Calculate total stat bonuses from all spells (enabled properties only)."""
-    conn = get_db()
+    conn = _character_db(character_id)
     rows = conn.execute('''
-        SELECT sp.stat_modified, SUM(sp.value) as total
+        SELECT sp.stat_id, SUM(sp.value) as total
         FROM spell_properties sp
         JOIN spells s ON sp.spell_id = s.id
         WHERE s.character_id = ? AND sp.enabled = 1
-        GROUP BY sp.stat_modified
+        GROUP BY sp.stat_id
     ''', (character_id,)).fetchall()
+    keys = _stat_keys(conn)
     conn.close()
 
     bonuses = {}
     for row in rows:
-        bonuses[row['stat_modified']] = row['total']
+        bonuses[keys[row['stat_id']]] = row['total']
     return bonuses
 
+def get_all_bonuses(character_id):
+    """Equipped item, feature and spell bonuses merged into one dict, in a single query."""
+    conn = _character_db(character_id)
+    bonuses = _load_bonuses(conn, character_id)
+    conn.close()
+    return bonuses
+
+def _load_bonuses(conn, character_id):
+    rows = conn.execute('''
+        SELECT stat_id, SUM(value) as total FROM (
+            SELECT ip.stat_id, ip.value
+            FROM item_properties ip
+            JOIN inventory_items ii ON ip.item_id = ii.id
+            WHERE ii.character_id = ? AND ii.equipped = 1 AND ip.enabled = 1
+            UNION ALL
+            SELECT fp.stat_id, fp.value
+            FROM feature_properties fp
+            JOIN features f ON fp.feature_id = f.id
+            WHERE f.character_id = ? AND fp.enabled = 1
+            UNION ALL
+            SELECT sp.stat_id, sp.value
+            FROM spell_properties sp
+            JOIN spells s ON sp.spell_id = s.id
+            WHERE s.character_id = ? AND sp.enabled = 1
+        )
+        GROUP BY stat_id
+    ''', (character_id, character_id, character_id)).fetchall()
+    keys = _stat_keys(conn)
+
+    bonuses = {}
+    for row in rows:
+        bonuses[keys[row['stat_id']]] = row['total']
+    return bonuses
+
+def get_all_bonuses_batch(character_ids):
+    """get_all_bonuses for many characters in one query per shard: {character_id: bonuses}."""
+    bonuses = {character_id: {} for character_id in character_ids}
+    if not bonuses:
+        return bonuses
+
+    by_shard = {}
+    for character_id in bonuses:
+        by_shard.setdefault(character_shard(character_id), []).append(character_id)
+    for shard, ids in by_shard.items():
+        conn = get_db(shard)
+        rows = _batch_bonus_rows(conn, ids)
+        keys = _stat_keys(conn)
+        conn.close()
+        for row in rows:
+            bonuses[row['character_id']][keys[row['stat_id']]] = row['total']
+    return bonuses
+
+def _batch_bonus_rows(conn, ids):
+    placeholders = ','.join('?' * len(ids))
+    return conn.execute(f'''
+        SELECT character_id, stat_id, SUM(value) as total FROM (
+            SELECT ii.character_id, ip.stat_id, ip.value
+            FROM item_properties ip
+            JOIN inventory_items ii ON ip.item_id = ii.id
+            WHERE ii.character_id IN ({placeholders}) AND ii.equipped = 1 AND ip.enabled = 1
+            UNION ALL
+            SELECT f.character_id, fp.stat_id, fp.value
+            FROM feature_properties fp
+            JOIN features f ON fp.feature_id = f.id
+            WHERE f.character_id IN ({placeholders}) AND fp.enabled = 1
+            UNION ALL
+            SELECT s.character_id, sp.stat_id, sp.value
+            FROM spell_properties sp
+            JOIN spells s ON sp.spell_id = s.id
+            WHERE s.character_id IN ({placeholders}) AND sp.enabled = 1
+        )
+        GROUP BY character_id, stat_id
+    ''', ids * 3).fetchall()
+
 
 # --- Property Toggle ---
 
@@ -803,98 +1793,1152 @@ def toggle_property(table, prop_id, character_id):
     """Toggle the enabled state of a property. Returns new enabled state or None."""
     # Map table to parent join info for ownership check
     joins = {
-        'item_properties': ('item_id', 'inventory_items', 'character_id'),
-        'feature_properties': ('feature_id', 'features', 'character_id'),
-        'spell_properties': ('spell_id', 'spells', 'character_id'),
+        'item_properties': ('item_id', 'inventory_items', 'character_id', 'item'),
+        'feature_properties': ('feature_id', 'features', 'character_id', 'feature'),
+        'spell_properties': ('spell_id', 'spells', 'character_id', 'spell'),
     }
     if table not in joins:
         return None
 
-    fk_col, parent_table, owner_col = joins[table]
-    conn = get_db()
-
-    # Verify ownership
-    row = conn.execute(f'''
-        SELECT p.id, p.enabled FROM {table} p
-        JOIN {parent_table} parent ON p.{fk_col} = parent.id
-        WHERE p.id = ? AND parent.{owner_col} = ?
-    ''', (prop_id, character_id)).fetchone()
+    fk_col, parent_table, owner_col, change_kind = joins[table]
+    conn = _character_db(character_id)
 
-    if not row:
+    # Toggle only if the property's parent belongs to this character
+    cursor = conn.execute(f'''
+        UPDATE {table} SET enabled = 1 - enabled
+        WHERE id = ? AND {fk_col} IN (SELECT id FROM {parent_table} WHERE {owner_col} = ?)
+    ''', (prop_id, character_id))
+    if not cursor.rowcount:
         conn.close()
         return None
 
-    new_state = 0 if row['enabled'] else 1
-    conn.execute(f'UPDATE {table} SET enabled = ? WHERE id = ?', (new_state, prop_id))
-    conn.commit()
-    conn.close()
-    return new_state
+    row = conn.execute(f'SELECT enabled, {fk_col} AS parent_id FROM {table} WHERE id = ?', (prop_id,)).fetchone()
+    _commit_characters(conn, [character_id], [(change_kind, row['parent_id'])])
+    return row['enabled']
 
 
 # --- Currency Functions ---
 
-def get_currencies(character_id):
-    """Get all currencies for a character."""
-    conn = get_db()
-    rows = conn.execute(
+def _load_currencies(conn, character_id):
+    return _fetch_records(conn.execute(
         'SELECT * FROM currencies WHERE character_id = ? ORDER BY sort_order, id',
         (character_id,)
-    ).fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
+    ))
+
+def get_currencies(character_id):
+    """Get all currencies for a character."""
+    return _cached('currencies', character_id, lambda conn: _load_currencies(conn, character_id))
 
 def add_currency(character_id, name, abbreviation, amount=0):
     """Add a new currency. Returns the new currency id."""
-    conn = get_db()
+    conn = _character_db(character_id)
     cursor = conn.execute(
-        'INSERT INTO currencies (character_id, name, abbreviation, amount) VALUES (?, ?, ?, ?)',
-        (character_id, name, abbreviation, amount)
+        'INSERT INTO currencies (character_id, name, abbreviation, amount, sort_order) '
+        'VALUES (?, ?, ?, ?, (SELECT COALESCE(MAX(sort_order), -1) + 1 FROM currencies WHERE character_id = ?))',
+        (character_id, name, abbreviation, amount, character_id)
     )
     currency_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    _commit_characters(conn, [character_id], [('currency', currency_id)])
     return currency_id
 
 def update_currency(currency_id, character_id, name, abbreviation, amount):
     """Update an existing currency."""
-    conn = get_db()
-    row = conn.execute(
-        'SELECT id FROM currencies WHERE id = ? AND character_id = ?',
-        (currency_id, character_id)
-    ).fetchone()
-    if not row:
+    conn = _character_db(character_id)
+    cursor = conn.execute(
+        'UPDATE currencies SET name = ?, abbreviation = ?, amount = ? WHERE id = ? AND character_id = ?',
+        (name, abbreviation, amount, currency_id, character_id)
+    )
+    if not cursor.rowcount:
         conn.close()
         return False
-    conn.execute(
-        'UPDATE currencies SET name = ?, abbreviation = ?, amount = ? WHERE id = ?',
-        (name, abbreviation, amount, currency_id)
-    )
-    conn.commit()
-    conn.close()
+    _commit_characters(conn, [character_id], [('currency', currency_id)])
     return True
 
 def delete_currency(currency_id, character_id):
     """Delete a currency."""
-    conn = get_db()
+    conn = _character_db(character_id)
     conn.execute(
         'DELETE FROM currencies WHERE id = ? AND character_id = ?',
         (currency_id, character_id)
     )
-    conn.commit()
-    conn.close()
+    _commit_characters(conn, [character_id], [('currency', currency_id)])
 
 def adjust_currency(currency_id, character_id, delta):
     """Add or subtract from a currency amount. Returns new amount or None."""
+    conn = _character_db(character_id)
+    cursor = conn.execute(
+        'UPDATE currencies SET amount = MAX(0, amount + ?) WHERE id = ? AND character_id = ?',
+        (delta, currency_id, character_id)
+    )
+    if not cursor.rowcount:
+        conn.close()
+        return None
+    new_amount = conn.execute('SELECT amount FROM currencies WHERE id = ?', (currency_id,)).fetchone()['amount']
+    _commit_characters(conn, [character_id], [('currency', currency_id)])
+    return new_amount
+
+
+# --- Compendium Catalog ---
+
+# kind -> (catalog table, catalog property table, entry table, entry property table,
+#          entry property key, kind-specific columns)
+CATALOG_KINDS = {
+    'inventory': ('catalog_items', 'catalog_item_properties', 'inventory_items', 'item_properties', 'item_id', ()),
+    'feature': ('catalog_features', 'catalog_feature_properties', 'features', 'feature_properties', 'feature_id', ('source',)),
+    'spell': ('catalog_spells', 'catalog_spell_properties', 'spells', 'spell_properties', 'spell_id', ('level',)),
+}
+
+def get_catalog(kind):
+    """List catalog entries of a kind (without descriptions), ordered by name."""
+    catalog_table, _, _, _, _, extra = CATALOG_KINDS[kind]
+    columns = ', '.join(('id', 'name') + extra)
     conn = get_db()
-    row = conn.execute(
-        'SELECT id, amount FROM currencies WHERE id = ? AND character_id = ?',
-        (currency_id, character_id)
+    rows = conn.execute(f'SELECT {columns} FROM {catalog_table} ORDER BY name, id').fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+def add_from_catalog(kind, character_id, catalog_id, props_enabled=1):
+    """Add a catalog entry to a character by reference. Returns the new entry id or None."""
+    catalog_table, catalog_props, table, props_table, prop_key, extra = CATALOG_KINDS[kind]
+    extra_cols = ''.join(f', {col}' for col in extra)
+    conn = _character_db(character_id)
+    cursor = conn.execute(f'''
+        INSERT INTO {table} (character_id, catalog_id, name, description{extra_cols}, sort_order)
+        SELECT ?, id, name, NULL{extra_cols},
+               (SELECT COALESCE(MAX(sort_order), -1) + 1 FROM {table} WHERE character_id = ?)
+        FROM {catalog_table} WHERE id = ?
+    ''', (character_id, character_id, catalog_id))
+    if not cursor.rowcount:
+        conn.close()
+        return None
+    entry_id = cursor.lastrowid
+
+    # Properties are copied so each character can toggle them independently
+    conn.execute(f'''
+        INSERT INTO {props_table} ({prop_key}, stat_id, value, enabled)
+        SELECT ?, stat_id, value, ? FROM {catalog_props} WHERE catalog_id = ? ORDER BY id
+    ''', (entry_id, props_enabled, catalog_id))
+
+    _commit_characters(conn, [character_id], [(CHANGE_KINDS[kind], entry_id)])
+    return entry_id
+
+def publish_to_catalog(kind, entry_id, character_id):
+    """Copy a character's entry into the catalog and link the entry to it. Returns the catalog id or None."""
+    catalog_table, catalog_props, table, props_table, prop_key, extra = CATALOG_KINDS[kind]
+    columns = ('name', 'description') + extra
+    conn = _character_db(character_id)
+    entry = conn.execute(
+        f'SELECT id, catalog_id, {", ".join(columns)} FROM {table} WHERE id = ? AND character_id = ?',
+        (entry_id, character_id)
     ).fetchone()
-    if not row:
+    if not entry:
         conn.close()
         return None
-    new_amount = max(0, row['amount'] + delta)
-    conn.execute('UPDATE currencies SET amount = ? WHERE id = ?', (new_amount, currency_id))
+    if entry['catalog_id']:
+        conn.close()
+        return entry['catalog_id']
+
+    values = [entry[col] for col in columns]
+    cursor = conn.execute(
+        f'INSERT INTO {catalog_table} ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})',
+        values
+    )
+    catalog_id = cursor.lastrowid
+    conn.execute(f'''
+        INSERT INTO {catalog_props} (catalog_id, stat_id, value)
+        SELECT ?, stat_id, value FROM {props_table} WHERE {prop_key} = ? ORDER BY id
+    ''', (catalog_id, entry_id))
+    conn.execute(f'UPDATE {table} SET catalog_id = ?, description = NULL WHERE id = ?', (catalog_id, entry_id))
+    _commit_characters(conn, [character_id], [(CHANGE_KINDS[kind], entry_id)])
+    return catalog_id
+
+def delete_catalog_entry(kind, catalog_id):
+    """Remove a catalog entry, first giving referencing entries their own copy of its text."""
+    catalog_table, catalog_props, table, _, _, _ = CATALOG_KINDS[kind]
+    # compendium.db (shard 0) goes last, so the entry is only deleted once every shard has its copy
+    for shard in reversed(_shards()):
+        conn = get_db(shard)
+        character_ids = [row['character_id'] for row in conn.execute(
+            f'SELECT DISTINCT character_id FROM {table} WHERE catalog_id = ?', (catalog_id,))]
+        conn.execute(f'''
+            UPDATE {table}
+            SET description = COALESCE(description, (SELECT c.description FROM {catalog_table} c WHERE c.id = ?)),
+                catalog_id = NULL
+            WHERE catalog_id = ?
+        ''', (catalog_id, catalog_id))
+        if not shard:
+            conn.execute(f'DELETE FROM {catalog_props} WHERE catalog_id = ?', (catalog_id,))
+            conn.execute(f'DELETE FROM {catalog_table} WHERE id = ?', (catalog_id,))
+        _commit_characters(conn, character_ids)
+
+def deduplicate_into_catalog(kind):
+    """Move descriptions that several entries share verbatim into the catalog. Returns rows relinked."""
+    catalog_table, _, table, _, _, extra = CATALOG_KINDS[kind]
+    key = ('name', 'description') + extra
+    key_cols = ', '.join(key)
+    # IS rather than =, so entries with a NULL source still match their catalog row
+    match = ' AND '.join(f'c.{col} IS {table}.{col}' for col in key)
+    conn = _scatter_db()
+    # Only text the catalog doesn't already hold; entries matching an existing row are linked to it below.
+    # A run interrupted before the relinking finishes links to these rows next time.
+    conn.execute(f'''
+        INSERT INTO {catalog_table} ({key_cols})
+        SELECT {key_cols} FROM {table}
+        WHERE catalog_id IS NULL AND description != ''
+          AND NOT EXISTS (SELECT 1 FROM {catalog_table} c WHERE {match})
+        GROUP BY {key_cols} HAVING COUNT(*) > 1
+    ''')
     conn.commit()
     conn.close()
-    return new_amount
+
+    candidates = f'''
+        WHERE catalog_id IS NULL AND description != ''
+          AND EXISTS (SELECT 1 FROM {catalog_table} c WHERE {match})
+    '''
+    relinked = 0
+    for shard in _shards():
+        conn = get_db(shard)
+        character_ids = [row['character_id'] for row in conn.execute(
+            f'SELECT DISTINCT character_id FROM {table} {candidates}')]
+        cursor = conn.execute(f'''
+            UPDATE {table}
+            SET catalog_id = (SELECT MIN(c.id) FROM {catalog_table} c WHERE {match}),
+                description = NULL
+            {candidates}
+        ''')
+        relinked += cursor.rowcount
+        _commit_characters(conn, character_ids)
+    return relinked
+
+
+# --- Ordering ---
+
+# Maps the kind used in URLs to the table holding that kind of entry
+ORDERED_TABLES = {
+    'inventory': 'inventory_items',
+    'feature': 'features',
+    'spell': 'spells',
+    'currency': 'currencies',
+}
+
+def reorder_entries(kind, character_id, ordered_ids):
+    """Apply a full ordering to a character's entries in one transaction.
+
+    Only rows whose position actually changed are written. Returns False if
+    the ids don't match the character's entries exactly.
+    """
+    table = ORDERED_TABLES.get(kind)
+    if table is None:
+        return False
+
+    conn = _character_db(character_id)
+    # Under the write lock, so an entry added or moved meanwhile can't slip between the check and the writes
+    _begin_write(conn)
+    current = {
+        row['id']: row['sort_order']
+        for row in conn.execute(f'SELECT id, sort_order FROM {table} WHERE character_id = ?', (character_id,))
+    }
+    if len(ordered_ids) != len(current) or set(ordered_ids) != current.keys():
+        conn.rollback()
+        conn.close()
+        return False
+
+    changed = [(position, entry_id) for position, entry_id in enumerate(ordered_ids)
+               if current[entry_id] != position]
+    conn.executemany(f'UPDATE {table} SET sort_order = ? WHERE id = ?', changed)
+    _commit_characters(conn, [character_id], [(CHANGE_KINDS[kind], entry_id) for _, entry_id in changed])
+    return True
+
+
+# --- Derived Stats ---
+
+ABILITIES = ['str', 'dex', 'con', 'int', 'wis', 'cha']
+
+# (skill, governing ability), matching the sheet's skill list
+SKILLS = [
+    ('acrobatics', 'dex'), ('animal_handling', 'wis'), ('arcana', 'int'),
+    ('athletics', 'str'), ('deception', 'cha'), ('history', 'int'),
+    ('insight', 'wis'), ('intimidation', 'cha'), ('investigation', 'int'),
+    ('medicine', 'wis'), ('nature', 'int'), ('perception', 'wis'),
+    ('performance', 'cha'), ('persuasion', 'cha'), ('religion', 'int'),
+    ('sleight_of_hand', 'dex'), ('stealth', 'dex'), ('survival', 'wis'),
+]
+
+# Proficiency levels (0 none, 1 proficient, 2 expertise) are packed two bits
+# per check into characters.proficiencies, in this order. Only ever append.
+PROFICIENCY_FIELDS = [
+    'str_save_prof', 'dex_save_prof', 'con_save_prof',
+    'int_save_prof', 'wis_save_prof', 'cha_save_prof',
+    'acrobatics_prof', 'animal_handling_prof', 'arcana_prof',
+    'athletics_prof', 'deception_prof', 'history_prof',
+    'insight_prof', 'intimidation_prof', 'investigation_prof',
+    'medicine_prof', 'nature_prof', 'perception_prof',
+    'performance_prof', 'persuasion_prof', 'religion_prof',
+    'sleight_of_hand_prof', 'stealth_prof', 'survival_prof',
+]
+_PROFICIENCY_SHIFTS = {field: 2 * i for i, field in enumerate(PROFICIENCY_FIELDS)}
+# Saves are proficient or not; skills also allow expertise
+_PROFICIENCY_MAX = {field: 1 if field.endswith('_save_prof') else 2 for field in PROFICIENCY_FIELDS}
+
+def unpack_proficiencies(mask):
+    """{field: level} for every proficiency field."""
+    mask = mask or 0
+    return {field: (mask >> shift) & 3 for field, shift in _PROFICIENCY_SHIFTS.items()}
+
+def _proficiency_bits(levels):
+    """(mask of bits to keep, bits to set) for writing {field: level} into the packed column."""
+    keep = ~0
+    bits = 0
+    for field, level in levels.items():
+        shift = _PROFICIENCY_SHIFTS[field]
+        level = min(max(int(level or 0), 0), _PROFICIENCY_MAX[field])
+        keep &= ~(3 << shift)
+        bits |= level << shift
+    return keep, bits
+
+# Every d20 check a character can make
+CHECK_KEYS = [f'{ability}_save' for ability in ABILITIES] + [skill for skill, _ in SKILLS]
+
+# Precomputed layout for compute_derived_stats_batch: each check is
+# (output key, ability index, proficiency bit shift, bonus key), so a
+# character is evaluated with list lookups and bit operations.
+_CHECK_PLAN = (
+    [(f'{a}_save', ABILITIES.index(a), _PROFICIENCY_SHIFTS[f'{a}_save_prof'], f'{a}_save') for a in ABILITIES]
+    + [(skill, ABILITIES.index(a), _PROFICIENCY_SHIFTS[f'{skill}_prof'], skill) for skill, a in SKILLS]
+)
+_SCORE_COLUMNS = [f'{a}_score' for a in ABILITIES]
+_MOD_KEYS = [f'{a}_mod' for a in ABILITIES]
+# Base column plus bonus of the same name
+_BONUSED_COLUMNS = ['ac', 'hp_max', 'mana_max', 'speed']
+_DEX = ABILITIES.index('dex')
+
+def proficiency_for_level(level):
+    """5e proficiency bonus for a character level (clamped to 1-20)."""
+    return (max(1, min(20, level or 1)) - 1) // 4 + 2
+
+def compute_derived_stats_batch(characters, bonuses_by_character):
+    """Derived stats for many characters: {character_id: stats}.
+
+    Uses the same rules as the sheet: modifiers come from the score plus
+    bonuses, saves add proficiency when proficient, skills add it 0/1/2
+    times, and initiative is the Dex modifier plus initiative bonuses.
+    Spell attack is proficiency plus spell attack bonuses, since sheets
+    don't record a casting ability.
+    """
+    result = {}
+    for character in characters:
+        bonuses = bonuses_by_character.get(character['id'], {})
+        bonus = bonuses.get
+        prof = (character['proficiency_bonus'] or 0) + bonus('proficiency_bonus', 0)
+
+        scores = [(character[col] or 10) + bonus(col, 0) for col in _SCORE_COLUMNS]
+        mods = [(score - 10) // 2 for score in scores]
+
+        stats = dict(zip(_SCORE_COLUMNS, scores))
+        stats.update(zip(_MOD_KEYS, mods))
+        proficiencies = character['proficiencies'] or 0
+        for key, ability_index, shift, bonus_key in _CHECK_PLAN:
+            stats[key] = mods[ability_index] + prof * ((proficiencies >> shift) & 3) + bonus(bonus_key, 0)
+        for col in _BONUSED_COLUMNS:
+            stats[col] = (character[col] or 0) + bonus(col, 0)
+
+        stats['level_proficiency_bonus'] = proficiency_for_level(character['level'])
+        stats['proficiency_bonus'] = prof
+        stats['initiative'] = mods[_DEX] + bonus('initiative', 0)
+        stats['spell_attack'] = prof + bonus('spell_attack', 0)
+        stats['passive_perception'] = 10 + stats['perception']
+        result[character['id']] = stats
+    return result
+
+def compute_derived_stats(character, bonuses):
+    """Derived stats for one character row and its merged bonuses."""
+    return compute_derived_stats_batch([character], {character['id']: bonuses})[character['id']]
+
+def get_check_modifiers(character, bonuses):
+    """Total d20 modifier for every save ('str_save', ...) and skill."""
+    stats = compute_derived_stats(character, bonuses)
+    return {key: stats[key] for key in CHECK_KEYS}
+
+
+# --- Character Fields ---
+
+# Editable character columns: column -> (type, default, minimum, maximum). Numbers are
+# clamped to the bounds and fall back to the default when they don't parse; for text the
+# maximum is a length. None leaves a bound open.
+CHARACTER_FIELDS = {
+    'name': (str, 'New Character', None, 200),
+    'level': (int, 1, 1, 30),
+    'class': (str, '', None, None),
+    'race': (str, '', None, None),
+    'background': (str, '', None, None),
+    'alignment': (str, '', None, None),
+    'hp_current': (int, 0, None, None),
+    'hp_max': (int, 0, 0, None),
+    'temp_hp': (int, 0, 0, None),
+    'ac': (int, 10, 0, None),
+    'proficiency_bonus': (int, 2, 0, None),
+    'str_score': (int, 10, 1, 30),
+    'dex_score': (int, 10, 1, 30),
+    'con_score': (int, 10, 1, 30),
+    'int_score': (int, 10, 1, 30),
+    'wis_score': (int, 10, 1, 30),
+    'cha_score': (int, 10, 1, 30),
+    'mana_current': (int, 0, 0, None),
+    'mana_max': (int, 0, 0, None),
+    'spellcasting': (int, 0, 0, 1),
+    'death_save_success': (int, 0, 0, 3),
+    'death_save_fail': (int, 0, 0, 3),
+    'initiative': (int, 0, None, None),
+    'speed': (int, 30, 0, None),
+    'equipment': (str, '', None, None),
+    'features': (str, '', None, None),
+    'custom_abilities': (str, '', None, None),
+    'conditions': (str, '', None, None),
+}
+# Proficiencies are written into their bits of the packed column
+CHARACTER_FIELDS.update((field, (int, 0, 0, _PROFICIENCY_MAX[field])) for field in PROFICIENCY_FIELDS)
+
+CHARACTER_FIELD_NAMES = frozenset(CHARACTER_FIELDS)
+# Canonical column order, so the same set of fields always produces the same statement
+_FIELD_ORDER = {field: i for i, field in enumerate(CHARACTER_FIELDS)}
+
+def coerce_field(field, value):
+    """A form or JSON value converted to what CHARACTER_FIELDS says the column holds."""
+    kind, default, minimum, maximum = CHARACTER_FIELDS[field]
+    if kind is str:
+        value = default if value is None else str(value)
+        return value[:maximum] if maximum is not None else value
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return default
+    if minimum is not None and value < minimum:
+        return minimum
+    if maximum is not None and value > maximum:
+        return maximum
+    return value
+
+def coerce_character_fields(data):
+    """{column: value} for the editable fields in data, coerced; other keys are dropped."""
+    return {field: coerce_field(field, value) for field, value in data.items() if field in CHARACTER_FIELD_NAMES}
+
+@lru_cache(maxsize=256)
+def _update_character_sql(columns, proficiencies):
+    """UPDATE for a canonical tuple of plain columns, plus the packed proficiencies when set."""
+    assignments = [f'{column} = ?' for column in columns]
+    if proficiencies:
+        assignments.append('proficiencies = (proficiencies & ?) | ?')
+    return f"UPDATE characters SET {', '.join(assignments)} WHERE id = ? AND user_id = ? AND deleted_at IS NULL"
+
+
+# --- Sheet Snapshots ---
+
+# Serve sheets from one stored JSON blob per character: a primary-key lookup and a
+# decode instead of a query per collection. Pays off when reads far outnumber writes.
+SHEET_SNAPSHOTS = os.environ.get('COMPENDIUM_SHEET_SNAPSHOTS') == '1'
+
+def _build_sheet(conn, character_id):
+    character = _load_character(conn, character_id)
+    if character is None:
+        return None
+    return {
+        'character': character,
+        'inventory': _load_inventory(conn, character_id),
+        'features': _load_features(conn, character_id),
+        'spells': _load_spells(conn, character_id),
+        'currencies': _load_currencies(conn, character_id),
+        'bonuses': _load_bonuses(conn, character_id),
+    }
+
+def _store_snapshot(conn, character_id, sheet):
+    """Save a freshly built sheet, unless a write has bumped the revision since it was read."""
+    data = json.dumps(sheet, separators=(',', ':'), default=dict)
+    try:
+        conn.execute('''
+            INSERT OR REPLACE INTO character_snapshots (character_id, revision, data)
+            SELECT id, revision, ? FROM characters WHERE id = ? AND revision = ?
+        ''', (data, character_id, sheet['character']['revision']))
+        conn.commit()
+    except sqlite3.OperationalError:
+        pass  # busy; the next read stores it instead
+
+def get_sheet(character_id, user_id):
+    """Everything the sheet shows: {'character', 'inventory', 'features', 'spells',
+    'currencies', 'bonuses'}, or None if the character isn't the user's.
+
+    With SHEET_SNAPSHOTS on, the sheet comes from character_snapshots. Every write
+    bumps the character's revision, which leaves the stored copy behind; the next read
+    notices the mismatch, rebuilds the sheet and stores it again.
+    """
+    if not SHEET_SNAPSHOTS:
+        character = get_character(character_id, user_id)
+        if character is None:
+            return None
+        return {
+            'character': character,
+            'inventory': get_inventory(character_id),
+            'features': get_features(character_id),
+            'spells': get_spells(character_id),
+            'currencies': get_currencies(character_id),
+            'bonuses': get_all_bonuses(character_id),
+        }
+
+    conn = _character_db(character_id)
+    row = conn.execute('''
+        SELECT c.user_id, c.revision, s.revision AS snapshot_revision, s.data
+        FROM characters c LEFT JOIN character_snapshots s ON s.character_id = c.id
+        WHERE c.id = ? AND c.deleted_at IS NULL
+    ''', (character_id,)).fetchone()
+    if row is None or row['user_id'] != user_id:
+        conn.close()
+        return None
+    if row['snapshot_revision'] == row['revision']:
+        conn.close()
+        return json.loads(row['data'])
+
+    # Build from one consistent read of every table
+    conn.execute('BEGIN')
+    sheet = _build_sheet(conn, character_id)
+    conn.commit()
+    if sheet is not None:
+        _store_snapshot(conn, character_id, sheet)
+    conn.close()
+    return sheet
+
+
+# --- Offline Batches ---
+
+# Most ops accepted in one batch request
+MAX_BATCH_OPS = 100
+# Applied op ids are remembered this long, so a batch replayed after a lost response is a no-op
+OP_RETENTION = 30 * 24 * 3600
+
+def _field_value(character, field):
+    if field in _PROFICIENCY_SHIFTS:
+        return (character['proficiencies'] >> _PROFICIENCY_SHIFTS[field]) & 3
+    return coerce_field(field, character[field])
+
+def _apply_field_op(conn, character, op):
+    field = op.get('field')
+    if not isinstance(field, str) or field not in CHARACTER_FIELD_NAMES:
+        return {'status': 'invalid'}
+    value = coerce_field(field, op.get('value'))
+    current = _field_value(character, field)
+
+    # Someone else wrote since the client's snapshot; only a problem if it was this field
+    if 'old' in op and op.get('base_revision') != character['revision'] \
+            and coerce_field(field, op['old']) != current and current != value:
+        return {'status': 'conflict', 'field': field, 'value': current}
+
+    if field in _PROFICIENCY_SHIFTS:
+        keep, bits = _proficiency_bits({field: value})
+        conn.execute(_update_character_sql((), True), (keep, bits, character['id'], character['user_id']))
+        character['proficiencies'] = (character['proficiencies'] & keep) | bits
+    else:
+        conn.execute(_update_character_sql((field,), False), (value, character['id'], character['user_id']))
+        character[field] = value
+    return {'status': 'applied', 'field': field, 'value': value}
+
+def _apply_currency_op(conn, character, op):
+    currency_id, delta = op.get('currency_id'), op.get('delta')
+    if not isinstance(currency_id, int) or not isinstance(delta, int):
+        return {'status': 'invalid'}
+    # Deltas commute, so concurrent adjustments never conflict
+    cursor = conn.execute('UPDATE currencies SET amount = MAX(0, amount + ?) WHERE id = ? AND character_id = ?',
+                          (delta, currency_id, character['id']))
+    if not cursor.rowcount:
+        return {'status': 'missing', 'currency_id': currency_id}
+    amount = conn.execute('SELECT amount FROM currencies WHERE id = ?', (currency_id,)).fetchone()['amount']
+    return {'status': 'applied', 'currency_id': currency_id, 'amount': amount}
+
+def apply_ops(character_id, user_id, ops):
+    """Apply a batch of queued offline edits, in order and in one transaction.
+
+    Every op has an op_id and the base_revision the client last saw. 'field' ops carry
+    field, value and old (the value the edit replaced); 'currency' ops carry currency_id
+    and delta. A field op conflicts, and is dropped in favour of the server's value, when
+    the character moved on and the field no longer holds old. Ops seen before return
+    their original result. Malformed ops get an 'invalid' result instead of failing the
+    batch. Returns (revision, results), one result per op in order, or (None, None) if the
+    character isn't the user's.
+    """
+    conn = _character_db(character_id)
+    _begin_write(conn)
+    row = conn.execute('SELECT * FROM characters WHERE id = ? AND user_id = ? AND deleted_at IS NULL',
+                       (character_id, user_id)).fetchone()
+    if not row:
+        conn.rollback()
+        conn.close()
+        return None, None
+    character = dict(row)
+    character['proficiencies'] = character['proficiencies'] or 0
+
+    results = []
+    changes = set()
+    now = time.time()
+    try:
+        for op in ops:
+            op_id = op.get('op_id') if isinstance(op, dict) else None
+            if not isinstance(op_id, str) or not op_id:
+                results.append({'op_id': op_id, 'status': 'invalid'})
+                continue
+            done = conn.execute('SELECT result FROM applied_ops WHERE character_id = ? AND op_id = ?',
+                                (character_id, op_id)).fetchone()
+            if done:
+                results.append(json.loads(done['result']))
+                continue
+
+            try:
+                if op.get('type') == 'field':
+                    result = _apply_field_op(conn, character, op)
+                    if result['status'] == 'applied':
+                        changes.add(('character', character_id))
+                elif op.get('type') == 'currency':
+                    result = _apply_currency_op(conn, character, op)
+                    if result['status'] == 'applied':
+                        changes.add(('currency', result['currency_id']))
+                else:
+                    result = {'status': 'invalid'}
+            except OverflowError:
+                # A number SQLite can't store; raised before the op's write
+                result = {'status': 'invalid'}
+            result['op_id'] = op_id
+            conn.execute('INSERT INTO applied_ops (character_id, op_id, applied_at, result) VALUES (?, ?, ?, ?)',
+                         (character_id, op_id, now, json.dumps(result)))
+            results.append(result)
+
+        conn.execute('DELETE FROM applied_ops WHERE applied_at < ?', (now - OP_RETENTION,))
+    except Exception:
+        # Don't leave the write lock held until the connection is garbage collected
+        conn.rollback()
+        conn.close()
+        raise
+    if changes:
+        _commit_characters(conn, [character_id], sorted(changes))
+        return character['revision'] + 1, results
+    conn.commit()
+    conn.close()
+    return character['revision'], results
+
+
+# --- Parties ---
+
+def create_party(name, created_by):
+    conn = get_db()
+    cursor = conn.execute('INSERT INTO parties (name, created_by) VALUES (?, ?)', (name, created_by))
+    party_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return party_id
+
+def delete_party(party_id):
+    conn = get_db()
+    conn.execute('DELETE FROM party_members WHERE party_id = ?', (party_id,))
+    conn.execute('DELETE FROM parties WHERE id = ?', (party_id,))
+    conn.commit()
+    conn.close()
+
+def get_parties_for_user(user_id, is_admin=False):
+    """Parties the user can see: all of them for admins, otherwise those with one of their characters."""
+    conn = _scatter_db()
+    rows = conn.execute('''
+        SELECT p.id, p.name, COUNT(c.id) as member_count
+        FROM parties p
+        LEFT JOIN party_members pm ON pm.party_id = p.id
+        LEFT JOIN characters c ON c.id = pm.character_id AND c.deleted_at IS NULL
+        WHERE ? OR p.id IN (
+            SELECT pm2.party_id FROM party_members pm2
+            JOIN characters c ON c.id = pm2.character_id
+            WHERE c.user_id = ? AND c.deleted_at IS NULL
+        )
+        GROUP BY p.id
+        ORDER BY p.name
+    ''', (1 if is_admin else 0, user_id)).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+def get_party(party_id, user_id, is_admin=False):
+    """The party if the user may view it, else None."""
+    conn = _scatter_db()
+    row = conn.execute('''
+        SELECT id, name FROM parties p
+        WHERE id = ? AND (? OR EXISTS (
+            SELECT 1 FROM party_members pm
+            JOIN characters c ON c.id = pm.character_id
+            WHERE pm.party_id = p.id AND c.user_id = ? AND c.deleted_at IS NULL
+        ))
+    ''', (party_id, 1 if is_admin else 0, user_id)).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+def add_party_member(party_id, character_id):
+    conn = _scatter_db()
+    conn.execute(
+        '''INSERT OR IGNORE INTO party_members (party_id, character_id)
+           SELECT p.id, c.id FROM parties p, characters c WHERE p.id = ? AND c.id = ? AND c.deleted_at IS NULL''',
+        (party_id, character_id)
+    )
+    conn.commit()
+    conn.close()
+
+def remove_party_member(party_id, character_id):
+    conn = get_db()
+    conn.execute('DELETE FROM party_members WHERE party_id = ? AND character_id = ?',
+                 (party_id, character_id))
+    conn.commit()
+    conn.close()
+
+def get_all_characters():
+    """Every character with its owner's name, for picking party members."""
+    conn = _scatter_db()
+    rows = conn.execute('''
+        SELECT c.id, c.name, u.username
+        FROM characters c
+        JOIN users u ON u.id = c.user_id
+        WHERE c.deleted_at IS NULL
+        ORDER BY u.username, c.name
+    ''').fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+def get_party_sheets(party_id):
+    """Summaries of every member for the party view.
+
+    Three queries regardless of party size: member rows, their merged
+    bonuses, and their currencies.
+    """
+    conn = _scatter_db()
+    characters = conn.execute('''
+        SELECT c.*, u.username
+        FROM party_members pm
+        JOIN characters c ON c.id = pm.character_id
+        JOIN users u ON u.id = c.user_id
+        WHERE pm.party_id = ? AND c.deleted_at IS NULL
+        ORDER BY c.name
+    ''', (party_id,)).fetchall()
+
+    ids = [c['id'] for c in characters]
+    currencies = {character_id: [] for character_id in ids}
+    if ids:
+        placeholders = ','.join('?' * len(ids))
+        for row in conn.execute(
+            f'SELECT character_id, abbreviation, amount FROM currencies '
+            f'WHERE character_id IN ({placeholders}) ORDER BY sort_order, id',
+            ids
+        ):
+            currencies[row['character_id']].append({'abbreviation': row['abbreviation'], 'amount': row['amount']})
+    conn.close()
+
+    derived = compute_derived_stats_batch(characters, get_all_bonuses_batch(ids))
+    sheets = []
+    for c in characters:
+        stats = derived[c['id']]
+        sheets.append({
+            'id': c['id'],
+            'name': c['name'],
+            'player': c['username'],
+            'level': c['level'],
+            'class': c['class'] or '',
+            'hp_current': c['hp_current'],
+            'hp_max': stats['hp_max'],
+            'temp_hp': c['temp_hp'] or 0,
+            'ac': stats['ac'],
+            'passive_perception': stats['passive_perception'],
+            'initiative': stats['initiative'],
+            'conditions': c['conditions'] or '',
+            'death_save_success': c['death_save_success'] or 0,
+            'death_save_fail': c['death_save_fail'] or 0,
+            'currencies': currencies[c['id']],
+        })
+    return sheets
+
+
+# --- Export / Import ---
+
+EXPORT_FORMAT = 'compendium-jsonl'
+EXPORT_VERSION = 1
+# Rows fetched per query while exporting, so memory stays flat however large the export
+EXPORT_PAGE_SIZE = 1000
+# Records inserted per transaction while importing
+IMPORT_CHUNK_SIZE = 500
+
+# Record type -> (table, parent record type, parent key column), in stream order:
+# every record comes after the record it points at
+EXPORT_RECORDS = {
+    'character': ('characters', None, None),
+    'item': ('inventory_items', 'character', 'character_id'),
+    'item_property': ('item_properties', 'item', 'item_id'),
+    'feature': ('features', 'character', 'character_id'),
+    'feature_property': ('feature_properties', 'feature', 'feature_id'),
+    'spell': ('spells', 'character', 'character_id'),
+    'spell_property': ('spell_properties', 'spell', 'spell_id'),
+    'currency': ('currencies', 'character', 'character_id'),
+}
+
+# Instance-specific columns that never leave the database
+_EXPORT_EXCLUDED = ('user_id', 'revision', 'deleted_at', 'catalog_id', 'stat_id', 'description_version')
+
+_ENTRY_CATALOGS = {table: catalog_table for catalog_table, _, table, _, _, _ in CATALOG_KINDS.values()}
+
+def _export_query(conn, record_type, scope):
+    """SELECT for one record type limited to the characters matching scope, plus the alias it pages on."""
+    table, parent_type, parent_key = EXPORT_RECORDS[record_type]
+    columns = _table_columns(conn, table, _EXPORT_EXCLUDED + ('description',))
+    if parent_type is None:
+        select = ', '.join(f'c.{col}' for col in columns)
+        return f'SELECT {select}, u.username AS owner FROM characters c LEFT JOIN users u ON u.id = c.user_id WHERE {scope}', 'c'
+
+    select = ', '.join(f'x.{col}' for col in columns)
+    if parent_key == 'character_id':
+        catalog_table = _ENTRY_CATALOGS.get(table)
+        if catalog_table:
+            # Inline inherited catalog text so the export stands on its own
+            select += ", COALESCE(x.description, cat.description, '') AS description"
+            joins = f'LEFT JOIN {catalog_table} cat ON cat.id = x.catalog_id'
+        else:
+            joins = ''
+        return f'SELECT {select} FROM {table} x JOIN characters c ON c.id = x.character_id {joins} WHERE {scope}', 'x'
+
+    parent_table = EXPORT_RECORDS[parent_type][0]
+    return (
+        f'SELECT {select}, s.key AS stat_modified FROM {table} x '
+        f'JOIN stats s ON s.id = x.stat_id '
+        f'JOIN {parent_table} e ON e.id = x.{parent_key} '
+        f'JOIN characters c ON c.id = e.character_id WHERE {scope}'
+    ), 'x'
+
+def _paged_rows(conn, sql, alias, params):
+    """Yield the rows of sql in id order, one short query per EXPORT_PAGE_SIZE rows."""
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            f'{sql} AND {alias}.id > ? ORDER BY {alias}.id LIMIT {EXPORT_PAGE_SIZE}',
+            params + (last_id,)
+        ).fetchall()
+        for row in rows:
+            yield row
+        if len(rows) < EXPORT_PAGE_SIZE:
+            return
+        last_id = rows[-1]['id']
+
+def export_characters(character_id=None, user_id=None):
+    """Stream characters as JSON Lines: a header line, then one record per line.
+
+    Exports one character, all of a user's characters, or with neither argument the whole
+    instance. Records keep their source ids so children can name their parent; stats are
+    written as keys and catalog text is inlined. Every page is read in one transaction, so
+    the file is a consistent snapshot: with WAL, writes carry on meanwhile but aren't seen.
+    """
+    if character_id is not None:
+        scope, params = 'c.id = ? AND c.deleted_at IS NULL', (character_id,)
+        shards = [character_shard(character_id)]
+    elif user_id is not None:
+        scope, params = 'c.user_id = ? AND c.deleted_at IS NULL', (user_id,)
+        shards = [user_shard(user_id)]
+    else:
+        scope, params = 'c.deleted_at IS NULL', ()
+        shards = _shards()
+
+    # Shards hold ascending id ranges, so reading them in turn keeps each record type in id order
+    conns = []
+    try:
+        for shard in shards:
+            conn = get_db(shard)
+            conns.append(conn)
+            conn.execute('BEGIN')
+            # A transaction's snapshot starts at its first read of each file
+            for schema in conn.execute('PRAGMA database_list').fetchall():
+                conn.execute(f'SELECT 1 FROM {schema["name"]}.sqlite_master LIMIT 1').fetchall()
+        yield json.dumps({'type': 'header', 'format': EXPORT_FORMAT, 'version': EXPORT_VERSION}) + '\n'
+        for record_type in EXPORT_RECORDS:
+            for conn in conns:
+                sql, alias = _export_query(conn, record_type, scope)
+                for row in _paged_rows(conn, sql, alias, params):
+                    yield json.dumps({'type': record_type, **dict(row)}) + '\n'
+    finally:
+        for conn in conns:
+            conn.rollback()
+            conn.close()
+
+def _next_ids(conn):
+    """First free id of every exported table, never reusing ids AUTOINCREMENT has handed out."""
+    next_ids = {}
+    for table, _, _ in EXPORT_RECORDS.values():
+        row = conn.execute(
+            f"SELECT MAX(COALESCE((SELECT MAX(id) FROM {table}), 0), "
+            f"COALESCE((SELECT seq FROM sqlite_sequence WHERE name = ?), 0)) AS last_id",
+            (table,)
+        ).fetchone()
+        next_ids[table] = row['last_id'] + 1
+    return next_ids
+
+def import_characters(lines, user_id, keep_owners=False):
+    """Import a JSON Lines export, giving every record a fresh id.
+
+    Characters go to user_id, or with keep_owners to the existing user named in their owner
+    field. Records are validated as they are read and written with executemany, one
+    transaction per IMPORT_CHUNK_SIZE records. Properties of stats this instance doesn't know
+    are skipped, as are records whose parent isn't in the file (and so their own children).
+    Each character and its records go to its owner's shard.
+    Raises ValueError naming the first bad line; chunks before it stay imported. Returns
+    counts and throughput.
+    """
+    started = time.perf_counter()
+    conn = get_db()
+    columns = {record_type: set(_table_columns(conn, table, ('id', parent_key) + _EXPORT_EXCLUDED))
+               for record_type, (table, _, parent_key) in EXPORT_RECORDS.items()}
+    owners = {}
+    if keep_owners:
+        owners = {row['username']: row['id'] for row in conn.execute('SELECT id, username FROM users WHERE deleted_at IS NULL')}
+
+    id_maps = {record_type: {} for record_type in EXPORT_RECORDS}
+    counts = {record_type: 0 for record_type in EXPORT_RECORDS}
+    pending = {}
+    buffered = skipped = orphans = 0
+    # Per shard: its connection and the next free id of each table
+    conns = {0: conn}
+    next_ids = {}
+    header = None
+
+    def flush():
+        # Parents before children, in case foreign keys are enforced
+        for record_type in EXPORT_RECORDS:
+            for (shard, pending_type, cols), rows in pending.items():
+                if pending_type != record_type:
+                    continue
+                table = EXPORT_RECORDS[record_type][0]
+                conns[shard].executemany(
+                    f'INSERT INTO {table} ({", ".join(cols)}) VALUES ({", ".join("?" * len(cols))})', rows)
+        for shard_conn in conns.values():
+            shard_conn.commit()
+        pending.clear()
+
+    line_number = 0
+    try:
+        for line_number, line in enumerate(lines, 1):
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                raise ValueError(f'Line {line_number}: not valid JSON')
+            if not isinstance(record, dict):
+                raise ValueError(f'Line {line_number}: expected an object')
+
+            if header is None:
+                if record.get('type') != 'header' or record.get('format') != EXPORT_FORMAT:
+                    raise ValueError('Not a character export')
+                if record.get('version') != EXPORT_VERSION:
+                    raise ValueError(f"Unsupported export version {record.get('version')}")
+                header = record
+                continue
+
+            record_type = record.get('type')
+            if record_type not in EXPORT_RECORDS:
+                raise ValueError(f'Line {line_number}: unknown record type {record_type!r}')
+            table, parent_type, parent_key = EXPORT_RECORDS[record_type]
+            source_id = record.get('id')
+            if not isinstance(source_id, int) or source_id in id_maps[record_type]:
+                raise ValueError(f'Line {line_number}: missing or duplicate id')
+
+            if parent_type is None:
+                owner_id = owners.get(record.get('owner'), user_id)
+                parent_column, parent_id = 'user_id', owner_id
+                shard = user_shard(owner_id)
+            else:
+                parent_id = id_maps[parent_type].get(record.get(parent_key))
+                if parent_id is None:
+                    orphans += 1
+                    continue
+                parent_column = parent_key
+                # Every table's ids fall in their shard's range, so the parent's id names the shard
+                shard = character_shard(parent_id)
+
+            fields = sorted(key for key in record if key in columns[record_type])
+            values = [record[key] for key in fields]
+            if any(value is not None and not isinstance(value, (str, int, float)) for value in values):
+                raise ValueError(f'Line {line_number}: values must be strings or numbers')
+            if 'name' in columns[record_type] and not isinstance(record.get('name'), str):
+                raise ValueError(f'Line {line_number}: {record_type} needs a name')
+            if parent_key and parent_key != 'character_id':
+                if record.get('stat_modified') not in STAT_KEYS:
+                    skipped += 1
+                    continue
+                fields.append('stat_id')
+                values.append(_stat_id(conn, record['stat_modified']))
+
+            if shard not in conns:
+                conns[shard] = get_db(shard)
+            shard_conn = conns[shard]
+            if not shard_conn.in_transaction:
+                # Reserve ids under the write lock; rows are then inserted with explicit ids
+                _begin_write(shard_conn)
+                next_ids[shard] = _next_ids(shard_conn)
+            new_id = next_ids[shard][table]
+            next_ids[shard][table] += 1
+            id_maps[record_type][source_id] = new_id
+            counts[record_type] += 1
+
+            cols = ('id', parent_column, *fields)
+            pending.setdefault((shard, record_type, cols), []).append((new_id, parent_id, *values))
+            buffered += 1
+            if buffered >= IMPORT_CHUNK_SIZE:
+                flush()
+                buffered = 0
+
+        if header is None:
+            raise ValueError('Not a character export')
+        if buffered:
+            flush()
+    except sqlite3.IntegrityError as e:
+        for shard_conn in conns.values():
+            shard_conn.rollback()
+        raise ValueError(f'Could not import the records before line {line_number}: {e}')
+    except ValueError:
+        for shard_conn in conns.values():
+            shard_conn.rollback()
+        raise
+    finally:
+        for shard_conn in conns.values():
+            shard_conn.close()
+
+    elapsed = time.perf_counter() - started
+    records = sum(counts.values())
+    return {
+        'characters': counts['character'],
+        'records': records,
+        'skipped': skipped,
+        'orphans': orphans,
+        'seconds': elapsed,
+        'records_per_second': records / elapsed if elapsed else 0,
+    }
+
+# --- Bulk Provisioning ---
+
+# Most users one provisioning file may create
+PROVISION_MAX_USERS = 5000
+# Worker processes hashing passwords; None uses one per CPU
+PROVISION_WORKERS = None
+# Below this many passwords, starting the process pool costs more than it saves
+PROVISION_POOL_MIN = 8
+# Usernames checked per IN (...) query, well under SQLite's variable limit
+PROVISION_LOOKUP_CHUNK = 500
+
+_TRUE_VALUES = ('1', 'true', 'yes', 'y', 'on', 'admin')
+
+def _hash_passwords(passwords):
+    """generate_password_hash for every password, spread over a process pool when there are enough."""
+    if len(passwords) < PROVISION_POOL_MIN:
+        return [generate_password_hash(password) for password in passwords]
+    with ProcessPoolExecutor(max_workers=PROVISION_WORKERS) as pool:
+        return list(pool.map(generate_password_hash, passwords, chunksize=max(1, len(passwords) // 64)))
+
+def _existing_usernames(conn, usernames):
+    """The subset of usernames already taken, including users waiting to be purged."""
+    usernames = list(usernames)
+    taken = set()
+    for start in range(0, len(usernames), PROVISION_LOOKUP_CHUNK):
+        chunk = usernames[start:start + PROVISION_LOOKUP_CHUNK]
+        rows = conn.execute(
+            f'SELECT username FROM users WHERE username IN ({", ".join("?" * len(chunk))})', chunk)
+        taken.update(row['username'] for row in rows)
+    return taken
+
+def _read_provision_csv(lines, min_password_length):
+    """Parse a provisioning CSV into (line, username, password, is_admin) rows plus per-line errors."""
+    reader = csv.DictReader(line.decode('utf-8-sig') if isinstance(line, bytes) else line.lstrip('\ufeff')
+                            for line in lines)
+    fields = [name.strip().lower() for name in reader.fieldnames or []]
+    if 'username' not in fields or 'password' not in fields:
+        raise ValueError('The CSV needs a header row with username and password columns')
+    reader.fieldnames = fields
+
+    rows, errors = [], []
+    for record in reader:
+        line = reader.line_num
+        username = (record.get('username') or '').strip()
+        password = record.get('password') or ''
+        if not username:
+            if any((value or '').strip() for value in record.values() if isinstance(value, str)):
+                errors.append((line, 'missing username'))
+            continue
+        if len(password) < min_password_length:
+            errors.append((line, f'{username}: password must be at least {min_password_length} characters'))
+            continue
+        is_admin = (record.get('is_admin') or '').strip().lower() in _TRUE_VALUES
+        rows.append((line, username, password, is_admin))
+        if len(rows) > PROVISION_MAX_USERS:
+            raise ValueError(f'A file can create at most {PROVISION_MAX_USERS} users')
+    return rows, errors
+
+def provision_users(lines, create_characters=False, min_password_length=0):
+    """Create users from CSV lines with username, password and optional is_admin columns.
+
+    Usernames that already exist or repeat earlier in the file are skipped and reported
+    together, as are rows with a missing username or too short a password. Passwords are
+    hashed in a process pool, then every user is inserted with executemany in one
+    transaction, along with a starter character each when create_characters is set.
+    Raises ValueError if the file has no usable header or too many rows.
+    """
+    started = time.perf_counter()
+    rows, errors = _read_provision_csv(lines, min_password_length)
+
+    repeated, seen, unique = [], set(), []
+    for row in rows:
+        if row[1] in seen:
+            repeated.append(row[1])
+        else:
+            seen.add(row[1])
+            unique.append(row)
+
+    conn = get_db()
+    shard_conns = {}
+    try:
+        taken = _existing_usernames(conn, seen)
+        fresh = [row for row in unique if row[1] not in taken]
+        # Hash outside the transaction so the write lock is only held for the inserts
+        hashes = _hash_passwords([password for _, _, password, _ in fresh])
+
+        conn.execute('BEGIN IMMEDIATE')
+        # Anyone created while the passwords were hashing
+        raced = _existing_usernames(conn, [row[1] for row in fresh])
+        taken |= raced
+        users = [(username, password_hash, 1 if is_admin else 0, _assign_shard(username))
+                 for (_, username, _, is_admin), password_hash in zip(fresh, hashes) if username not in raced]
+        conn.executemany('INSERT INTO users (username, password_hash, is_admin, shard) VALUES (?, ?, ?, ?)', users)
+
+        characters = 0
+        if create_characters and users:
+            names = [user[0] for user in users]
+            for start in range(0, len(names), PROVISION_LOOKUP_CHUNK):
+                chunk = names[start:start + PROVISION_LOOKUP_CHUNK]
+                for user in conn.execute(
+                        f'SELECT id, shard FROM users WHERE username IN ({", ".join("?" * len(chunk))})', chunk).fetchall():
+                    if user['shard'] and user['shard'] not in shard_conns:
+                        shard_conns[user['shard']] = get_db(user['shard'])
+                        _begin_write(shard_conns[user['shard']])
+                    _insert_character(shard_conns.get(user['shard'], conn), user['id'])
+                    characters += 1
+        # Users first: if a shard then fails, those users just lack their starter character
+        conn.commit()
+        for shard_conn in shard_conns.values():
+            shard_conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        for shard_conn in shard_conns.values():
+            shard_conn.rollback()
+        raise
+    finally:
+        conn.close()
+        for shard_conn in shard_conns.values():
+            shard_conn.close()
+
+    return {
+        'created': len(users),
+        'characters': characters,
+        'duplicates': [row[1] for row in unique if row[1] in taken] + repeated,
+        'errors': errors,
+        'seconds': time.perf_counter() - started,
+    }
@@ -0,0 +1,98 @@
+import cProfile
+import os
+import pstats
+import re
+import time
+
+from flask import g, request, session
+
+PROFILE_DIR = 'profiles'
+# Oldest captures are deleted once there are more than this many
+PROFILE_KEEP = 50
+TOP_FUNCTIONS = 15
+
+
+def _wants_profile():
+    return '_profile' in request.args or 'X-Profile' in request.headers
+
+
+def _capture_name():
+    path = re.sub(r'[^A-Za-z0-9]+', '_', request.path).strip('_') or 'root'
+    return f'{time.strftime("%Y%m%d-%H%M%S")}-{int(time.time() * 1000) % 1000:03d}-{request.method}-{path}.pstats'
+
+
+def _rotate():
+    captures = sorted(name for name in os.listdir(PROFILE_DIR) if name.endswith('.pstats'))
+    for name in captures[:-PROFILE_KEEP]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, name))
+        except OSError:
+            pass
+
+
+def init_app(app):
+    """Profile admin requests that ask for it with ?_profile or an X-Profile header."""
+
+    @app.before_request
+    def start_profile():
+        # Cheap header/query check first so ordinary traffic never touches the session
+        if not _wants_profile() or not session.get('is_admin'):
+            return
+        g.profiler = cProfile.Profile()
+        g.profile_name = _capture_name()
+        g.profiler.enable()
+
+    @app.after_request
+    def schedule_profile_dump(response):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return response
+        name = g.profile_name
+
+        # Stop when the body is fully sent so streamed templates are included
+        def dump():
+            profiler.disable()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(os.path.join(PROFILE_DIR, name))
+            _rotate()
+
+        response.call_on_close(dump)
+        response.headers['X-Profile-Capture'] = name
+        return response
+
+
+def capture_path(name):
+    """Absolute path of a capture, or None if the name isn't a capture file."""
+    if os.path.basename(name) != name or not name.endswith('.pstats'):
+        return None
+    path = os.path.abspath(os.path.join(PROFILE_DIR, name))
+    return path if os.path.isfile(path) else None
+
+
+def list_captures():
+    """Newest-first capture summaries with their most expensive functions by cumulative time."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+
+    captures = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if not name.endswith('.pstats'):
+            continue
+        try:
+            stats = pstats.Stats(os.path.join(PROFILE_DIR, name))
+        except (OSError, EOFError, TypeError, ValueError):
+            continue
+        stats.sort_stats('cumulative')
+        top = []
+        for func in stats.fcn_list[:TOP_FUNCTIONS]:
+            primitive_calls, calls, total_time, cumulative_time, _ = stats.stats[func]
+            filename, line, function = func
+            top.append({
+                'function': function,
+                'location': f'{os.path.basename(filename)}:{line}',
+                'calls': calls,
+                'total_ms': total_time * 1000,
+                'cumulative_ms': cumulative_time * 1000,
+            })
+        captures.append({'name': name, 'total_ms': stats.total_tt * 1000, 'top': top})
+    return captures
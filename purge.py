@@ -0,0 +1,38 @@
+import sqlite3
+import threading
+import time
+
+import models
+
+# Seconds between sweeps for tombstoned characters and users past their undo window
+PURGE_INTERVAL = 60
+
+_purger = None
+_purger_lock = threading.Lock()
+
+
+def _purge_loop():
+    while True:
+        time.sleep(PURGE_INTERVAL)
+        try:
+            models.purge_deleted()
+        except sqlite3.Error:
+            pass  # e.g. database locked for too long; the next sweep picks up where this one stopped
+
+
+def _start_purger():
+    global _purger
+    with _purger_lock:
+        if _purger is None:
+            _purger = threading.Thread(target=_purge_loop, name='compendium-purger', daemon=True)
+            _purger.start()
+
+
+def init_app(app):
+    """Remove deleted characters and users in the background once they can no longer be restored."""
+
+    # Started by the first request, like the backup scheduler
+    @app.before_request
+    def ensure_purger():
+        if _purger is None:
+            _start_purger()
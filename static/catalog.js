@@ -0,0 +1,40 @@
+// Add-from-compendium pickers in the add modals
+(function() {
+    'use strict';
+
+    function entryLabel(entry) {
+        if (entry.level != null) {
+            return entry.name + (entry.level === 0 ? ' (Cantrip)' : ' (Lvl ' + entry.level + ')');
+        }
+        if (entry.source) return entry.name + ' (' + entry.source + ')';
+        return entry.name;
+    }
+
+    function loadOptions(picker) {
+        if (picker.dataset.loaded) return;
+        picker.dataset.loaded = '1';
+        var select = picker.querySelector('select');
+
+        fetch(picker.dataset.catalogUrl)
+            .then(function(r) { return r.json(); })
+            .then(function(entries) {
+                entries.forEach(function(entry) {
+                    var option = document.createElement('option');
+                    option.value = entry.id;
+                    option.textContent = entryLabel(entry);
+                    select.appendChild(option);
+                });
+                if (!entries.length) select.options[0].textContent = 'Compendium is empty';
+            })
+            .catch(function() {
+                delete picker.dataset.loaded;
+            });
+    }
+
+    // The catalog is only fetched once someone reaches for a picker
+    document.querySelectorAll('.catalog-picker').forEach(function(picker) {
+        var select = picker.querySelector('select');
+        select.addEventListener('focus', function() { loadOptions(picker); });
+        select.addEventListener('mousedown', function() { loadOptions(picker); });
+    });
+})();
@@ -0,0 +1,50 @@
+// Currency
+(function() {
+    window.toggleCurrencyAdjuster = function(chip) {
+        var adjuster = chip.querySelector('.currency-adjuster');
+        var isOpen = adjuster.style.display !== 'none';
+
+        // Close all other adjusters first
+        document.querySelectorAll('.currency-adjuster').forEach(function(a) {
+            a.style.display = 'none';
+        });
+
+        if (!isOpen) {
+            adjuster.style.display = '';
+            var input = adjuster.querySelector('.adjuster-input');
+            if (input) input.focus();
+        }
+    };
+
+    window.adjustCurrency = function(currencyId, direction) {
+        var input = document.getElementById('adjuster-input-' + currencyId);
+        var delta = (parseInt(input.value) || 1) * direction;
+        var amount = document.getElementById('currency-amount-' + currencyId);
+
+        // Shown straight away; the queued delta is applied on the server whenever it's reachable
+        amount.textContent = Math.max(0, (parseInt(amount.textContent) || 0) + delta);
+        sheetQueue.adjustCurrency(currencyId, delta);
+    };
+
+    window.toggleCurrencyPanel = function() {
+        var panel = document.getElementById('currency-panel');
+        panel.style.display = panel.style.display === 'none' ? '' : 'none';
+    };
+
+    window.openAddCurrencyForm = function() {
+        document.getElementById('currency-add-form').style.display = '';
+    };
+
+    window.closeAddCurrencyForm = function() {
+        document.getElementById('currency-add-form').style.display = 'none';
+    };
+
+    // Close adjusters when clicking outside
+    document.addEventListener('click', function(e) {
+        if (!e.target.closest('.currency-chip') && !e.target.closest('.currency-add-form')) {
+            document.querySelectorAll('.currency-adjuster').forEach(function(a) {
+                a.style.display = 'none';
+            });
+        }
+    });
+})();
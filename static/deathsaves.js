@@ -0,0 +1,54 @@
+// Death Saves
+(function() {
+    var container = document.getElementById('death-saves');
+    if (!container) return;
+
+    var successCount = parseInt(container.dataset.success) || 0;
+    var failCount = parseInt(container.dataset.fail) || 0;
+
+    function renderPips() {
+        container.querySelectorAll('.death-save-pip[data-type="success"]').forEach(function(pip) {
+            var idx = parseInt(pip.dataset.index);
+            pip.classList.toggle('success-filled', idx <= successCount);
+        });
+        container.querySelectorAll('.death-save-pip[data-type="fail"]').forEach(function(pip) {
+            var idx = parseInt(pip.dataset.index);
+            pip.classList.toggle('fail-filled', idx <= failCount);
+        });
+
+        container.classList.remove('stabilized', 'dead');
+        if (successCount >= 3) container.classList.add('stabilized');
+        if (failCount >= 3) container.classList.add('dead');
+    }
+
+    function save() {
+        sheetQueue.field('death_save_success', successCount);
+        sheetQueue.field('death_save_fail', failCount);
+    }
+
+    container.addEventListener('click', function(e) {
+        var pip = e.target.closest('.death-save-pip');
+        if (!pip) return;
+
+        var type = pip.dataset.type;
+        var idx = parseInt(pip.dataset.index);
+
+        if (type === 'success') {
+            successCount = (idx <= successCount) ? idx - 1 : idx;
+        } else {
+            failCount = (idx <= failCount) ? idx - 1 : idx;
+        }
+
+        renderPips();
+        save();
+    });
+
+    window.resetDeathSaves = function() {
+        successCount = 0;
+        failCount = 0;
+        renderPips();
+        save();
+    };
+
+    renderPips();
+})();
@@ -0,0 +1,45 @@
+// Long descriptions: the sheet only carries a preview, the full text is fetched on expand
+(function() {
+    var requests = {};  // url -> promise of the full text
+
+    function fetchDescription(url) {
+        if (!requests[url]) {
+            requests[url] = fetch(url).then(function(r) {
+                if (!r.ok) throw new Error(r.status);
+                return r.json();
+            }).then(function(data) {
+                return data.description;
+            });
+            // Let a failed request (e.g. while offline) be retried on the next expand
+            requests[url].catch(function() { delete requests[url]; });
+        }
+        return requests[url];
+    }
+
+    function loadFull(el) {
+        if (el.dataset.loaded) return;
+        el.classList.add('loading');
+        fetchDescription(el.dataset.fullUrl).then(function(text) {
+            el.dataset.loaded = '1';
+            el.classList.remove('truncated', 'loading');
+            renderMarkdown(el, text);
+        }, function() {
+            el.classList.remove('loading');
+        });
+    }
+
+    document.addEventListener('click', function(e) {
+        var summary = e.target.closest('.item-summary');
+        if (!summary) return;
+        var el = summary.closest('.inventory-item').querySelector('.item-description[data-full-url]');
+        if (el) loadFull(el);
+    });
+
+    // Entries the server marked as likely to be opened are fetched once the page is idle
+    var whenIdle = window.requestIdleCallback || function(fn) { setTimeout(fn, 1000); };
+    whenIdle(function() {
+        document.querySelectorAll('.item-description[data-prefetch]').forEach(function(el) {
+            fetchDescription(el.dataset.fullUrl).catch(function() {});
+        });
+    });
+})();
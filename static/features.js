@@ -76,12 +76,13 @@
 
     window.openAddFeatureModal = function() {
         var modal = document.getElementById('feature-modal');
-        var form = modal.querySelector('form');
+        var form = modal.querySelector('form:not(.catalog-picker)');
         var title = document.getElementById('feature-modal-title');
 
         title.textContent = 'Add Feature';
         form.action = form.dataset.addUrl;
         form.reset();
+        document.getElementById('feature-catalog-picker').style.display = '';
 
         setSourceValue('');
         document.getElementById('feature-properties-container').innerHTML = '';
@@ -96,12 +97,13 @@
 
     window.openEditFeatureModal = function(featureId) {
         var modal = document.getElementById('feature-modal');
-        var form = modal.querySelector('form');
+        var form = modal.querySelector('form:not(.catalog-picker)');
         var title = document.getElementById('feature-modal-title');
         var characterId = form.dataset.characterId;
 
         title.textContent = 'Edit Feature';
         form.action = '/character/' + characterId + '/feature/' + featureId + '/update';
+        document.getElementById('feature-catalog-picker').style.display = 'none';
 
         // Hide "add with effects off" option in edit mode
         document.getElementById('feature-disabled-option').style.display = 'none';
@@ -15,12 +15,13 @@
 
     window.openAddItemModal = function() {
         const modal = document.getElementById('inventory-modal');
-        const form = modal.querySelector('form');
+        const form = modal.querySelector('form:not(.catalog-picker)');
         const title = document.getElementById('modal-title');
 
         title.textContent = 'Add Item';
         form.action = form.dataset.addUrl;
         form.reset();
+        document.getElementById('item-catalog-picker').style.display = '';
 
         // Clear all property rows
         document.getElementById('properties-container').innerHTML = '';
@@ -35,12 +36,13 @@
 
     window.openEditItemModal = function(itemId) {
         const modal = document.getElementById('inventory-modal');
-        const form = modal.querySelector('form');
+        const form = modal.querySelector('form:not(.catalog-picker)');
         const title = document.getElementById('modal-title');
         const characterId = form.dataset.characterId;
 
         title.textContent = 'Edit Item';
         form.action = '/character/' + characterId + '/inventory/' + itemId + '/update';
+        document.getElementById('item-catalog-picker').style.display = 'none';
 
         // Hide "add with effects off" option in edit mode
         document.getElementById('item-disabled-option').style.display = 'none';
@@ -0,0 +1,288 @@
+// Offline edit queue: sheet edits are stored locally and replayed through the batch endpoint,
+// so nothing typed while the connection is down is lost
+(function() {
+    var form = document.getElementById('character-form');
+    if (!form) return;
+    var batchUrl = form.dataset.batchUrl;
+    var changesUrl = form.dataset.changesUrl;
+    var statusEl = document.getElementById('sync-status');
+    var BATCH_SIZE = 50;
+    var RETRY_MS = 30000;
+    var NOTICE_KEY = 'compendium-sync-notice';
+
+    if ('serviceWorker' in navigator) {
+        navigator.serviceWorker.register('/sw.js').catch(function() {});
+    }
+
+    // Last value each field had on the server as far as this page knows; sent as "old"
+    // so the server can tell a stale edit from one made on top of the current value
+    var known = {};
+    document.querySelectorAll('[form="character-form"][name], #character-form [name]').forEach(function(el) {
+        if (el.type === 'checkbox') {
+            known[el.name] = el.defaultChecked ? 1 : 0;
+        } else if (el.tagName === 'SELECT') {
+            var selected = Array.from(el.options).find(function(o) { return o.defaultSelected; });
+            known[el.name] = selected ? selected.value : el.value;
+        } else {
+            known[el.name] = el.defaultValue;
+        }
+    });
+
+    // --- Storage: IndexedDB survives reloads and restarts; memory covers browsers that block it ---
+    function memoryStore() {
+        var ops = [], seq = 0;
+        return {
+            add: function(op) { op.seq = ++seq; ops.push(op); return Promise.resolve(); },
+            list: function() { return Promise.resolve(ops.slice()); },
+            remove: function(seqs) {
+                ops = ops.filter(function(op) { return seqs.indexOf(op.seq) === -1; });
+                return Promise.resolve();
+            }
+        };
+    }
+
+    function indexedStore(db) {
+        function run(mode, fn) {
+            return new Promise(function(resolve, reject) {
+                var tx = db.transaction('ops', mode);
+                var request = fn(tx.objectStore('ops'));
+                tx.oncomplete = function() { resolve(request ? request.result : undefined); };
+                tx.onerror = tx.onabort = function() { reject(tx.error); };
+            });
+        }
+        return {
+            add: function(op) { return run('readwrite', function(s) { return s.add(op); }); },
+            list: function() { return run('readonly', function(s) { return s.index('url').getAll(batchUrl); }); },
+            remove: function(seqs) {
+                return run('readwrite', function(s) { seqs.forEach(function(seq) { s.delete(seq); }); });
+            }
+        };
+    }
+
+    var store = new Promise(function(resolve) {
+        if (!window.indexedDB) return resolve(memoryStore());
+        var request = indexedDB.open('compendium', 1);
+        request.onupgradeneeded = function() {
+            var ops = request.result.createObjectStore('ops', {keyPath: 'seq', autoIncrement: true});
+            ops.createIndex('url', 'url');
+        };
+        request.onsuccess = function() { resolve(indexedStore(request.result)); };
+        request.onerror = function() { resolve(memoryStore()); };
+    });
+
+    // --- Status indicator ---
+    function setStatus(state, text) {
+        if (!statusEl) return;
+        statusEl.className = 'sync-status sync-' + state;
+        statusEl.textContent = text;
+        statusEl.hidden = !text;
+    }
+
+    function showPending(count, offline) {
+        if (!count) return setStatus('saved', '');
+        var changes = count + (count === 1 ? ' change' : ' changes');
+        setStatus(offline ? 'offline' : 'syncing', offline ? 'Offline: ' + changes + ' queued' : 'Saving ' + changes + '…');
+    }
+
+    var notice = sessionStorage.getItem(NOTICE_KEY);
+    if (notice) {
+        sessionStorage.removeItem(NOTICE_KEY);
+        setStatus('conflict', notice);
+    }
+
+    // --- Replay ---
+    var flushing = false;
+    var pendingFlush = false;
+    var retryTimer = null;
+    var conflicts = [];
+    var rejected = 0;
+    // Ops per request; drops to 1 after a whole batch is refused, so only the bad op is lost
+    var batchSize = BATCH_SIZE;
+    var SIGNED_OUT = {};
+    // Server revision the page is known to show; edits from elsewhere after it come in through refresh()
+    var syncedRevision = parseInt(form.dataset.revision) || 0;
+
+    function scheduleRetry() {
+        if (!retryTimer) retryTimer = setTimeout(function() { retryTimer = null; flush(); }, RETRY_MS);
+    }
+
+    function done() {
+        flushing = false;
+        if (pendingFlush) {
+            pendingFlush = false;
+            flush();
+        }
+    }
+
+    function rejectedNotice() {
+        return rejected + (rejected === 1 ? ' change was' : ' changes were') + ' rejected by the server';
+    }
+
+    function drained() {
+        batchSize = BATCH_SIZE;
+        if (!conflicts.length) {
+            if (rejected) setStatus('conflict', rejectedNotice());
+            rejected = 0;
+            return;
+        }
+        // The server kept its own value for these fields; reload so the sheet shows it
+        var notice = 'Changed elsewhere while you were offline, kept the newer value: ' +
+            conflicts.join(', ').replace(/_/g, ' ');
+        sessionStorage.setItem(NOTICE_KEY, rejected ? notice + '. ' + rejectedNotice() : notice);
+        location.reload();
+    }
+
+    function flush() {
+        if (flushing) {
+            pendingFlush = true;
+            return Promise.resolve();
+        }
+        flushing = true;
+        return store.then(function(s) {
+            return s.list().then(function(ops) {
+                if (!ops.length) {
+                    showPending(0);
+                    done();
+                    return drained();
+                }
+                var batch = ops.slice(0, batchSize);
+                showPending(ops.length, !navigator.onLine);
+                return fetch(batchUrl, {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify({ops: batch})
+                }).then(function(r) {
+                    if (r.status === 401) {
+                        setStatus('offline', 'Signed out: ' + ops.length + ' changes waiting');
+                        throw SIGNED_OUT;
+                    }
+                    if (r.status === 404) {
+                        // The character is gone; none of its queued edits can ever apply
+                        rejected += ops.length;
+                        return s.remove(ops.map(function(op) { return op.seq; }));
+                    }
+                    if (r.status >= 400 && r.status < 500) {
+                        // Refused as a whole, so the culprit is unknown: resend one op at a time,
+                        // and once a single op is refused, drop just that one
+                        if (batch.length > 1) {
+                            batchSize = 1;
+                            return;
+                        }
+                        rejected += 1;
+                        return s.remove([batch[0].seq]);
+                    }
+                    if (!r.ok) throw new Error(r.status);
+                    return r.json().then(function(data) {
+                        // A batch is one revision; anything more means another device wrote in between
+                        if (data.revision === syncedRevision + 1) syncedRevision = data.revision;
+                        form.dataset.revision = data.revision;
+                        // Every op the server answered is finished, whatever its status;
+                        // anything it didn't answer stays queued for the next request
+                        var answered = {};
+                        data.results.forEach(function(result, i) {
+                            var op = batch[i];
+                            if (!op) return;
+                            answered[op.seq] = true;
+                            if (result.status === 'invalid' || result.status === 'missing') rejected += 1;
+                            if (result.status === 'conflict') {
+                                known[result.field] = result.value;
+                                if (conflicts.indexOf(result.field) === -1) conflicts.push(result.field);
+                            }
+                        });
+                        return s.remove(batch.filter(function(op) { return answered[op.seq]; })
+                            .map(function(op) { return op.seq; }));
+                    });
+                }).then(function() {
+                    flushing = false;
+                    pendingFlush = false;
+                    return flush();
+                });
+            });
+        }).catch(function(reason) {
+            if (reason !== SIGNED_OUT) {
+                store.then(function(s) { return s.list(); }).then(function(ops) { showPending(ops.length, true); });
+            }
+            done();
+            scheduleRetry();
+        });
+    }
+
+    function newOpId() {
+        if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+        return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+    }
+
+    function enqueue(op) {
+        op.op_id = newOpId();
+        op.base_revision = parseInt(form.dataset.revision) || 0;
+        op.url = batchUrl;
+        return store.then(function(s) { return s.add(op); }).then(flush);
+    }
+
+    // --- Refresh: pull edits made elsewhere, applying field changes in place ---
+    function normalize(value) {
+        return value === null || value === undefined ? '' : String(value);
+    }
+
+    // Plain inputs can take a new value directly; anything else (pools, checkboxes,
+    // proficiency pips) is rendered from more state than the value, so reload for those
+    function applyField(name, value) {
+        var el = document.querySelector('[form="character-form"][name="' + name + '"], #character-form [name="' + name + '"]');
+        if (!el || el === document.activeElement) return false;
+        if (el.tagName === 'SELECT' || (el.tagName === 'INPUT' && (el.type === 'text' || el.type === 'number') && el.readOnly)) {
+            el.value = el.defaultValue = value;
+            known[name] = value;
+            // sheet.js recalculates modifiers and totals on input; saving only happens on blur
+            el.dispatchEvent(new Event('input'));
+            return true;
+        }
+        return false;
+    }
+
+    function applyChanges(data) {
+        if (data.full || data.inventory || data.features || data.spells || data.currencies) return false;
+        var character = data.character || {};
+        return Object.keys(character).every(function(name) {
+            if (!(name in known) || normalize(character[name]) === normalize(known[name])) return true;
+            return applyField(name, normalize(character[name]));
+        });
+    }
+
+    function refresh() {
+        if (!changesUrl || flushing || !navigator.onLine) return Promise.resolve();
+        return store.then(function(s) { return s.list(); }).then(function(ops) {
+            // Until queued edits are sent, the server's values for them would look like edits from elsewhere
+            if (ops.length) return;
+            var since = syncedRevision;
+            return fetch(changesUrl + '?since=' + since).then(function(r) {
+                return r.ok ? r.json() : null;
+            }).then(function(data) {
+                if (!data || !data.ok || data.revision === since || flushing) return;
+                if (!applyChanges(data)) return location.reload();
+                syncedRevision = data.revision;
+                form.dataset.revision = data.revision;
+            });
+        }).catch(function() {});
+    }
+
+    window.sheetQueue = {
+        // Set a character field (including proficiency levels)
+        field: function(field, value) {
+            var op = {type: 'field', field: field, value: value};
+            if (field in known) op.old = known[field];
+            known[field] = value;
+            return enqueue(op);
+        },
+        // Add delta to a currency; deltas from different devices simply add up
+        adjustCurrency: function(currencyId, delta) {
+            return enqueue({type: 'currency', currency_id: parseInt(currencyId), delta: delta});
+        },
+        flush: flush
+    };
+
+    window.addEventListener('online', function() { flush().then(refresh); });
+    document.addEventListener('visibilitychange', function() {
+        if (document.visibilityState === 'visible') refresh();
+    });
+    flush();
+})();
@@ -0,0 +1,64 @@
+// Party view: poll for member changes and patch only the rows that changed
+(function() {
+    'use strict';
+
+    var table = document.getElementById('party-table');
+    if (!table) return;
+    var POLL_MS = 10000;
+
+    function rows() {
+        return Array.from(table.querySelectorAll('tbody tr[data-id]'));
+    }
+
+    function hpText(m) {
+        return m.hp_current + ' / ' + m.hp_max + (m.temp_hp ? ' (+' + m.temp_hp + ')' : '');
+    }
+
+    function currencyText(m) {
+        return m.currencies.map(function(c) { return c.amount + ' ' + c.abbreviation; }).join(', ');
+    }
+
+    function patchRow(row, m) {
+        var values = {
+            name: m.name,
+            level: m.level,
+            hp: hpText(m),
+            ac: m.ac,
+            passive_perception: m.passive_perception,
+            initiative: m.initiative,
+            conditions: m.conditions,
+            currencies: currencyText(m)
+        };
+        row.querySelectorAll('[data-field]').forEach(function(cell) {
+            cell.textContent = values[cell.dataset.field];
+        });
+        row.dataset.version = m.version;
+    }
+
+    function poll() {
+        if (document.hidden) return;
+        var known = rows().map(function(row) { return row.dataset.id + ':' + row.dataset.version; }).join(',');
+
+        fetch(table.dataset.membersUrl + '?known=' + encodeURIComponent(known))
+            .then(function(r) { return r.json(); })
+            .then(function(data) {
+                if (!data.ok) return;
+                var byId = {};
+                rows().forEach(function(row) { byId[row.dataset.id] = row; });
+
+                // Someone joined: the row markup lives in the template, so re-render
+                if (data.ids.some(function(id) { return !byId[id]; })) {
+                    location.reload();
+                    return;
+                }
+                var current = data.ids.map(String);
+                Object.keys(byId).forEach(function(id) {
+                    if (current.indexOf(id) === -1) byId[id].remove();
+                });
+                data.changed.forEach(function(m) { patchRow(byId[m.id], m); });
+            })
+            .catch(function() {});
+    }
+
+    setInterval(poll, POLL_MS);
+})();
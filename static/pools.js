@@ -0,0 +1,136 @@
+// HP & Mana Pool Adjusters
+(function() {
+    // Pool state
+    var pools = {
+        hp: {
+            current: parseInt(document.querySelector('input[name="hp_current"]').value) || 0,
+            max: parseInt(document.querySelector('input[name="hp_max"]').value) || 0,
+            tempHp: parseInt(document.querySelector('input[name="temp_hp"]').value) || 0,
+            bonus: parseInt(document.getElementById('hp-pool').dataset.bonus) || 0
+        },
+        mana: {
+            current: parseInt(document.querySelector('input[name="mana_current"]')?.value) || 0,
+            max: parseInt(document.querySelector('input[name="mana_max"]')?.value) || 0,
+            bonus: parseInt(document.getElementById('mana-pool').dataset.bonus) || 0
+        }
+    };
+
+    function saveField(field, value) {
+        sheetQueue.field(field, value);
+    }
+
+    function updateDisplay(pool) {
+        var p = pools[pool];
+        var effectiveMax = p.max + (p.bonus || 0);
+        var text = p.current + ' / ' + effectiveMax;
+        document.getElementById(pool + '-display').textContent = text;
+        if (pool === 'hp') {
+            var tempEl = document.getElementById('hp-temp-display');
+            if (p.tempHp > 0) {
+                tempEl.textContent = '(+' + p.tempHp + ')';
+                tempEl.style.display = '';
+            } else {
+                tempEl.style.display = 'none';
+            }
+        }
+        // Sync hidden inputs
+        document.querySelector('input[name="' + pool + '_current"]').value = p.current;
+        document.querySelector('input[name="' + pool + '_max"]').value = p.max;
+        if (pool === 'hp') {
+            document.querySelector('input[name="temp_hp"]').value = p.tempHp;
+        }
+        // Sync popover inputs
+        var curInput = document.getElementById(pool + '-current-input');
+        var maxInput = document.getElementById(pool + '-max-input');
+        if (curInput) curInput.value = p.current;
+        if (maxInput) maxInput.value = p.max;
+    }
+
+    window.togglePoolAdjuster = function(pool) {
+        var adjuster = document.getElementById(pool + '-adjuster');
+        var isOpen = adjuster.style.display !== 'none';
+
+        // Close all pool adjusters
+        document.querySelectorAll('.pool-adjuster').forEach(function(a) {
+            a.style.display = 'none';
+        });
+
+        if (!isOpen) {
+            adjuster.style.display = '';
+            adjuster.querySelector('.pool-delta-input').focus();
+        }
+    };
+
+    window.adjustPool = function(pool, action, btn) {
+        var p = pools[pool];
+        var delta = parseInt(document.getElementById(pool + '-delta-input').value) || 1;
+        var effectiveMax = p.max + (p.bonus || 0);
+
+        if (action === 'heal') {
+            p.current = Math.min(p.current + delta, effectiveMax);
+            saveField(pool + '_current', p.current);
+        } else if (action === 'damage') {
+            if (pool === 'hp' && p.tempHp > 0) {
+                // Damage temp HP first
+                if (delta <= p.tempHp) {
+                    p.tempHp -= delta;
+                    saveField('temp_hp', p.tempHp);
+                } else {
+                    var remainder = delta - p.tempHp;
+                    p.tempHp = 0;
+                    p.current = Math.max(p.current - remainder, 0);
+                    saveField('temp_hp', p.tempHp);
+                    saveField(pool + '_current', p.current);
+                }
+            } else {
+                p.current = Math.max(p.current - delta, 0);
+                saveField(pool + '_current', p.current);
+            }
+        } else if (action === 'temp') {
+            // Temp HP doesn't stack — take the higher value
+            p.tempHp = Math.max(p.tempHp, delta);
+            saveField('temp_hp', p.tempHp);
+        }
+
+        updateDisplay(pool);
+
+        // Glow animation on the clicked button
+        if (btn) {
+            btn.classList.remove('glow');
+            void btn.offsetWidth; // force reflow to restart animation
+            btn.classList.add('glow');
+            btn.addEventListener('animationend', function() {
+                btn.classList.remove('glow');
+            }, {once: true});
+        }
+    };
+
+    // Direct edits to current/max fields in the popover
+    ['hp', 'mana'].forEach(function(pool) {
+        var curInput = document.getElementById(pool + '-current-input');
+        var maxInput = document.getElementById(pool + '-max-input');
+        if (curInput) {
+            curInput.addEventListener('change', function() {
+                pools[pool].current = parseInt(this.value) || 0;
+                saveField(pool + '_current', pools[pool].current);
+                updateDisplay(pool);
+            });
+        }
+        if (maxInput) {
+            maxInput.addEventListener('change', function() {
+                pools[pool].max = parseInt(this.value) || 0;
+                saveField(pool + '_max', pools[pool].max);
+                updateDisplay(pool);
+            });
+        }
+    });
+
+    // Close pool adjusters when clicking outside
+    document.addEventListener('click', function(e) {
+        if (!e.target.closest('.stat-box-pool')) {
+            document.querySelectorAll('.pool-adjuster').forEach(function(a) {
+                a.style.display = 'none';
+            });
+        }
+    });
+})();
@@ -0,0 +1,71 @@
+// Drag-and-drop reordering for inventory, features, spells and currencies
+(function() {
+    'use strict';
+
+    var dragged = null;
+
+    function entryIds(list, itemSelector) {
+        return Array.from(list.querySelectorAll(itemSelector)).map(function(el) {
+            return parseInt(el.dataset.id);
+        });
+    }
+
+    document.querySelectorAll('[data-reorder-url]').forEach(function(list) {
+        var itemSelector = list.dataset.reorderItem;
+        var orderBefore = null;
+
+        list.querySelectorAll(itemSelector).forEach(function(el) {
+            el.draggable = true;
+        });
+
+        list.addEventListener('dragstart', function(e) {
+            var el = e.target.closest(itemSelector);
+            if (!el || !list.contains(el)) return;
+            dragged = el;
+            orderBefore = entryIds(list, itemSelector).join(',');
+            el.classList.add('dragging');
+            e.dataTransfer.effectAllowed = 'move';
+        });
+
+        list.addEventListener('dragover', function(e) {
+            if (!dragged || !list.contains(dragged)) return;
+            var target = e.target.closest(itemSelector);
+            // Entries only move within their own group (e.g. spells of the same level, or
+            // equipped items, which the sheet always lists first)
+            if (!target || target === dragged || target.parentElement !== dragged.parentElement) return;
+            if (target.dataset.reorderGroup !== dragged.dataset.reorderGroup) return;
+            e.preventDefault();
+
+            var rect = target.getBoundingClientRect();
+            var horizontal = getComputedStyle(target.parentElement).flexDirection === 'row';
+            var after = horizontal
+                ? e.clientX > rect.left + rect.width / 2
+                : e.clientY > rect.top + rect.height / 2;
+            target.parentElement.insertBefore(dragged, after ? target.nextSibling : target);
+        });
+
+        list.addEventListener('drop', function(e) {
+            if (dragged) e.preventDefault();
+        });
+
+        list.addEventListener('dragend', function() {
+            if (!dragged) return;
+            dragged.classList.remove('dragging');
+            dragged = null;
+
+            var ids = entryIds(list, itemSelector);
+            if (ids.join(',') === orderBefore) return;
+
+            fetch(list.dataset.reorderUrl, {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({ids: ids})
+            })
+            .then(function(r) { return r.json(); })
+            .then(function(data) {
+                // The sheet is out of sync with the server; reload to show the real order
+                if (!data.ok) location.reload();
+            });
+        });
+    });
+})();
@@ -0,0 +1,120 @@
+// Sheet Search
+(function() {
+    var input = document.getElementById('sheet-search-input');
+    var clearBtn = document.getElementById('sheet-search-clear');
+    if (!input) return;
+
+    // Items: individual entries within sections
+    var itemSelector = '.inventory-item, .currency-chip';
+    // Sections: top-level sheet sections (ability scores, saves, skills, combat stats, death saves, etc.)
+    var sectionSelector = '.section, .combat-stats';
+
+    function getAllSearchables() {
+        return {
+            items: Array.from(document.querySelectorAll(itemSelector)),
+            sections: Array.from(document.querySelectorAll(sectionSelector))
+        };
+    }
+
+    function clearAllStates(searchables) {
+        searchables.items.forEach(function(el) {
+            el.classList.remove('search-match', 'search-dimmed');
+        });
+        searchables.sections.forEach(function(el) {
+            el.classList.remove('search-match', 'search-dimmed');
+        });
+    }
+
+    var debounceTimer;
+    input.addEventListener('input', function() {
+        clearTimeout(debounceTimer);
+        debounceTimer = setTimeout(doSearch, 150);
+    });
+
+    function doSearch() {
+        var query = input.value.trim().toLowerCase();
+        clearBtn.style.display = query ? '' : 'none';
+
+        var sheet = document.querySelector('.character-sheet');
+        var searchables = getAllSearchables();
+
+        if (!query) {
+            sheet.classList.remove('search-active');
+            clearAllStates(searchables);
+            return;
+        }
+
+        sheet.classList.add('search-active');
+        var firstMatch = null;
+
+        // First pass: search individual items and track which sections have item matches
+        var sectionsWithItemMatch = new Set();
+        searchables.items.forEach(function(item) {
+            var text = item.textContent.toLowerCase();
+            if (text.indexOf(query) !== -1) {
+                item.classList.add('search-match');
+                item.classList.remove('search-dimmed');
+                var parentSection = item.closest(sectionSelector);
+                if (parentSection) sectionsWithItemMatch.add(parentSection);
+                if (!firstMatch) firstMatch = item;
+            } else {
+                item.classList.remove('search-match');
+                item.classList.add('search-dimmed');
+            }
+        });
+
+        // Second pass: search sections by heading text, or full text for sections without items
+        searchables.sections.forEach(function(section) {
+            // Check heading match (h3 or first label)
+            var headings = section.querySelectorAll('h3, .proficiency-section > label, .stat-box > label');
+            var headingText = '';
+            headings.forEach(function(h) { headingText += ' ' + h.textContent.toLowerCase(); });
+
+            var hasItemMatch = sectionsWithItemMatch.has(section);
+            // For sections with items (inventory/features/spells), only match on heading
+            // For leaf sections (ability scores, saves, skills, combat stats, death saves), also match full text
+            var hasItems = section.querySelector(itemSelector);
+            var matched = headingText.indexOf(query) !== -1;
+            if (!matched && !hasItems) {
+                matched = section.textContent.toLowerCase().indexOf(query) !== -1;
+            }
+
+            if (matched || hasItemMatch) {
+                section.classList.add('search-match');
+                section.classList.remove('search-dimmed');
+                if (!firstMatch) firstMatch = section;
+            } else {
+                section.classList.remove('search-match');
+                section.classList.add('search-dimmed');
+            }
+        });
+
+        // Scroll first match into view and expand it
+        if (firstMatch) {
+            firstMatch.scrollIntoView({ behavior: 'smooth', block: 'center' });
+            // Auto-expand inventory/feature/spell items
+            var details = firstMatch.querySelector('.item-details');
+            if (details && !details.classList.contains('expanded')) {
+                var summary = firstMatch.querySelector('.item-summary');
+                if (summary) summary.click();
+            }
+        }
+    }
+
+    window.clearSheetSearch = function() {
+        input.value = '';
+        clearBtn.style.display = 'none';
+        var sheet = document.querySelector('.character-sheet');
+        sheet.classList.remove('search-active');
+        clearAllStates(getAllSearchables());
+        input.focus();
+    };
+
+    // Escape to clear search
+    input.addEventListener('keydown', function(e) {
+        if (e.key === 'Escape') {
+            clearSheetSearch();
+            input.blur();
+        }
+    });
+})();
@@ -0,0 +1,302 @@
+// Character sheet: property toggles, auto-save, 5e calculations, markdown
+
+// Toggle property enabled/disabled
+function toggleProperty(el) {
+    var propId = el.dataset.propId;
+    var table = el.dataset.table;
+    var characterId = document.getElementById('character-form').dataset.fieldUrl.split('/character/')[1].split('/')[0];
+
+    fetch('/character/' + characterId + '/property/toggle', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({table: table, prop_id: propId})
+    })
+    .then(function(r) { return r.json(); })
+    .then(function(data) {
+        if (data.ok) {
+            el.classList.toggle('disabled', !data.enabled);
+            // Reload to reflect bonus changes
+            location.reload();
+        }
+    });
+}
+
+(function() {
+    const form = document.getElementById('character-form');
+    if (!form) return;
+
+    // All text/number inputs associated with the character form
+    const formInputs = Array.from(document.querySelectorAll(
+        'input[type="number"][form="character-form"], #character-form input[type="number"],' +
+        'input[type="text"][form="character-form"], #character-form input[type="text"]'
+    ));
+
+    // All checkboxes associated with the character form
+    const checkboxes = Array.from(document.querySelectorAll(
+        'input[type="checkbox"][form="character-form"], #character-form input[type="checkbox"]'
+    ));
+
+    // --- Key elements ---
+    const levelInput = document.querySelector('input[name="level"][form="character-form"], #character-form input[name="level"]');
+    const profInput = document.querySelector('input[name="proficiency_bonus"][form="character-form"], #character-form input[name="proficiency_bonus"]');
+    const profSection = profInput ? profInput.closest('.proficiency-section') : null;
+    const abilityInputs = {
+        str: document.querySelector('input[name="str_score"][form="character-form"]'),
+        dex: document.querySelector('input[name="dex_score"][form="character-form"]'),
+        con: document.querySelector('input[name="con_score"][form="character-form"]'),
+        int: document.querySelector('input[name="int_score"][form="character-form"]'),
+        wis: document.querySelector('input[name="wis_score"][form="character-form"]'),
+        cha: document.querySelector('input[name="cha_score"][form="character-form"]'),
+    };
+
+    // --- Auto-save (queued, so edits made offline are replayed later) ---
+    function saveField(field, value) {
+        sheetQueue.field(field, value);
+    }
+
+    // --- D&D 5e calculations ---
+    function calcProfBonus(level) {
+        const lvl = Math.max(1, Math.min(20, parseInt(level) || 1));
+        return Math.floor((lvl - 1) / 4) + 2;
+    }
+
+    function calcMod(score) {
+        return Math.floor((score - 10) / 2);
+    }
+
+    function getAbilityMod(ability) {
+        const input = abilityInputs[ability];
+        const abilityBlock = input.closest('.ability-score');
+        const equipBonus = parseInt(abilityBlock.dataset.equipBonus) || 0;
+        const baseScore = parseInt(input.value) || 10;
+        return calcMod(baseScore + equipBonus);
+    }
+
+    function getEffectiveProf() {
+        const base = parseInt(profInput.value) || 0;
+        const equipBonus = profSection
+            ? parseInt((profSection.querySelector('.bonus-tag') || {}).textContent?.replace('+', '') || 0)
+            : 0;
+        return base + equipBonus;
+    }
+
+    // --- Update proficiency bonus from level ---
+    function updateProfFromLevel() {
+        if (!levelInput || !profInput) return;
+        profInput.value = calcProfBonus(levelInput.value);
+
+        if (profSection) {
+            const effectiveSpan = profSection.querySelector('.effective-inline');
+            if (effectiveSpan) effectiveSpan.textContent = getEffectiveProf();
+        }
+    }
+
+    // --- Update ability modifier + effective score displays ---
+    function recalcAbilities() {
+        document.querySelectorAll('.ability-score[data-ability]').forEach(block => {
+            const input = block.querySelector('input[type="number"]');
+            const equipBonus = parseInt(block.dataset.equipBonus) || 0;
+            const baseScore = parseInt(input.value) || 10;
+            const effectiveScore = baseScore + equipBonus;
+
+            const modEl = block.querySelector('.modifier');
+            if (modEl) modEl.textContent = calcMod(effectiveScore);
+
+            const effEl = block.querySelector('.effective-score');
+            if (effEl) effEl.textContent = effectiveScore;
+        });
+    }
+
+    // --- Update saving throw and skill bonus displays ---
+    function recalcSavesAndSkills() {
+        const effectiveProf = getEffectiveProf();
+
+        document.querySelectorAll('.ability-save[data-ability], .skills .skill-item[data-ability]').forEach(item => {
+            const ability = item.dataset.ability;
+            const equipBonus = parseInt(item.dataset.equipBonus) || 0;
+            const mod = getAbilityMod(ability);
+
+            var profMultiplier = 0;
+            if (item.classList.contains('ability-save')) {
+                // Saves: checkbox (binary)
+                var cb = item.querySelector('input[type="checkbox"]');
+                profMultiplier = cb && cb.checked ? 1 : 0;
+                item.classList.toggle('proficient', profMultiplier > 0);
+            } else {
+                // Skills: hidden input (0 = none, 1 = proficient, 2 = expertise)
+                var hidden = item.querySelector('input[type="hidden"]');
+                profMultiplier = hidden ? parseInt(hidden.value) || 0 : 0;
+            }
+
+            const total = mod + (effectiveProf * profMultiplier) + equipBonus;
+
+            const bonusSpan = item.querySelector('.skill-bonus');
+            if (bonusSpan) {
+                const equipStar = bonusSpan.querySelector('.equip-bonus-inline');
+                bonusSpan.textContent = total + ' ';
+                if (equipStar) bonusSpan.appendChild(equipStar);
+            }
+        });
+    }
+
+    // --- Skill pip tri-state cycling: 0 (none) -> 1 (proficient) -> 2 (expertise) -> 0 ---
+    document.querySelectorAll('.skill-pip').forEach(function(pip) {
+        pip.addEventListener('click', function() {
+            var current = parseInt(pip.dataset.value) || 0;
+            var next = (current + 1) % 3;
+            var hidden = pip.parentElement.querySelector('input[type="hidden"]');
+            if (!hidden) return;
+
+            pip.dataset.value = next;
+            hidden.value = next;
+            recalcSavesAndSkills();
+            // Sent as an explicit level so a replayed edit can't cycle twice
+            saveField(hidden.name, next);
+        });
+    });
+
+    // --- Double-click-to-edit ---
+    function makeEditable(input) {
+        input.readOnly = false;
+        input.classList.remove('field-readonly');
+        input.focus();
+        input.select();
+    }
+
+    function makeReadonly(input) {
+        input.readOnly = true;
+        input.classList.add('field-readonly');
+    }
+
+    // --- Update initiative display from Dex mod + bonuses ---
+    function recalcInitiative() {
+        var initDisplay = document.getElementById('initiative-display');
+        var initBox = document.getElementById('initiative-box');
+        if (!initDisplay || !abilityInputs.dex) return;
+        var dexMod = getAbilityMod('dex');
+        var initBonus = parseInt(initBox.dataset.initBonus) || 0;
+        initDisplay.textContent = dexMod + initBonus;
+        var baseLabel = initBox.querySelector('.base-label');
+        if (baseLabel) baseLabel.textContent = 'DEX ' + dexMod;
+    }
+
+    var abilityScoreNames = ['str_score', 'dex_score', 'con_score', 'int_score', 'wis_score', 'cha_score'];
+
+    // Live recalc while typing
+    function onInputChange(input) {
+        if (input.name === 'level') {
+            updateProfFromLevel();
+        } else if (abilityScoreNames.indexOf(input.name) !== -1) {
+            recalcAbilities();
+            recalcSavesAndSkills();
+            if (input.name === 'dex_score') recalcInitiative();
+        }
+    }
+
+    // Determine which fields to save after an ability/level change
+    function saveChangedFields(input) {
+        if (!input.name || input.value === input._valueBeforeEdit) return;
+        saveField(input.name, input.value);
+        if (input.name === 'level' && profInput) {
+            saveField('proficiency_bonus', profInput.value);
+        }
+    }
+
+    // Initialize text/number inputs as readonly with double-click-to-edit + auto-save on blur
+    formInputs.forEach(input => {
+        makeReadonly(input);
+
+        input.addEventListener('dblclick', () => {
+            input._valueBeforeEdit = input.value;
+            makeEditable(input);
+        });
+
+        input.addEventListener('input', () => onInputChange(input));
+
+        input.addEventListener('blur', () => {
+            makeReadonly(input);
+            saveChangedFields(input);
+        });
+
+        input.addEventListener('keydown', (e) => {
+            if (input.readOnly) return;
+
+            if (e.key === 'Tab') {
+                e.preventDefault();
+                const idx = formInputs.indexOf(input);
+                const next = e.shiftKey
+                    ? (idx - 1 + formInputs.length) % formInputs.length
+                    : (idx + 1) % formInputs.length;
+                makeReadonly(input);
+                saveChangedFields(input);
+                formInputs[next]._valueBeforeEdit = formInputs[next].value;
+                makeEditable(formInputs[next]);
+            }
+
+            if (e.key === 'Enter' || e.key === 'Escape') {
+                e.preventDefault();
+                makeReadonly(input);
+                if (e.key === 'Enter') saveChangedFields(input);
+            }
+        });
+    });
+
+    // Selects: save immediately on change
+    const selects = Array.from(document.querySelectorAll(
+        'select[form="character-form"], #character-form select'
+    ));
+    selects.forEach(sel => {
+        sel.addEventListener('change', () => {
+            if (sel.name) saveField(sel.name, sel.value);
+        });
+    });
+
+    // Checkboxes: save immediately on change + recalc saves/skills
+    checkboxes.forEach(cb => {
+        cb.addEventListener('change', () => {
+            if (cb.name) saveField(cb.name, cb.checked ? 1 : 0);
+            if (cb.name === 'spellcasting') {
+                var manaBox = document.querySelector('.mana-stat-box');
+                var spellsSection = document.querySelector('.spells-section');
+                if (manaBox) manaBox.style.display = cb.checked ? '' : 'none';
+                if (spellsSection) spellsSection.style.display = cb.checked ? '' : 'none';
+            } else {
+                recalcSavesAndSkills();
+            }
+        });
+    });
+
+    // Save circles: click to show proficiency checkbox, click outside to hide
+    document.querySelectorAll('.ability-save').forEach(save => {
+        save.addEventListener('click', function(e) {
+            if (e.target.classList.contains('save-prof-check')) return;
+            var wasEditing = save.classList.contains('editing');
+            // Close all other open save editors
+            document.querySelectorAll('.ability-save.editing').forEach(s => s.classList.remove('editing'));
+            if (!wasEditing) save.classList.add('editing');
+        });
+    });
+    document.addEventListener('click', function(e) {
+        if (!e.target.closest('.ability-save')) {
+            document.querySelectorAll('.ability-save.editing').forEach(s => s.classList.remove('editing'));
+        }
+    });
+})();
+
+// Render markdown in description fields
+(function() {
+    window.renderMarkdown = function(el, raw) {
+        if (typeof marked === 'undefined') {
+            el.textContent = raw;
+            return;
+        }
+        var html = marked.parse(raw);
+        el.innerHTML = typeof DOMPurify !== 'undefined' ? DOMPurify.sanitize(html) : html;
+    };
+
+    if (typeof marked === 'undefined') return;
+    marked.setOptions({ breaks: true, gfm: true });
+    document.querySelectorAll('.markdown-content').forEach(function(el) {
+        renderMarkdown(el, el.textContent);
+    });
+})();
@@ -42,12 +42,13 @@
 
     window.openAddSpellModal = function() {
         var modal = document.getElementById('spell-modal');
-        var form = modal.querySelector('form');
+        var form = modal.querySelector('form:not(.catalog-picker)');
         var title = document.getElementById('spell-modal-title');
 
         title.textContent = 'Add Spell';
         form.action = form.dataset.addUrl;
         form.reset();
+        document.getElementById('spell-catalog-picker').style.display = '';
 
         document.getElementById('spell-properties-container').innerHTML = '';
         spellPropertyIndex = 0;
@@ -58,12 +59,13 @@
 
     window.openEditSpellModal = function(spellId) {
         var modal = document.getElementById('spell-modal');
-        var form = modal.querySelector('form');
+        var form = modal.querySelector('form:not(.catalog-picker)');
         var title = document.getElementById('spell-modal-title');
         var characterId = form.dataset.characterId;
 
         title.textContent = 'Edit Spell';
         form.action = '/character/' + characterId + '/spell/' + spellId + '/update';
+        document.getElementById('spell-catalog-picker').style.display = 'none';
 
         fetch('/character/' + characterId + '/spell/' + spellId + '/json')
             .then(function(r) { return r.json(); })
@@ -0,0 +1,75 @@
+// Offline service worker: keeps the character sheet and its assets usable without a connection.
+// Edits made offline are queued by offline.js and replayed through the batch endpoint.
+var VERSION = {{ version | tojson }};
+var ASSET_CACHE = 'compendium-assets-' + VERSION;
+var PAGE_CACHE = 'compendium-pages';
+var ASSET_PREFIX = {{ asset_prefix | tojson }};
+var PRECACHE = {{ assets | tojson }};
+var SHEET_PATH = /^\/character\/\d+$/;
+
+self.addEventListener('install', function(event) {
+    event.waitUntil(caches.open(ASSET_CACHE).then(function(cache) {
+        return cache.addAll(PRECACHE);
+    }).then(function() {
+        return self.skipWaiting();
+    }));
+});
+
+// Drop asset caches from earlier versions; hashed names mean nothing in them is reused
+self.addEventListener('activate', function(event) {
+    event.waitUntil(caches.keys().then(function(keys) {
+        return Promise.all(keys.filter(function(key) {
+            return key.indexOf('compendium-assets-') === 0 && key !== ASSET_CACHE;
+        }).map(function(key) {
+            return caches.delete(key);
+        }));
+    }).then(function() {
+        return self.clients.claim();
+    }));
+});
+
+function cacheFirst(request) {
+    return caches.match(request).then(function(cached) {
+        return cached || fetch(request).then(function(response) {
+            if (response.ok || response.type === 'opaque') {
+                var copy = response.clone();
+                caches.open(ASSET_CACHE).then(function(cache) { cache.put(request, copy); });
+            }
+            return response;
+        });
+    });
+}
+
+// Sheets are always fetched fresh when possible; the cached copy is only an offline fallback
+function networkFirst(request) {
+    return fetch(request).then(function(response) {
+        if (response.ok && !response.redirected) {
+            var copy = response.clone();
+            caches.open(PAGE_CACHE).then(function(cache) { cache.put(request, copy); });
+        }
+        return response;
+    }).catch(function() {
+        return caches.match(request, {cacheName: PAGE_CACHE}).then(function(cached) {
+            return cached || Response.error();
+        });
+    });
+}
+
+self.addEventListener('fetch', function(event) {
+    var request = event.request;
+    if (request.method !== 'GET') return;
+    var url = new URL(request.url);
+
+    if (url.origin !== self.location.origin) {
+        // CDN scripts (marked, DOMPurify) are pinned to a version, so never change
+        if (request.destination === 'script' || request.destination === 'style' || request.destination === 'font') {
+            event.respondWith(cacheFirst(request));
+        }
+        return;
+    }
+    if (url.pathname.indexOf(ASSET_PREFIX) === 0) {
+        event.respondWith(cacheFirst(request));
+    } else if (request.mode === 'navigate' && SHEET_PATH.test(url.pathname)) {
+        event.respondWith(networkFirst(request));
+    }
+});
@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import models
+
+
+@pytest.fixture(params=[1, 3], ids=['unsharded', 'sharded'])
+def db(request, tmp_path, monkeypatch):
+    """A fresh database for one test, with an empty read cache. Every test runs unsharded and over three shards."""
+    monkeypatch.setattr(models, 'DATABASE', str(tmp_path / 'compendium.db'))
+    monkeypatch.setattr(models, 'SHARDS', request.param)
+    models.init_db()
+    models.cache_clear()
+    yield
+    models.cache_clear()
+
+
+@pytest.fixture
+def user_id(db):
+    models.create_user('alice', 'password')
+    return models.verify_user('alice', 'password')['id']
+
+
+@pytest.fixture
+def client(db, user_id, monkeypatch):
+    """A test client logged in as alice. The app is imported after db has pointed models at tmp_path."""
+    import app
+    import backup
+    import purge
+    # Keep the background purger and backup scheduler from starting
+    monkeypatch.setattr(purge, '_purger', object())
+    monkeypatch.setattr(backup, '_scheduler', object())
+    app.app.testing = True
+    with app.app.test_client() as test_client:
+        with test_client.session_transaction() as session:
+            session['user_id'] = user_id
+            session['username'] = 'alice'
+        yield test_client
@@ -0,0 +1,43 @@
+import os
+import time
+
+import pytest
+
+import backup
+
+
+@pytest.fixture
+def backup_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(backup, 'BACKUP_DIR', str(tmp_path / 'backups'))
+    monkeypatch.setattr(backup, 'BACKUP_INTERVAL_HOURS', 1)
+    os.makedirs(backup.BACKUP_DIR)
+    return backup.BACKUP_DIR
+
+
+def touch(directory, name, age):
+    path = os.path.join(directory, name)
+    open(path, 'w').close()
+    stamp = time.time() - age
+    os.utime(path, (stamp, stamp))
+
+
+def test_only_finished_backups_count_towards_the_schedule(backup_dir):
+    touch(backup_dir, 'compendium-20240101-000000-000.db', 2 * 3600)
+    touch(backup_dir, 'compendium-20240101-020000-000.db.partial', 0)
+    touch(backup_dir, 'compendium-20240101-020000-000-shard1.db', 0)
+
+    assert backup._seconds_until_due() <= -3600 + 5
+
+
+@pytest.mark.skipif(backup.fcntl is None, reason='no cross-process file locks')
+def test_only_one_holder_of_the_scheduler_lock(backup_dir, monkeypatch):
+    monkeypatch.setattr(backup, '_scheduler_lock_file', None)
+    assert backup._hold_scheduler_lock()
+    holder = backup._scheduler_lock_file
+    try:
+        # A second open file description stands in for another worker process
+        assert not backup._hold_scheduler_lock()
+    finally:
+        holder.close()
+    assert backup._hold_scheduler_lock()
+    backup._scheduler_lock_file.close()
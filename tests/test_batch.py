@@ -0,0 +1,32 @@
+import models
+
+
+def field_op(op_id, field, value):
+    return {'op_id': op_id, 'type': 'field', 'field': field, 'value': value}
+
+
+def test_malformed_ops_are_rejected_one_by_one(user_id):
+    character_id = models.create_character(user_id)
+    ops = [
+        'not an op',
+        field_op('a', ['name'], 'x'),
+        field_op('b', 'hp_current', 10 ** 30),
+        field_op('c', 'name', 'Arya'),
+    ]
+
+    revision, results = models.apply_ops(character_id, user_id, ops)
+
+    assert [result['status'] for result in results] == ['invalid', 'invalid', 'invalid', 'applied']
+    assert models.get_character(character_id, user_id)['name'] == 'Arya'
+    # The batch's transaction is closed, so the next write doesn't wait on it
+    assert models.apply_ops(character_id, user_id, [field_op('d', 'name', 'Bran')])[0] == revision + 1
+
+
+def test_batch_route_answers_every_op(client, user_id):
+    character_id = models.create_character(user_id)
+
+    response = client.post(f'/character/{character_id}/batch',
+                           json={'ops': [42, field_op('a', 'name', 'Arya')]})
+
+    assert response.status_code == 200
+    assert [result['status'] for result in response.get_json()['results']] == ['invalid', 'applied']
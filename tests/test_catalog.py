@@ -0,0 +1,31 @@
+import models
+
+
+def catalog_size(kind):
+    return len(models.get_catalog(kind))
+
+
+def test_deduplicate_twice_changes_nothing_the_second_time(user_id):
+    for _ in range(3):
+        character_id = models.create_character(user_id)
+        models.add_feature(character_id, 'Rage', 'Advantage on Strength checks.', 'Barbarian', [])
+        models.add_feature(character_id, 'Darkvision', 'See in the dark.', None, [])
+
+    assert models.deduplicate_into_catalog('feature') == 6
+    assert catalog_size('feature') == 2
+
+    assert models.deduplicate_into_catalog('feature') == 0
+    assert catalog_size('feature') == 2
+
+
+def test_deduplicate_links_to_an_existing_catalog_entry(user_id):
+    first = models.create_character(user_id)
+    entry_id = models.add_spell(first, 'Light', 0, 'A glowing object.')
+    catalog_id = models.publish_to_catalog('spell', entry_id, first)
+    for _ in range(2):
+        models.add_spell(models.create_character(user_id), 'Light', 0, 'A glowing object.')
+
+    assert models.deduplicate_into_catalog('spell') == 2
+    assert catalog_size('spell') == 1
+    for spell in models.get_spells(first):
+        assert spell['catalog_id'] == catalog_id
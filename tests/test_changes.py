@@ -0,0 +1,48 @@
+import pytest
+
+import models
+
+
+def test_changes_since_current_revision_are_empty(user_id):
+    character_id = models.create_character(user_id)
+    revision, _ = models.get_changes(character_id, 0)
+    assert models.get_changes(character_id, revision) == (revision, {})
+
+
+def test_changes_list_the_entities_written(user_id):
+    character_id = models.create_character(user_id)
+    since, _ = models.get_changes(character_id, 0)
+    item_id = models.add_inventory_item(character_id, 'Rope', '', '', 1, [])
+
+    revision, changed = models.get_changes(character_id, since)
+
+    assert revision == since + 1
+    assert changed == {'item': {item_id}}
+
+
+def test_revision_ahead_of_the_character_asks_for_a_full_resync(user_id):
+    # A client that saw revisions later rolled back by restoring a backup
+    character_id = models.create_character(user_id)
+    revision, _ = models.get_changes(character_id, 0)
+
+    assert models.get_changes(character_id, revision + 5) == (revision, None)
+
+
+@pytest.mark.parametrize('full', [True, False])
+def test_changes_for_a_character_deleted_mid_request_are_not_found(client, user_id, monkeypatch, full):
+    character_id = models.create_character(user_id)
+    models.add_inventory_item(character_id, 'Rope', '', '', 1, [])
+    revision, _ = models.get_changes(character_id, 0)
+    get_changes = models.get_changes
+
+    def deleted_after_reading(character_id, since):
+        result = get_changes(character_id, since)
+        models.delete_character(character_id, user_id)
+        return result
+    monkeypatch.setattr(models, 'get_changes', deleted_after_reading)
+
+    since = revision + 1 if full else revision - 1
+    response = client.get(f'/character/{character_id}/changes?since={since}')
+
+    assert response.status_code == 404
+    assert response.get_json() == {'ok': False, 'error': 'Not found'}
@@ -0,0 +1,79 @@
+"""Server-side derived stats must match what static/sheet.js shows after an edit."""
+import math
+
+import pytest
+
+import models
+
+
+def js_calc_mod(score):
+    # calcMod: Math.floor((score - 10) / 2)
+    return math.floor((score - 10) / 2)
+
+
+def js_calc_prof_bonus(level):
+    # calcProfBonus, equal to Math.ceil(level / 4) + 1 for levels 1-20
+    return math.ceil(level / 4) + 1
+
+
+def js_check_total(score, score_bonus, prof, prof_bonus, multiplier, check_bonus):
+    # updateSkillsAndSaves: mod + effectiveProf * profMultiplier + equipBonus
+    return js_calc_mod(score + score_bonus) + (prof + prof_bonus) * multiplier + check_bonus
+
+
+def make_character(scores=None, level=1, proficiency_bonus=2, proficiencies=0):
+    character = {'id': 1, 'level': level, 'proficiency_bonus': proficiency_bonus,
+                 'proficiencies': proficiencies, 'ac': 10, 'hp_max': 0, 'mana_max': 0, 'speed': 30}
+    for ability in models.ABILITIES:
+        character[f'{ability}_score'] = (scores or {}).get(ability, 10)
+    return character
+
+
+@pytest.mark.parametrize('score', range(1, 31))
+def test_ability_modifiers_match_calc_mod(score):
+    stats = models.compute_derived_stats(make_character({a: score for a in models.ABILITIES}), {})
+    for ability in models.ABILITIES:
+        assert stats[f'{ability}_mod'] == js_calc_mod(score)
+
+
+@pytest.mark.parametrize('score', range(1, 31))
+@pytest.mark.parametrize('bonus', [-3, 0, 1, 4])
+def test_modifiers_include_score_bonuses(score, bonus):
+    stats = models.compute_derived_stats(make_character({'str': score}), {'str_score': bonus})
+    assert stats['str_mod'] == js_calc_mod(score + bonus)
+
+
+@pytest.mark.parametrize('level', range(1, 21))
+def test_proficiency_bonus_matches_calc_prof_bonus(level):
+    assert models.proficiency_for_level(level) == js_calc_prof_bonus(level)
+    stats = models.compute_derived_stats(make_character(level=level), {})
+    assert stats['level_proficiency_bonus'] == js_calc_prof_bonus(level)
+
+
+# (save or skill, ability) for every check on the sheet
+CHECKS = [(f'{a}_save', a) for a in models.ABILITIES] + models.SKILLS
+
+
+@pytest.mark.parametrize('score', [1, 8, 9, 10, 11, 15, 20, 30])
+@pytest.mark.parametrize('level', [1, 4, 5, 9, 13, 17, 20])
+@pytest.mark.parametrize('offset', range(3))
+def test_saves_and_skills_from_packed_proficiencies(score, level, offset):
+    # Cycle each check through none / proficient / expertise; saves clamp expertise to proficient
+    requested = {f'{key}_prof': (i + offset) % 3 for i, (key, _) in enumerate(CHECKS)}
+    proficiencies = models._proficiency_bits(requested)[1]
+    prof = js_calc_prof_bonus(level)
+    bonuses = {'proficiency_bonus': 1, 'dex_score': 2, 'stealth': 1, 'wis_save': -1}
+    character = make_character({a: score for a in models.ABILITIES}, level, prof, proficiencies)
+
+    stats = models.compute_derived_stats(character, bonuses)
+    levels = models.unpack_proficiencies(proficiencies)
+    for key, ability in CHECKS:
+        multiplier = levels[f'{key}_prof']
+        if key.endswith('_save'):
+            # Saves are a checkbox on the sheet
+            assert multiplier == min(requested[f'{key}_prof'], 1)
+        expected = js_check_total(score, bonuses.get(f'{ability}_score', 0), prof,
+                                  bonuses['proficiency_bonus'], multiplier, bonuses.get(key, 0))
+        assert stats[key] == expected, key
+    assert stats['passive_perception'] == 10 + stats['perception']
+    assert stats['initiative'] == js_calc_mod(score + 2)
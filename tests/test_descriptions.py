@@ -0,0 +1,44 @@
+import models
+
+LONG = 'A coil of hempen rope. ' * 40
+
+
+def listed(character_id, item_id):
+    return next(item for item in models.get_inventory(character_id) if item['id'] == item_id)
+
+
+def test_description_version_ignores_other_character_writes(user_id):
+    character_id = models.create_character(user_id)
+    item_id = models.add_inventory_item(character_id, 'Rope', LONG, '', 1, [])
+    version = listed(character_id, item_id)['description_version']
+
+    models.update_character(character_id, user_id, {'hp_current': 7})
+    models.add_inventory_item(character_id, 'Torch', 'Burns for an hour.', '', 1, [])
+
+    assert listed(character_id, item_id)['description_version'] == version
+    assert models.get_description('inventory', item_id, character_id) == (LONG, str(version))
+
+
+def test_description_version_changes_with_the_text(user_id):
+    character_id = models.create_character(user_id)
+    item_id = models.add_inventory_item(character_id, 'Rope', LONG, '', 1, [])
+    before = models.get_description('inventory', item_id, character_id)[1]
+
+    models.update_inventory_item(item_id, character_id, 'Rope', LONG + 'Knotted.', '', 1, [])
+
+    description, after = models.get_description('inventory', item_id, character_id)
+    assert description == LONG + 'Knotted.'
+    assert after != before
+    assert str(listed(character_id, item_id)['description_version']) == after
+
+
+def test_inherited_description_version_matches_the_list(user_id):
+    character_id = models.create_character(user_id)
+    item_id = models.add_inventory_item(character_id, 'Rope', LONG, '', 1, [])
+    own = models.get_description('inventory', item_id, character_id)[1]
+    catalog_id = models.publish_to_catalog('inventory', item_id, character_id)
+
+    description, version = models.get_description('inventory', item_id, character_id)
+    assert description == LONG
+    assert version != own and f'.{catalog_id}.' in version
+    assert listed(character_id, item_id)['description_version'] == version
@@ -0,0 +1,34 @@
+import pytest
+
+import dice
+
+
+@pytest.mark.parametrize('mode, chance', [('normal', 0.5), ('advantage', 0.75), ('disadvantage', 0.25)])
+def test_even_odds_check(mode, chance):
+    # Needs 11 or more on the d20
+    assert dice.success_probability(0, 11, mode) == chance
+
+
+def test_modifier_shifts_the_target():
+    assert dice.success_probability(5, 15) == 0.55
+    assert dice.success_probability(-2, 20) == 0.0
+    assert dice.success_probability(3, 4) == 1.0
+    assert dice.success_probability(0, 20, 'advantage') == 39 / 400
+
+
+def test_check_distributions_are_exact():
+    assert dice.distribution('1d20') == (1, [1] * 20)
+    offset, counts = dice.distribution('2d20kh1')
+    assert offset == 1 and sum(counts) == 400 and counts[-1] == 39
+    offset, counts = dice.distribution('1d20+3')
+    assert offset == 4 and len(counts) == 20
+
+
+def test_check_probabilities_maps_every_check():
+    assert dice.check_probabilities({'stealth': 2, 'athletics': -1}, 12) == {'stealth': 0.55, 'athletics': 0.4}
+
+
+@pytest.mark.parametrize('expr', ['3d20', '1d100', '0d20', '2d20kh3', '', 'd20+', 'fireball'])
+def test_rejects_anything_a_check_does_not_roll(expr):
+    with pytest.raises(ValueError):
+        dice.parse(expr)
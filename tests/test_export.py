@@ -0,0 +1,51 @@
+import json
+
+import models
+
+
+def import_lines(lines, user_id):
+    return models.import_characters(iter(lines), user_id)
+
+
+def test_export_is_a_snapshot_when_written_to_between_pages(user_id, monkeypatch):
+    monkeypatch.setattr(models, 'EXPORT_PAGE_SIZE', 1)
+    first = models.create_character(user_id)
+    models.add_inventory_item(first, 'Rope', '', '', 1, [{'stat_modified': 'ac', 'value': 1}])
+    models.add_inventory_item(first, 'Torch', '', '', 1, [])
+
+    export = models.export_characters()
+    lines = [next(export), next(export)]
+    # Written while the export is between pages: none of it may show up, and no child without its parent
+    later = models.create_character(user_id)
+    models.add_inventory_item(later, 'Lamp', '', '', 1, [{'stat_modified': 'ac', 'value': 2}])
+    models.add_inventory_item(first, 'Chalk', '', '', 1, [{'stat_modified': 'ac', 'value': 3}])
+    lines += list(export)
+
+    records = [json.loads(line) for line in lines[1:]]
+    assert sorted(r['name'] for r in records if r['type'] == 'item') == ['Rope', 'Torch']
+    assert [r['id'] for r in records if r['type'] == 'character'] == [first]
+    assert sum(r['type'] == 'item_property' for r in records) == 1
+
+    models.create_user('bob', 'password')
+    bob = models.verify_user('bob', 'password')['id']
+    report = import_lines(lines, bob)
+    assert report['characters'] == 1 and report['orphans'] == 0
+
+
+def test_import_skips_and_counts_orphans(user_id):
+    header = {'type': 'header', 'format': models.EXPORT_FORMAT, 'version': models.EXPORT_VERSION}
+    records = [
+        header,
+        {'type': 'character', 'id': 1, 'name': 'Kept'},
+        {'type': 'item', 'id': 1, 'character_id': 1, 'name': 'Rope'},
+        {'type': 'item', 'id': 2, 'character_id': 99, 'name': 'Lost'},
+        {'type': 'item_property', 'id': 1, 'item_id': 2, 'stat_modified': 'ac', 'value': 1},
+        {'type': 'spell', 'id': 1, 'character_id': 1, 'name': 'Light', 'level': 0},
+    ]
+
+    report = import_lines([json.dumps(r) + '\n' for r in records], user_id)
+
+    assert report['characters'] == 1 and report['orphans'] == 2
+    character = models.get_characters_by_user(user_id)[0]
+    assert [item['name'] for item in models.get_inventory(character['id'])] == ['Rope']
+    assert [spell['name'] for spell in models.get_spells(character['id'])] == ['Light']
@@ -0,0 +1,50 @@
+import sqlite3
+
+import pytest
+
+import models
+
+
+def names(character_id):
+    return [item['name'] for item in models.get_inventory(character_id)]
+
+
+def test_reorder_within_the_equipped_and_unequipped_groups(user_id):
+    character_id = models.create_character(user_id)
+    ids = {name: models.add_inventory_item(character_id, name, '', '', 1, []) for name in ('Rope', 'Sword', 'Torch', 'Shield')}
+    models.toggle_equip_item(ids['Sword'], character_id)
+    models.toggle_equip_item(ids['Shield'], character_id)
+    assert names(character_id) == ['Sword', 'Shield', 'Rope', 'Torch']
+
+    order = [ids[name] for name in ('Shield', 'Sword', 'Torch', 'Rope')]
+    assert models.reorder_entries('inventory', character_id, order)
+
+    assert names(character_id) == ['Shield', 'Sword', 'Torch', 'Rope']
+
+
+def test_reorder_rejects_a_stale_list_without_writing(user_id):
+    character_id = models.create_character(user_id)
+    rope = models.add_inventory_item(character_id, 'Rope', '', '', 1, [])
+    torch = models.add_inventory_item(character_id, 'Torch', '', '', 1, [])
+    models.add_inventory_item(character_id, 'Lamp', '', '', 1, [])
+    revision, _ = models.get_changes(character_id, 0)
+
+    assert not models.reorder_entries('inventory', character_id, [torch, rope])
+
+    assert models.get_changes(character_id, revision) == (revision, {})
+
+
+def test_reorder_reads_the_current_order_under_the_write_lock(user_id, monkeypatch):
+    character_id = models.create_character(user_id)
+    rope = models.add_inventory_item(character_id, 'Rope', '', '', 1, [])
+    monkeypatch.setattr(models, 'BUSY_TIMEOUT', 0.1)
+    writer = models.get_db(models.character_shard(character_id))
+    models._begin_write(writer)
+    try:
+        # A writer mid-change (e.g. adding an entry) must finish before the ids are checked,
+        # even for a list that reading alone would reject
+        with pytest.raises(sqlite3.OperationalError):
+            models.reorder_entries('inventory', character_id, [rope, rope + 1])
+    finally:
+        writer.rollback()
+        writer.close()
@@ -0,0 +1,154 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+import models
+
+
+@pytest.fixture
+def sharded(tmp_path, monkeypatch):
+    """Three shards, with eve stored in compendium.db (shard 0) and alice in shard 2."""
+    monkeypatch.setattr(models, 'DATABASE', str(tmp_path / 'compendium.db'))
+    monkeypatch.setattr(models, 'SHARDS', 3)
+    models.init_db()
+    models.cache_clear()
+    users = {}
+    for name in ('eve', 'alice'):
+        models.create_user(name, 'password')
+        users[name] = models.verify_user(name, 'password')['id']
+    yield users
+    models.cache_clear()
+
+
+def rows_in(shard, table):
+    conn = sqlite3.connect(models.shard_path(shard))
+    count = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    conn.close()
+    return count
+
+
+def test_characters_are_stored_in_their_owners_shard(sharded):
+    assert models.user_shard(sharded['eve']) == 0
+    assert models.user_shard(sharded['alice']) == 2
+    eve = models.create_character(sharded['eve'])
+    alice = models.create_character(sharded['alice'])
+    models.toggle_equip_item(models.add_inventory_item(alice, 'Rope', '', '', 1, [{'stat_modified': 'ac', 'value': 1}]), alice)
+
+    assert models.character_shard(eve) == 0 and models.character_shard(alice) == 2
+    assert rows_in(0, 'characters') == 1 and rows_in(2, 'characters') == 1
+    assert rows_in(2, 'item_properties') == 1 and rows_in(1, 'characters') == 0
+    assert models.get_all_bonuses(alice) == {'ac': 1}
+    assert models.get_character(alice, sharded['alice'])['id'] == alice
+    assert models.get_character(alice, sharded['eve']) is None
+
+
+def test_shared_tables_only_live_in_compendium_db(sharded):
+    conn = sqlite3.connect(models.shard_path(2))
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    conn.close()
+    assert not tables & set(models.GLOBAL_TABLES)
+    assert set(models.SHARDED_TABLES) <= tables
+
+
+def test_parties_and_overview_read_across_shards(sharded):
+    eve = models.create_character(sharded['eve'])
+    alice = models.create_character(sharded['alice'])
+    models.add_inventory_item(alice, 'Rope', '', '', 1, [])
+    party = models.create_party('Both', sharded['eve'])
+    models.add_party_member(party, eve)
+    models.add_party_member(party, alice)
+
+    assert sorted(sheet['player'] for sheet in models.get_party_sheets(party)) == ['alice', 'eve']
+    assert models.get_party(party, sharded['alice'])['name'] == 'Both'
+    assert [p['member_count'] for p in models.get_parties_for_user(sharded['alice'])] == [2]
+    assert {c['id'] for c in models.get_all_characters()} == {eve, alice}
+
+    overview = models.get_user_overview()
+    stats = {user['username']: (user['characters'], user['items']) for user in overview['users']}
+    assert stats == {'eve': (1, 0), 'alice': (1, 1)}
+    assert overview['totals']['characters'] == 2
+
+
+def test_clone_copies_into_the_target_users_shard(sharded):
+    source = models.create_character(sharded['alice'])
+    models.toggle_equip_item(models.add_inventory_item(source, 'Rope', '', '', 1, [{'stat_modified': 'ac', 'value': 2}]), source)
+
+    copy = models.clone_character(source, sharded['eve'])
+
+    assert models.character_shard(copy) == 0
+    assert [item['name'] for item in models.get_inventory(copy)] == ['Rope']
+    assert models.get_all_bonuses(copy) == {'ac': 2}
+
+
+def test_export_and_import_keep_each_owner_in_their_shard(sharded):
+    for name in ('eve', 'alice'):
+        character = models.create_character(sharded[name])
+        models.add_inventory_item(character, name.title() + "'s rope", '', '', 1, [])
+    lines = list(models.export_characters())
+    records = [json.loads(line) for line in lines[1:]]
+    assert sorted(r['owner'] for r in records if r['type'] == 'character') == ['alice', 'eve']
+
+    report = models.import_characters(iter(lines), sharded['eve'], keep_owners=True)
+
+    assert report['characters'] == 2 and report['orphans'] == 0
+    for name in ('eve', 'alice'):
+        characters = models.get_characters_by_user(sharded[name])
+        assert len(characters) == 2
+        for character in characters:
+            assert models.character_shard(character['id']) == models.user_shard(sharded[name])
+            assert [item['name'] for item in models.get_inventory(character['id'])] == [name.title() + "'s rope"]
+
+
+def test_deleting_a_catalog_entry_copies_its_text_in_every_shard(sharded):
+    entries = {}
+    for name in ('eve', 'alice'):
+        character = models.create_character(sharded[name])
+        item = models.add_inventory_item(character, 'Rope', 'Fifty feet.', '', 1, [])
+        entries[name] = (character, item)
+    catalog_id = models.publish_to_catalog('inventory', entries['eve'][1], entries['eve'][0])
+    models.add_from_catalog('inventory', entries['alice'][0], catalog_id)
+
+    models.delete_catalog_entry('inventory', catalog_id)
+
+    assert models.get_catalog('inventory') == []
+    for character, _ in entries.values():
+        assert {item['description'] for item in models.get_inventory(character)} == {'Fifty feet.'}
+
+
+def test_purge_removes_users_once_their_shard_is_empty(sharded, monkeypatch):
+    character = models.create_character(sharded['alice'])
+    models.add_inventory_item(character, 'Rope', '', '', 1, [])
+    models.delete_user(sharded['alice'])
+    monkeypatch.setattr(models, 'UNDO_WINDOW', -1)
+
+    assert models.purge_deleted() > 0
+
+    assert rows_in(2, 'characters') == 0 and rows_in(2, 'inventory_items') == 0
+    assert [u['username'] for u in models.get_user_overview()['users']] == ['eve']
+
+
+def test_database_size_counts_every_shard(sharded):
+    assert models.database_size() >= sum(os.path.getsize(models.shard_path(shard)) for shard in range(3))
+
+
+def test_init_refuses_fewer_shards_than_are_in_use(sharded, monkeypatch):
+    monkeypatch.setattr(models, 'SHARDS', 2)
+    with pytest.raises(RuntimeError):
+        models.init_db()
+
+
+def test_a_write_on_one_shard_does_not_block_another(sharded, monkeypatch):
+    eve = models.create_character(sharded['eve'])
+    alice = models.create_character(sharded['alice'])
+    monkeypatch.setattr(models, 'BUSY_TIMEOUT', 0.1)
+    holder = models.get_db(2)
+    models._begin_write(holder)
+    try:
+        models.add_inventory_item(eve, 'Rope', '', '', 1, [])
+        with pytest.raises(sqlite3.OperationalError):
+            models.add_inventory_item(alice, 'Rope', '', '', 1, [])
+    finally:
+        holder.rollback()
+        holder.close()
@@ -0,0 +1,42 @@
+import pytest
+
+import models
+
+
+@pytest.fixture
+def other_worker(monkeypatch):
+    """Make writes skip this process's cache invalidation, as if another worker made them."""
+    monkeypatch.setattr(models, 'CACHE_CHECK_REVISION', True)
+    monkeypatch.setattr(models, 'cache_invalidate', lambda character_ids: None)
+
+
+@pytest.mark.parametrize('snapshots', [False, True])
+def test_tombstone_from_another_worker_hides_cached_character(user_id, other_worker, monkeypatch, snapshots):
+    monkeypatch.setattr(models, 'SHEET_SNAPSHOTS', snapshots)
+    character_id = models.create_character(user_id)
+    assert models.get_character(character_id, user_id) is not None
+    assert models.get_sheet(character_id, user_id) is not None
+
+    models.delete_character(character_id, user_id)
+
+    assert models.get_character(character_id, user_id) is None
+    assert models.get_sheet(character_id, user_id) is None
+
+
+def test_delete_user_from_another_worker_hides_cached_characters(user_id, other_worker):
+    character_id = models.create_character(user_id)
+    assert models.get_sheet(character_id, user_id) is not None
+
+    models.delete_user(user_id)
+
+    assert models.get_sheet(character_id, user_id) is None
+
+
+def test_restore_from_another_worker_brings_character_back(user_id, other_worker):
+    character_id = models.create_character(user_id)
+    models.delete_character(character_id, user_id)
+    assert models.get_character(character_id, user_id) is None
+
+    assert models.restore_character(character_id, user_id)
+
+    assert models.get_character(character_id, user_id)['id'] == character_id